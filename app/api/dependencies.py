@@ -2,14 +2,15 @@ from fastapi import Depends, HTTPException
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 import jwt
 import os
-from app.core.database import get_db
 from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.database import DbSession, get_db, get_async_db, run_db
 from app.repositories.user_repository import UserRepository
 
 security = HTTPBearer()
 
 
-def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security), db: Session = Depends(get_db)):
+def _user_id_from_token(credentials: HTTPAuthorizationCredentials) -> int:
     token = credentials.credentials
     secret = os.getenv("SECRET_KEY", "devsecret")
     try:
@@ -20,14 +21,32 @@ def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(securit
     user_id = payload.get("user_id")
     if not user_id:
         raise HTTPException(status_code=401, detail="Invalid token payload")
+    return user_id
+
 
-    user = db.query.__self__ if False else None
-    user = UserRepository.get_user_by_email(db, "") if False else None
-    # fetch by id
-    user = db.query(UserRepository.__dict__.get('create_user').__self__ if False else object) if False else None
-    # fallback: query User directly
-    from app.models.user import User
-    user = db.query(User).filter(User.id == user_id).first()
+def _require_user(user):
     if not user:
         raise HTTPException(status_code=401, detail="User not found")
     return user
+
+
+def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security), db: Session = Depends(get_db)):
+    user_id = _user_id_from_token(credentials)
+    return _require_user(UserRepository.get_user_by_id(db, user_id))
+
+
+async def get_current_user_async(credentials: HTTPAuthorizationCredentials = Depends(security), db: DbSession = Depends(get_async_db)):
+    """
+    get_current_user for async routes: shares their get_async_db session.
+    """
+    user_id = _user_id_from_token(credentials)
+    return _require_user(await run_db(db, UserRepository.get_user_by_id, user_id))
+
+
+def require_debug_access(user=Depends(get_current_user)):
+    """
+    Guard for operational endpoints: a signed-in user, and DEBUG_ENDPOINTS on.
+    """
+    if not settings.DEBUG_ENDPOINTS:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return user
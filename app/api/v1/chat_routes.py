@@ -1,19 +1,23 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from app.core.database import get_db
+from app.core.database import DbSession, get_db, get_async_db
 from app.schema.chat_schema import ChatRequest, ChatResponse
 from app.services.chat_service import ChatService
 from app.repositories.chat_repository import ChatRepository
 from app.schema.chat_schema import ChatMessageResponse
-from typing import List
-from app.api.dependencies import get_current_user
+from typing import List, Optional
+from app.api.dependencies import get_current_user, get_current_user_async
 
 router = APIRouter(prefix="/chat", tags=["Chat"])
 
+# Stop proxies from buffering the event stream
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
 
 @router.post("/", response_model=ChatResponse)
-def chat(request: ChatRequest, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
-    session_id, answer, created_at = ChatService.handle_chat(
+async def chat(request: ChatRequest, db: DbSession = Depends(get_async_db), current_user=Depends(get_current_user_async)):
+    session_id, answer, created_at, answered_by = await ChatService.handle_chat(
         db=db,
         prescription_id=request.prescription_id,
         session_id=request.session_id,
@@ -23,20 +27,56 @@ def chat(request: ChatRequest, db: Session = Depends(get_db), current_user=Depen
     return ChatResponse(
         session_id=session_id,
         answer=answer,
-        created_at=created_at
+        created_at=created_at,
+        answered_by=answered_by
+    )
+
+
+@router.post("/stream")
+async def chat_stream(request: ChatRequest, db: DbSession = Depends(get_async_db), current_user=Depends(get_current_user_async)):
+    session_id, events = await ChatService.stream_chat(
+        db=db,
+        prescription_id=request.prescription_id,
+        session_id=request.session_id,
+        question=request.question
+    )
+
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={**SSE_HEADERS, "X-Chat-Session-Id": str(session_id)}
     )
 
 
 @router.get("/sessions/{session_id}/messages", response_model=List[ChatMessageResponse])
-def get_session_messages(session_id: int, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
-    messages = ChatRepository.get_last_messages(db, session_id, limit=100)
+def get_session_messages(
+    session_id: int,
+    response: Response,
+    limit: int = Query(100, ge=1, le=500),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor of the previous page"),
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user)
+):
+    # Only the owner of the session's prescription may read it
+    if not ChatRepository.get_user_session(db, session_id, current_user.id):
+        raise HTTPException(status_code=404, detail="Session not found")
+
+    # Latest messages first; older pages via the X-Next-Cursor header
+    try:
+        messages, next_cursor = ChatRepository.get_messages_page(db, session_id, limit=limit, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return [
         ChatMessageResponse(
             id=m.id,
             session_id=m.session_id,
             role=m.role,
             content=m.content,
-            created_at=m.created_at
+            created_at=m.created_at,
+            answered_by=m.answered_by
         )
         for m in messages
     ]
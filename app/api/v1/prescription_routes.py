@@ -1,111 +1,60 @@
-import os
-from fastapi import APIRouter, UploadFile, File, Depends, Form, HTTPException
+from fastapi import APIRouter, UploadFile, File, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from app.core.database import get_db
+from app.core.database import DbSession, get_db, get_async_db
 from app.repositories.prescription_repository import PrescriptionRepository
 from app.schema.prescription_schema import PrescriptionResponse
 from app.services.file_ingestion_service import FileIngestionService
-from app.services.llm_service import (
-    extract_medicines_from_text, extract_and_enrich_medicines
+from app.services.ingestion_service import (
+    save_upload, ingest_file_async, TextExtractionError, IndexingError, INGEST_TASK
 )
-from app.utils.text_chunker import chunk_text
-from app.services.embedding_service import generate_embedding, generate_embeddings_batch
-from app.services.vector_registry import vector_registry
+from app.services.job_queue import get_job_queue
+from app.repositories.ingestion_job_repository import IngestionJobRepository
+from app.schema.ingestion_schema import IngestionJobResponse
 import logging
 logger = logging.getLogger(__name__)
 from typing import List
 from app.schema.prescription_schema import PrescriptionUpdate
 from app.schema.chat_schema import ChatRequest
 from app.schema.chat_schema import ChatResponse
-from app.repositories.chat_repository import ChatRepository
 from app.models.prescription import Prescription
-from fastapi import Path, Query
+from fastapi import Path
 from app.services.chat_service import ChatService
-from app.api.dependencies import get_current_user
+from app.services.answer_cache import answer_cache
+from app.utils.medicine_matcher import medicine_matchers
+from app.services.prompt_builder import prompt_prefixes
+from app.api.dependencies import get_current_user, get_current_user_async
+from app.api.v1.chat_routes import SSE_HEADERS
+from fastapi.responses import StreamingResponse
 
 router = APIRouter(prefix="/prescriptions", tags=["Prescriptions"])
 
-UPLOAD_DIR = "uploads"
-
-if not os.path.exists(UPLOAD_DIR):
-    os.makedirs(UPLOAD_DIR)
-
 
 @router.post("/", response_model=PrescriptionResponse)
-def upload_prescription(
+async def upload_prescription(
     file: UploadFile = File(...),
-    db: Session = Depends(get_db),
-    current_user = Depends(get_current_user)
+    db: DbSession = Depends(get_async_db),
+    current_user = Depends(get_current_user_async)
 ):
     try:
         # 1️⃣ Validate file first (checks content_type and size)
         try:
-            content_type = FileIngestionService.validate_file(file)
+            content_type = await run_in_threadpool(FileIngestionService.validate_file, file)
         except ValueError as ve:
             logger.warning(f"File validation failed: {ve}")
             raise HTTPException(status_code=400, detail=str(ve))
 
-        # 2️⃣ Save file (single write). Use basename to avoid path traversal.
-        filename = os.path.basename(file.filename)
-        file_path = os.path.join(UPLOAD_DIR, filename)
-
-        file.file.seek(0)
-        with open(file_path, "wb") as buffer:
-            buffer.write(file.file.read())
-
-        # 3️⃣ Extract text
-        extracted_text = FileIngestionService.extract_text(file_path, content_type)
-
-        if not extracted_text or extracted_text.strip() == "":
-            raise HTTPException(
-                status_code=400,
-                detail="Unable to extract sufficient text from file."
-            )
-
-        # 4️⃣ Medicine extraction (LLM) with fallback
-        enriched_medicines = extract_and_enrich_medicines(extracted_text)
-        if not enriched_medicines:
-            logger.warning("LLM extraction returned empty; falling back to simple extractor.")
-            try:
-                fallback = extract_medicines_from_text(extracted_text)
-                if isinstance(fallback, list):
-                    enriched_medicines = fallback
-                else:
-                    enriched_medicines = []
-            except Exception as e:
-                logger.error("Fallback extraction also failed: %s", e, exc_info=e)
-                enriched_medicines = []
-
-        # 5️⃣ Save to DB
-        prescription = PrescriptionRepository.create_prescription(
-            db=db,
-            user_id=current_user.id,
-            image_path=file_path,
-            extracted_text=extracted_text,
-            analysis_result=enriched_medicines
-        )
-
-        # 6️⃣ Build RAG Vector Index (OCR text only)
-        normalized_text = extracted_text.lower()
-        chunks = chunk_text(normalized_text)
-
-        store = vector_registry.create_store(prescription.id)
-
-        try:
-            chunk_embeddings = generate_embeddings_batch(chunks)
-        except Exception as e:
-            logger.error("Embedding generation failed.", exc_info=e)
-            raise HTTPException(status_code=500, detail="Embedding service failed.")
-
-        for emb, chunk in zip(chunk_embeddings, chunks):
-            store.add_chunk(emb, chunk)
-
-        logger.info(f"RAG index built for Prescription ID: {prescription.id}")
-        logger.info(f"Total OCR chunks indexed: {len(chunks)}")
-        logger.info(f"Total structured medicines stored: {len(enriched_medicines)}")
+        # 2️⃣ Save file content-addressed (hashed while streaming to disk)
+        file_path, content_hash = await run_in_threadpool(save_upload, file)
 
-        return prescription
+        # 3️⃣ OCR -> extraction -> DB -> RAG index, or reuse of a duplicate upload
+        return await ingest_file_async(db, current_user.id, file_path, content_type, content_hash)
 
+    except TextExtractionError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except IndexingError as e:
+        logger.error("Embedding generation failed.", exc_info=e)
+        raise HTTPException(status_code=500, detail=str(e))
     except HTTPException:
         raise
     except Exception as e:
@@ -113,6 +62,37 @@ def upload_prescription(
         raise HTTPException(status_code=500, detail="Prescription processing failed.")
 
 
+@router.post("/jobs", response_model=IngestionJobResponse, status_code=202)
+def upload_prescription_async(
+    file: UploadFile = File(...),
+    db: Session = Depends(get_db),
+    current_user = Depends(get_current_user)
+):
+    """
+    Save the file and queue OCR -> extraction -> indexing in the background.
+    Poll GET /prescriptions/jobs/{job_id} for progress.
+    """
+    try:
+        content_type = FileIngestionService.validate_file(file)
+    except ValueError as ve:
+        logger.warning(f"File validation failed: {ve}")
+        raise HTTPException(status_code=400, detail=str(ve))
+
+    file_path, content_hash = save_upload(file)
+    job = IngestionJobRepository.create_job(db, current_user.id, file_path, content_type, content_hash)
+    get_job_queue().enqueue(INGEST_TASK, job_id=job.id)
+
+    return job
+
+
+@router.get("/jobs/{job_id}", response_model=IngestionJobResponse)
+def get_ingestion_job(job_id: int, db: Session = Depends(get_db), current_user = Depends(get_current_user)):
+    job = IngestionJobRepository.get_job(db, job_id)
+    if not job or job.user_id != current_user.id:
+        raise HTTPException(status_code=404, detail="Ingestion job not found")
+    return job
+
+
 @router.get("/", response_model=List[PrescriptionResponse])
 def list_prescriptions(db: Session = Depends(get_db), current_user = Depends(get_current_user)):
     return PrescriptionRepository.get_prescriptions_by_user(db, current_user.id)
@@ -135,21 +115,40 @@ def patch_prescription_analysis(prescription_id: int, update: PrescriptionUpdate
     db.add(pres)
     db.commit()
     db.refresh(pres)
+    # Cached chat answers, the compiled matcher and the prompt prefix were built from the old analysis.
+    # They are keyed by an analysis digest, so other workers stop using them on their own;
+    # this only frees this worker's copies early.
+    answer_cache.invalidate(prescription_id)
+    medicine_matchers.invalidate(prescription_id)
+    prompt_prefixes.invalidate(prescription_id)
     return pres
 
 
 @router.post("/{prescription_id}/chat", response_model=ChatResponse)
-def prescription_chat(prescription_id: int, request: ChatRequest, db: Session = Depends(get_db), current_user = Depends(get_current_user)):
-    # Ensure prescription exists
-    pres = db.query(Prescription).filter(Prescription.id == prescription_id).first()
-    if not pres:
-        raise HTTPException(status_code=404, detail="Prescription not found")
+async def prescription_chat(prescription_id: int, request: ChatRequest, db: DbSession = Depends(get_async_db), current_user = Depends(get_current_user_async)):
+    # ChatService loads the prescription (404 if missing) with the session and history
+    session_id, answer, created_at, answered_by = await ChatService.handle_chat(
+        db=db,
+        prescription_id=prescription_id,
+        session_id=request.session_id,
+        question=request.question
+    )
 
-    session_id, answer, created_at = ChatService.handle_chat(
+    return ChatResponse(session_id=session_id, answer=answer, created_at=created_at, answered_by=answered_by)
+
+
+@router.post("/{prescription_id}/chat/stream")
+async def prescription_chat_stream(prescription_id: int, request: ChatRequest, db: DbSession = Depends(get_async_db), current_user = Depends(get_current_user_async)):
+    # ChatService loads the prescription (404 if missing) with the session and history
+    session_id, events = await ChatService.stream_chat(
         db=db,
         prescription_id=prescription_id,
         session_id=request.session_id,
         question=request.question
     )
 
-    return ChatResponse(session_id=session_id, answer=answer, created_at=created_at)
\ No newline at end of file
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={**SSE_HEADERS, "X-Chat-Session-Id": str(session_id)}
+    )
@@ -0,0 +1,153 @@
+"""
+Chat history query latency without and with the composite indexes, on a
+seeded SQLite database (a scratch file, not DATABASE_URL).
+
+Measured, median over --queries random ids:
+- last messages:   ChatRepository.get_last_messages (every chat turn)
+- page (offset):   a deep history page read with OFFSET, the pre-cursor way
+- page (keyset):   ChatRepository.get_messages_page at the same depth
+- session lookup:  ChatRepository.get_session
+- user's list:     PrescriptionRepository.get_prescriptions_by_user
+
+Usage: python -m app.benchmarks.chat_history_benchmark [--messages 2000000] [--sessions 20000] [--db /tmp/chat_bench.sqlite]
+"""
+import argparse
+import os
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+from app.core.database import Base
+from app.models.user import User
+from app.models.prescription import Prescription
+from app.models.chat_session import ChatSession
+from app.models.chat_message import ChatMessage
+from app.repositories.chat_repository import ChatRepository
+from app.repositories.prescription_repository import PrescriptionRepository
+
+BATCH = 50000
+TABLES = [User.__table__, Prescription.__table__, ChatSession.__table__, ChatMessage.__table__]
+INDEXES = [index for table in TABLES[1:] for index in table.indexes if index.name.startswith("ix_") and len(index.columns) > 1]
+
+
+def seed(engine, users, sessions, messages, rng):
+    prescriptions = sessions // 2
+    start = datetime(2025, 1, 1)
+    with engine.begin() as conn:
+        conn.execute(insert(User.__table__), [
+            {"id": i, "email": f"user{i}@example.com", "password_hash": "x"} for i in range(1, users + 1)
+        ])
+        conn.execute(insert(Prescription.__table__), [
+            {"id": i, "user_id": rng.randint(1, users), "created_at": start + timedelta(minutes=i)}
+            for i in range(1, prescriptions + 1)
+        ])
+        conn.execute(insert(ChatSession.__table__), [
+            {"id": i, "prescription_id": rng.randint(1, prescriptions), "created_at": start + timedelta(minutes=i)}
+            for i in range(1, sessions + 1)
+        ])
+
+    # Messages interleave across sessions, as concurrent chats do
+    for offset in range(0, messages, BATCH):
+        rows = [
+            {
+                "session_id": rng.randint(1, sessions),
+                "role": "user" if i % 2 else "assistant",
+                "content": "How often should I take this medicine?",
+                "created_at": start + timedelta(seconds=i),
+            }
+            for i in range(offset, min(offset + BATCH, messages))
+        ]
+        with engine.begin() as conn:
+            conn.execute(insert(ChatMessage.__table__), rows)
+
+
+def median_ms(fn, ids):
+    timings = []
+    for value in ids:
+        start = time.perf_counter()
+        fn(value)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def measure(SessionFactory, session_ids, user_ids, depth, page_size):
+    db = SessionFactory()
+    try:
+        # Cursor of the page at `depth` for each session, for the keyset case
+        cursors = {}
+        for session_id in session_ids:
+            cursor = None
+            for _ in range(depth):
+                _, cursor = ChatRepository.get_messages_page(db, session_id, page_size, cursor)
+                if cursor is None:
+                    break
+            cursors[session_id] = cursor
+
+        def offset_page(session_id):
+            db.query(ChatMessage).filter(ChatMessage.session_id == session_id).order_by(
+                ChatMessage.created_at.desc(), ChatMessage.id.desc()
+            ).offset(depth * page_size).limit(page_size).all()
+
+        return {
+            "last messages": median_ms(lambda sid: ChatRepository.get_last_messages(db, sid, limit=9), session_ids),
+            "page (offset)": median_ms(offset_page, session_ids),
+            "page (keyset)": median_ms(lambda sid: ChatRepository.get_messages_page(db, sid, page_size, cursors[sid]), session_ids),
+            "session lookup": median_ms(lambda sid: ChatRepository.get_session(db, sid, 1), session_ids),
+            "user's list": median_ms(lambda uid: PrescriptionRepository.get_prescriptions_by_user(db, uid), user_ids),
+        }
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=2_000_000)
+    parser.add_argument("--sessions", type=int, default=20_000)
+    parser.add_argument("--users", type=int, default=2_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--page-size", type=int, default=20)
+    parser.add_argument("--depth", type=int, default=3, help="pages deep for the offset/keyset comparison")
+    parser.add_argument("--db", default="/tmp/chat_history_benchmark.sqlite")
+    args = parser.parse_args()
+
+    if os.path.exists(args.db):
+        os.remove(args.db)
+    engine = create_engine(f"sqlite:///{args.db}")
+    SessionFactory = sessionmaker(bind=engine)
+    rng = random.Random(7)
+
+    Base.metadata.create_all(bind=engine, tables=TABLES)
+    with engine.begin() as conn:
+        for index in INDEXES:
+            index.drop(conn)
+
+    start = time.perf_counter()
+    seed(engine, args.users, args.sessions, args.messages, rng)
+    print(f"Seeded {args.messages} messages in {args.sessions} sessions in {time.perf_counter() - start:.1f}s")
+
+    session_ids = [rng.randint(1, args.sessions) for _ in range(args.queries)]
+    user_ids = [rng.randint(1, args.users) for _ in range(args.queries)]
+
+    before = measure(SessionFactory, session_ids, user_ids, args.depth, args.page_size)
+
+    start = time.perf_counter()
+    with engine.begin() as conn:
+        for index in INDEXES:
+            index.create(conn)
+        conn.exec_driver_sql("ANALYZE")
+    print(f"Built {len(INDEXES)} indexes in {time.perf_counter() - start:.1f}s")
+
+    after = measure(SessionFactory, session_ids, user_ids, args.depth, args.page_size)
+
+    print(f"{'query':>15} {'no index ms':>12} {'indexed ms':>11} {'speedup':>8}")
+    for name in before:
+        print(f"{name:>15} {before[name]:>12.3f} {after[name]:>11.3f} {before[name] / after[name]:>7.0f}x")
+
+    engine.dispose()
+    os.remove(args.db)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Compare embedding backends on the same chunk corpus: indexing throughput,
+single-query latency and how often their top-k retrievals agree with the
+first backend listed (the reference).
+
+Backends are called directly, without the embedding cache. The corpus is the
+OCR text of stored prescriptions, or plain-text files given on the command
+line (fully offline with local backends).
+
+Usage:
+    python -m app.benchmarks.embedding_backend_benchmark --backends gemini sentence_transformers hashing
+    python -m app.benchmarks.embedding_backend_benchmark --backends sentence_transformers hashing notes/*.txt
+"""
+import argparse
+import statistics
+import time
+import numpy as np
+from app.benchmarks.embedding_compression_report import load_corpus, make_queries
+from app.services.embedding_backends import EMBEDDING_BACKENDS, create_embedding_backend
+from app.services.embedding_service import truncate_and_normalize
+from app.utils.text_chunker import chunk_text
+
+TOP_K = 5
+EMBED_BATCH = 100
+
+
+def load_files(paths):
+    chunks = []
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            chunks.extend(chunk_text(f.read().lower()))
+    return chunks
+
+
+def embed_all(backend, texts):
+    matrices = [
+        backend.embed(texts[i:i + EMBED_BATCH], backend.dimension)
+        for i in range(0, len(texts), EMBED_BATCH)
+    ]
+    return truncate_and_normalize(np.vstack(matrices), backend.dimension)
+
+
+def run_backend(name, chunks, queries):
+    backend = create_embedding_backend(name)
+    backend.load()
+
+    start = time.perf_counter()
+    corpus = embed_all(backend, chunks)
+    index_seconds = time.perf_counter() - start
+
+    latencies = []
+    query_vectors = []
+    for query in queries:
+        start = time.perf_counter()
+        query_vectors.append(backend.embed([query], backend.dimension)[0])
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    query_vectors = truncate_and_normalize(np.vstack(query_vectors), backend.dimension)
+    top = np.argsort(-(query_vectors @ corpus.T), axis=1)[:, :TOP_K]
+
+    return {
+        "model": backend.model_id,
+        "dimension": backend.dimension,
+        "chunks_per_s": len(chunks) / index_seconds if index_seconds else float("inf"),
+        "query_ms_p50": statistics.median(latencies),
+        "query_ms_max": max(latencies),
+        "top": top,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("files", nargs="*", help="plain-text files to use instead of the DB")
+    parser.add_argument("--backends", nargs="+", default=["hashing"], choices=sorted(EMBEDDING_BACKENDS))
+    parser.add_argument("--limit", type=int, default=200, help="prescriptions to sample from the DB")
+    parser.add_argument("--queries", type=int, default=50, help="verbatim-window queries to add")
+    args = parser.parse_args()
+
+    chunks = load_files(args.files) if args.files else load_corpus(args.limit)
+    if len(chunks) <= TOP_K:
+        print(f"Need more than {TOP_K} chunks, found {len(chunks)}.")
+        return
+
+    queries = make_queries(chunks, args.queries)
+    print(f"{len(chunks)} chunks, {len(queries)} queries")
+
+    results = {name: run_backend(name, chunks, queries) for name in args.backends}
+    reference = results[args.backends[0]]["top"]
+
+    print()
+    print(f"{'backend':>22} {'dim':>5} {'chunks/s':>10} {'q p50 ms':>9} {'q max ms':>9} {'agree@' + str(TOP_K):>9}")
+    for name, row in results.items():
+        agreement = np.mean([
+            len(set(row["top"][i]) & set(reference[i])) / TOP_K for i in range(len(reference))
+        ])
+        print(
+            f"{name:>22} {row['dimension']:>5} {row['chunks_per_s']:>10.1f} "
+            f"{row['query_ms_p50']:>9.2f} {row['query_ms_max']:>9.2f} {agreement:>9.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
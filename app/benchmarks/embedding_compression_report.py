@@ -0,0 +1,176 @@
+"""
+Recall-vs-memory report for compact embedding settings.
+
+Embeds the OCR text of stored prescriptions once at full size, then compares
+truncated dimensions and FAISS encodings (flat / fp16 / sq8 / pq) against an
+exact float32 baseline at the backend's native dimension over the pooled chunk corpus.
+
+Usage:
+    python -m app.benchmarks.embedding_compression_report --limit 500
+    python -m app.benchmarks.embedding_compression_report --write-codebook sq8
+
+--write-codebook trains the chosen encoding at the configured embedding size on
+the corpus and saves it to VECTOR_CODEBOOK_PATH for VectorStoreService to clone.
+"""
+import argparse
+import os
+import random
+import time
+import faiss
+import numpy as np
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models import user, prescription  # noqa: F401 (register mappers)
+from app.models.prescription import Prescription
+from app.services.embedding_service import generate_embeddings_batch, truncate_and_normalize
+from app.services.embedding_backends import embedding_dimension, get_embedding_backend
+from app.services.vector_store_service import build_index
+from app.utils.text_chunker import chunk_text
+
+# Truncated sizes compared against the native one (larger ones are skipped)
+DIMENSIONS = [1536, 768, 256]
+INDEX_TYPES = ["flat", "fp16", "sq8", "pq"]
+TOP_K = 5
+EMBED_BATCH = 100
+
+PATIENT_QUESTIONS = [
+    "what is this medicine for",
+    "how many times a day should i take it",
+    "should i take it before or after food",
+    "how long do i need to continue the tablets",
+    "what are the side effects",
+    "what did the doctor diagnose",
+    "when is my next follow up",
+    "can i take it at night",
+    "what is the dose of the syrup",
+    "are there any warnings or precautions",
+]
+
+
+def load_corpus(limit: int):
+    db = SessionLocal()
+    try:
+        rows = db.query(Prescription.extracted_text).limit(limit).all()
+    finally:
+        db.close()
+
+    chunks = []
+    for (text,) in rows:
+        if text and text.strip():
+            chunks.extend(chunk_text(text.lower()))
+    return chunks
+
+
+def embed_all(texts, dimension: int):
+    matrices = [
+        generate_embeddings_batch(texts[i:i + EMBED_BATCH], dimension=dimension)
+        for i in range(0, len(texts), EMBED_BATCH)
+    ]
+    return np.vstack(matrices)
+
+
+def make_queries(chunks, sample: int, seed: int = 7):
+    """
+    Fixed patient questions plus short verbatim windows from random chunks.
+    """
+    rng = random.Random(seed)
+    queries = list(PATIENT_QUESTIONS)
+    for chunk in rng.sample(chunks, min(sample, len(chunks))):
+        words = chunk.split()
+        start = rng.randrange(max(1, len(words) - 20))
+        queries.append(" ".join(words[start:start + 20]))
+    return queries
+
+
+def pq_nbits(n_vectors: int):
+    # FAISS wants ~39 training points per centroid
+    for nbits in (8, 6, 5, 4):
+        if n_vectors >= 39 * (1 << nbits):
+            return nbits
+    return None
+
+
+def evaluate(corpus, queries, truth, dimension, index_type):
+    corpus_d = truncate_and_normalize(corpus, dimension)
+    queries_d = truncate_and_normalize(queries, dimension)
+
+    if index_type == "pq":
+        nbits = pq_nbits(len(corpus_d))
+        if nbits is None:
+            return None
+        index = faiss.IndexPQ(dimension, dimension // 16, nbits, faiss.METRIC_INNER_PRODUCT)
+    else:
+        index = build_index(dimension, index_type)
+
+    if not index.is_trained:
+        index.train(corpus_d)
+    index.add(corpus_d)
+
+    start = time.perf_counter()
+    _, found = index.search(queries_d, TOP_K)
+    search_ms = (time.perf_counter() - start) * 1000 / len(queries_d)
+
+    recall_1 = np.mean(found[:, 0] == truth[:, 0])
+    recall_k = np.mean([
+        len(set(found[i]) & set(truth[i])) / TOP_K for i in range(len(truth))
+    ])
+
+    return {
+        "bytes_per_vector": index.sa_code_size(),
+        "total_mb": index.sa_code_size() * index.ntotal / 1e6,
+        "recall_1": recall_1,
+        "recall_k": recall_k,
+        "search_ms": search_ms,
+    }
+
+
+def write_codebook(corpus, index_type):
+    dimension = embedding_dimension()
+    index = build_index(dimension, index_type, settings.VECTOR_PQ_M)
+    index.train(truncate_and_normalize(corpus, dimension))
+    os.makedirs(os.path.dirname(settings.VECTOR_CODEBOOK_PATH) or ".", exist_ok=True)
+    faiss.write_index(index, settings.VECTOR_CODEBOOK_PATH)
+    print(f"Wrote {index_type} codebook (dim={dimension}) to {settings.VECTOR_CODEBOOK_PATH}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--limit", type=int, default=1000, help="prescriptions to sample")
+    parser.add_argument("--queries", type=int, default=200, help="verbatim-window queries to add")
+    parser.add_argument("--write-codebook", choices=["sq8", "pq"])
+    args = parser.parse_args()
+
+    chunks = load_corpus(args.limit)
+    if len(chunks) <= TOP_K:
+        print(f"Need more than {TOP_K} chunks, found {len(chunks)}.")
+        return
+
+    full_dim = get_embedding_backend().dimension
+    queries = make_queries(chunks, args.queries)
+    print(f"Embedding {len(chunks)} chunks and {len(queries)} queries at {full_dim} dims...")
+    corpus = embed_all(chunks, full_dim)
+    query_vectors = embed_all(queries, full_dim)
+
+    baseline = faiss.IndexFlatIP(full_dim)
+    baseline.add(corpus)
+    _, truth = baseline.search(query_vectors, TOP_K)
+
+    print()
+    print(f"{'dim':>5} {'type':>5} {'B/vec':>7} {'MB':>9} {'R@1':>6} {'R@' + str(TOP_K):>6} {'ms/q':>7}")
+    for dimension in [full_dim] + [d for d in DIMENSIONS if d < full_dim]:
+        for index_type in INDEX_TYPES:
+            row = evaluate(corpus, query_vectors, truth, dimension, index_type)
+            if row is None:
+                print(f"{dimension:>5} {index_type:>5}   (too few vectors to train PQ)")
+                continue
+            print(
+                f"{dimension:>5} {index_type:>5} {row['bytes_per_vector']:>7} {row['total_mb']:>9.2f} "
+                f"{row['recall_1']:>6.3f} {row['recall_k']:>6.3f} {row['search_ms']:>7.3f}"
+            )
+
+    if args.write_codebook:
+        write_codebook(corpus, args.write_codebook)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Microbenchmark of medicine detection on prescriptions with many medicines.
+
+previous: the old per-turn MedicineMatcher.detect (keyword loops, regex
+          cleaning of every name and one fuzz.partial_ratio per medicine).
+compiled: CompiledMedicineMatcher built once per prescription; build time is
+          reported separately.
+
+Usage: python -m app.benchmarks.medicine_matcher_benchmark [--sizes 5 20 100 300] [--runs 200]
+"""
+import argparse
+import random
+import time
+from rapidfuzz import fuzz
+from app.utils.medicine_matcher import (
+    CompiledMedicineMatcher, GLOBAL_MEDICINE_KEYWORDS, ORDINAL_MAP,
+    normalize_text, clean_medicine_name
+)
+
+NAMES = [
+    "Amoxicillin", "Paracetamol", "Metformin", "Atorvastatin", "Amlodipine", "Omeprazole",
+    "Pantoprazole", "Cetirizine", "Azithromycin", "Losartan", "Levothyroxine", "Ibuprofen",
+    "Montelukast", "Ondansetron", "Prednisolone", "Doxycycline", "Clopidogrel", "Furosemide",
+]
+FORMS = ["Tab", "Cap", "Syrup", "Inj"]
+QUESTIONS = [
+    "how do i take {name}",
+    "what is the dosage of the second medicine",
+    "can i take {name} after food",
+    "tell me about all medicines",
+    "what are the side effects",
+    "how long should i continue {name}",
+]
+
+
+def previous_detect(question, medicines):
+    normalized_question = normalize_text(question)
+
+    for keyword in GLOBAL_MEDICINE_KEYWORDS:
+        if keyword in normalized_question:
+            return {"type": "all", "medicines": medicines}
+
+    for word, idx in ORDINAL_MAP.items():
+        if word in normalized_question and idx < len(medicines):
+            return {"type": "index", "medicines": [medicines[idx]]}
+
+    matches = []
+    for med in medicines:
+        score = fuzz.partial_ratio(clean_medicine_name(med.get("medicine_name", "")), normalized_question)
+        if score >= 75:
+            matches.append((score, med))
+
+    if matches:
+        matches.sort(key=lambda x: x[0], reverse=True)
+        return {"type": "name", "medicines": [m[1] for m in matches]}
+
+    return {"type": None, "medicines": []}
+
+
+def make_medicines(count, rng):
+    return [
+        {"medicine_name": f"{rng.choice(FORMS)} {NAMES[i % len(NAMES)]}{'' if i < len(NAMES) else f' {i}'} {rng.choice([250, 500, 650])}"}
+        for i in range(count)
+    ]
+
+
+def make_questions(medicines, rng, count=50):
+    return [
+        rng.choice(QUESTIONS).format(name=rng.choice(medicines)["medicine_name"].split()[1].lower())
+        for _ in range(count)
+    ]
+
+
+def per_call_us(fn, questions, runs):
+    start = time.perf_counter()
+    for _ in range(runs):
+        for question in questions:
+            fn(question)
+    return (time.perf_counter() - start) * 1e6 / (runs * len(questions))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[5, 20, 100, 300])
+    parser.add_argument("--runs", type=int, default=200)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    print(f"{'medicines':>9} {'previous us':>12} {'compiled us':>12} {'speedup':>8} {'build us':>9}")
+    for size in args.sizes:
+        medicines = make_medicines(size, rng)
+        questions = make_questions(medicines, rng)
+
+        start = time.perf_counter()
+        matcher = CompiledMedicineMatcher(medicines)
+        build_us = (time.perf_counter() - start) * 1e6
+
+        previous = per_call_us(lambda q: previous_detect(q, medicines), questions, args.runs)
+        compiled = per_call_us(matcher.detect, questions, args.runs)
+        print(f"{size:>9} {previous:>12.1f} {compiled:>12.1f} {previous / compiled:>7.1f}x {build_us:>9.0f}")
+
+
+if __name__ == "__main__":
+    main()
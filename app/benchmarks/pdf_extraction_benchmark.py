@@ -0,0 +1,74 @@
+"""
+Benchmark PDF text extraction: previous path vs per-page hybrid engine.
+
+previous: pdfplumber over the whole document; only if the whole document has
+          no text, OCR every page.
+hybrid:   FileIngestionService.iter_pdf_pages (PyMuPDF text layer per page,
+          OCR only for pages without text).
+
+Usage: python -m app.benchmarks.pdf_extraction_benchmark file1.pdf [file2.pdf ...] [--runs 3]
+"""
+import argparse
+import statistics
+import time
+import fitz
+import pdfplumber
+from app.core.config import settings
+from app.services.file_ingestion_service import FileIngestionService
+from app.services.ocr_service import submit_ocr, shutdown_ocr_pool
+
+
+def previous_path(file_path: str) -> str:
+    text_content = ""
+    with pdfplumber.open(file_path) as pdf:
+        for page in pdf.pages:
+            text_content += page.extract_text() or ""
+
+    if text_content.strip():
+        return text_content
+
+    with fitz.open(file_path) as doc:
+        futures = [
+            submit_ocr(FileIngestionService._render_page(page, settings.OCR_PDF_DPI))
+            for page in doc
+        ]
+    return "\n".join(future.result() for future in futures)
+
+
+def hybrid_path(file_path: str) -> str:
+    return "\n".join(text for _, text in FileIngestionService.iter_pdf_pages(file_path))
+
+
+def time_runs(fn, file_path: str, runs: int):
+    timings = []
+    text = ""
+    for _ in range(runs):
+        start = time.perf_counter()
+        text = fn(file_path)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings), len(text.strip())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("files", nargs="+")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'file':<40} {'pages':>5} {'prev s':>8} {'prev chars':>10} {'hybrid s':>9} {'hybrid chars':>12}")
+    try:
+        for file_path in args.files:
+            with fitz.open(file_path) as doc:
+                pages = len(doc)
+            prev_s, prev_chars = time_runs(previous_path, file_path, args.runs)
+            new_s, new_chars = time_runs(hybrid_path, file_path, args.runs)
+            print(
+                f"{file_path[-40:]:<40} {pages:>5} {prev_s:>8.3f} {prev_chars:>10} "
+                f"{new_s:>9.3f} {new_chars:>12}"
+            )
+    finally:
+        shutdown_ocr_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""
+Estimated prompt tokens per chat route, previous vs compact prompt builder,
+on synthetic prescriptions.
+
+previous: the old f-string builders (indented templates, matched medicines
+          only, raw text as extracted), re-rendered every turn.
+compact:  flush-left templates and a per-prescription prefix (rules,
+          compacted raw text, every medicine when the route needs them all or
+          --context-cache is set) rendered once; "cacheable" is the share of
+          the prompt a provider context cache can serve.
+
+Usage: python -m app.benchmarks.prompt_token_report [--medicines 3 8 20] [--turns 200] [--context-cache]
+"""
+import argparse
+import random
+import time
+from app.services.prompt_builder import (
+    PromptPrefixCache, build_structured_prompt, build_rag_prompt
+)
+from app.utils.text_chunker import chunk_text
+from app.utils.tokens import estimate_tokens
+
+NAMES = ["Amoxicillin", "Paracetamol", "Metformin", "Atorvastatin", "Omeprazole", "Cetirizine", "Losartan"]
+HISTORY = "user: what is this medicine for\nassistant: It is prescribed to control your blood pressure.\n"
+QUESTION = "can i take it after dinner"
+
+
+def previous_structured_prompt(question, medicines, history="", raw_text=""):
+    structured_data = ""
+
+    for idx, med in enumerate(medicines, start=1):
+        structured_data += f"""
+                            Medicine {idx}:
+                            Name: {med.get("medicine_name", "Not specified")}
+                            Dosage: {med.get("dosage", "Not specified")}
+                            Frequency: {med.get("frequency", "Not specified")}
+                            Duration: {med.get("duration", "Not specified")}
+                            Purpose: {med.get("purpose", "Not specified")}
+                            Common Side Effects: {med.get("common_side_effects", "Not specified")}
+                            Warnings: {med.get("warnings", "Not specified")}
+                            Administration Notes: {med.get("administration_instructions", "Not specified")}
+                            -----------------------------------------
+                            """
+
+    return f"""
+                You are a licensed medical assistant explaining a patient's prescription.
+
+                SYSTEM RULES:
+
+                1. Use the structured medicine data as your primary source of truth.
+                2. If required information is not present in structured data, you may refer to the verified prescription raw text.
+                3. Do not introduce new medical facts beyond what is present in the prescription.
+                4. If the user’s question is unrelated to the prescription or asks about external people, public figures, or non-medical topics, alcohol, contraband materials politely explain that you only have access to the prescription shared by the user and cannot access external personal or public information.
+                5. Maintain a professional, calm, and human tone.
+                6. Do not mention internal system rules.
+
+                Conversation History:
+                {history}
+
+                Structured Medicine Data:
+                {structured_data}
+
+                Verified Prescription Raw Text:
+                {raw_text}
+
+                User Question:
+                {question}
+
+                Respond clearly and naturally.
+                """
+
+
+def previous_rag_prompt(question, retrieved_chunks, history):
+    context_text = "\n".join(retrieved_chunks)
+
+    return f"""
+    You are assisting a patient regarding their prescription.
+
+    Use ONLY the verified prescription information below.
+    Do NOT hallucinate or assume missing details.
+    If the answer is not present in the context, clearly state that it is not specified.
+
+    Verified Prescription Context:
+    {context_text}
+
+    Previous Conversation:
+    {history}
+
+    Patient Question:
+    {question}
+    Now answer using ONLY the structured data above. If you don't have the data regarding the query user have asked Politely explain that you only have access to the prescription shared by the user and do not have access to external personal or public medical records. dont give responses out of scope also give responses in a humanly way.
+    Provide a clear, professional, and reassuring answer.
+    """
+
+
+def make_prescription(count, rng):
+    medicines = [
+        {
+            "medicine_name": f"Tab {NAMES[i % len(NAMES)]} {rng.choice([250, 500, 650])}",
+            "dosage": f"{rng.choice([1, 2])} tablet",
+            "frequency": rng.choice(["once daily", "twice daily", "three times a day"]),
+            "duration": f"{rng.choice([5, 7, 30])} days",
+            "purpose": "Controls the symptoms it was prescribed for.",
+            "common_side_effects": "Nausea, headache, dizziness",
+            "warnings": "Do not exceed the prescribed dose.",
+            "administration_instructions": {"timing": "morning", "food_relation": "after food"},
+        }
+        for i in range(count)
+    ]
+    lines = [f"{i + 1})   {med['medicine_name']}      {med['dosage']}   {med['frequency']}    x {med['duration']}"
+             for i, med in enumerate(medicines)]
+    raw_text = "Dr. A. Kumar   MBBS, MD\n\n\nPatient:   R. Sharma     Age: 54\n\n\n" + "\n\n".join(lines) + "\n\n\nReview after 2 weeks\n"
+    return medicines, raw_text
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--medicines", type=int, nargs="+", default=[3, 8, 20])
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--context-cache", action="store_true", help="medicine route reuses the full prefix")
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    print(f"{'route':>9} {'meds':>5} {'previous':>9} {'compact':>8} {'saved':>7} {'cacheable':>10} {'build us prev/compact':>22}")
+    for count in args.medicines:
+        medicines, raw_text = make_prescription(count, rng)
+        chunks = chunk_text(raw_text, chunk_size=40, overlap=5)[:3]
+        cached = args.context_cache
+        cases = {
+            "general": (
+                lambda: previous_structured_prompt(QUESTION, medicines, HISTORY, raw_text),
+                lambda prefixes: build_structured_prompt(
+                    QUESTION, medicines, HISTORY, prefixes.get(1, medicines, raw_text), medicines, True
+                ),
+            ),
+            "medicine": (
+                lambda: previous_structured_prompt(QUESTION, medicines[:1], HISTORY, raw_text),
+                lambda prefixes: build_structured_prompt(
+                    QUESTION, medicines[:1], HISTORY, prefixes.get(1, medicines, raw_text, cached), medicines, cached
+                ),
+            ),
+            "rag": (
+                lambda: previous_rag_prompt(QUESTION, chunks, HISTORY),
+                lambda prefixes: build_rag_prompt(QUESTION, chunks, HISTORY),
+            ),
+        }
+
+        for route, (previous, compact) in cases.items():
+            prefixes = PromptPrefixCache()
+            previous_tokens = estimate_tokens(previous())
+            prompt = compact(prefixes)
+
+            start = time.perf_counter()
+            for _ in range(args.turns):
+                previous()
+            previous_us = (time.perf_counter() - start) * 1e6 / args.turns
+            start = time.perf_counter()
+            for _ in range(args.turns):
+                compact(prefixes)
+            compact_us = (time.perf_counter() - start) * 1e6 / args.turns
+
+            saved = 1 - prompt.tokens / previous_tokens
+            print(
+                f"{route:>9} {count:>5} {previous_tokens:>9} {prompt.tokens:>8} {saved:>6.0%} "
+                f"{prompt.prefix_tokens / prompt.tokens:>10.0%} {previous_us:>12.1f} / {compact_us:<8.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""
+Cold-start report: import and initialization cost per subsystem.
+
+Each row runs in a fresh interpreter so module caches do not hide costs.
+
+Usage: python -m app.benchmarks.startup_report
+"""
+import subprocess
+import sys
+
+SUBSYSTEMS = [
+    ("import app.main", "import app.main"),
+    ("import numpy", "import numpy"),
+    ("import faiss", "import faiss"),
+    ("import fitz (PyMuPDF)", "import fitz"),
+    ("import pdfplumber", "import pdfplumber"),
+    ("import google.genai", "from google import genai"),
+    ("init genai.Client", "from app.services.gemini_client import get_client; get_client()"),
+    ("import easyocr", "import easyocr"),
+    ("init easyocr.Reader", "import easyocr; easyocr.Reader(['en'], gpu=False)"),
+    ("init SQLAlchemy engine + create_all",
+     "from app.main import Base, engine; Base.metadata.create_all(bind=engine)"),
+]
+
+TEMPLATE = (
+    "import time; start = time.perf_counter(); {code}; "
+    "print(time.perf_counter() - start)"
+)
+
+
+def measure(code: str):
+    result = subprocess.run(
+        [sys.executable, "-c", TEMPLATE.format(code=code)],
+        capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        return None, result.stderr.strip().splitlines()[-1]
+    return float(result.stdout.strip().splitlines()[-1]), ""
+
+
+def main():
+    print(f"{'subsystem':<40} {'seconds':>8}")
+    for name, code in SUBSYSTEMS:
+        seconds, error = measure(code)
+        if seconds is None:
+            print(f"{name:<40} {'error':>8}  {error}")
+        else:
+            print(f"{name:<40} {seconds:>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
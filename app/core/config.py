@@ -8,5 +8,128 @@ class Settings:
     DATABASE_URL: str = os.getenv("DATABASE_URL")
     GEMINI_API_KEY: str = os.getenv("GEMINI_API_KEY")
 
+    # AsyncSession for async routes: "auto" (when the async driver - aiosqlite, asyncpg,
+    # aiomysql - is installed), "true" or "false". DATABASE_ASYNC_URL overrides the
+    # URL derived from DATABASE_URL.
+    DATABASE_ASYNC: str = os.getenv("DATABASE_ASYNC", "auto")
+    DATABASE_ASYNC_URL: str = os.getenv("DATABASE_ASYNC_URL", "")
+
+    # Connection pool for server databases (SQLite keeps SQLAlchemy's defaults)
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "10"))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+    DB_POOL_TIMEOUT: float = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+    DB_POOL_RECYCLE: int = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+    DB_POOL_PRE_PING: bool = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+
+    # SQLite: WAL journal, wait on a locked database instead of failing, page cache size
+    SQLITE_WAL: bool = os.getenv("SQLITE_WAL", "true").lower() == "true"
+    SQLITE_BUSY_TIMEOUT_MS: int = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+    SQLITE_CACHE_KB: int = int(os.getenv("SQLITE_CACHE_KB", "20000"))
+
+    # Gemini calls in flight from async routes, and pooled HTTP connections
+    GEMINI_MAX_CONCURRENCY: int = int(os.getenv("GEMINI_MAX_CONCURRENCY", "16"))
+    GEMINI_MAX_CONNECTIONS: int = int(os.getenv("GEMINI_MAX_CONNECTIONS", "32"))
+
+    # Embedding backend: "gemini", "sentence_transformers" (local CPU model) or "hashing"
+    # (dependency-free, for tests/offline benchmarks). Switching backends changes the
+    # vector space; per-prescription indexes are rebuilt on demand, shared shards are not.
+    EMBEDDING_BACKEND: str = os.getenv("EMBEDDING_BACKEND", "gemini")
+    EMBEDDING_LOCAL_MODEL: str = os.getenv("EMBEDDING_LOCAL_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+
+    # Embedding size: 0 = the backend's native size; smaller values use a truncated
+    # (Matryoshka) prefix
+    EMBEDDING_DIM: int = int(os.getenv("EMBEDDING_DIM", "0"))
+
+    # Embedding request limits: items/estimated tokens per call, calls in flight, retries of a failed call
+    EMBEDDING_MAX_BATCH_ITEMS: int = int(os.getenv("EMBEDDING_MAX_BATCH_ITEMS", "100"))
+    EMBEDDING_MAX_BATCH_TOKENS: int = int(os.getenv("EMBEDDING_MAX_BATCH_TOKENS", "20000"))
+    EMBEDDING_MAX_CONCURRENCY: int = int(os.getenv("EMBEDDING_MAX_CONCURRENCY", "4"))
+    EMBEDDING_MAX_RETRIES: int = int(os.getenv("EMBEDDING_MAX_RETRIES", "2"))
+
+    # Embedding cache: in-process LRU entries and memory budget (0 = unlimited), plus an
+    # optional SQLite file ("" disables it)
+    EMBEDDING_CACHE_SIZE: int = int(os.getenv("EMBEDDING_CACHE_SIZE", "10000"))
+    EMBEDDING_CACHE_MAX_BYTES: int = int(os.getenv("EMBEDDING_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+    EMBEDDING_CACHE_PATH: str = os.getenv("EMBEDDING_CACHE_PATH", "cache/embeddings.sqlite")
+
+    # Parsed LLM medicine extractions keyed by OCR text + prompt version ("" disables it)
+    EXTRACTION_CACHE_PATH: str = os.getenv("EXTRACTION_CACHE_PATH", "cache/extractions.sqlite")
+
+    # Chat history in prompts: tokens of recent messages kept verbatim, size of the
+    # rolling session summary older messages are folded into, and messages loaded per turn
+    CHAT_HISTORY_TOKEN_BUDGET: int = int(os.getenv("CHAT_HISTORY_TOKEN_BUDGET", "1200"))
+    CHAT_SUMMARY_TOKEN_BUDGET: int = int(os.getenv("CHAT_SUMMARY_TOKEN_BUDGET", "300"))
+    CHAT_HISTORY_MAX_MESSAGES: int = int(os.getenv("CHAT_HISTORY_MAX_MESSAGES", "40"))
+
+    # Chat prompts: rendered per-prescription prefixes kept in memory, and Gemini explicit
+    # context caching of prefixes of at least PROMPT_CONTEXT_CACHE_MIN_TOKENS for
+    # PROMPT_CONTEXT_CACHE_TTL seconds (implicit prefix caching needs no setup)
+    PROMPT_PREFIX_CACHE_SIZE: int = int(os.getenv("PROMPT_PREFIX_CACHE_SIZE", "1024"))
+    PROMPT_CONTEXT_CACHE: bool = os.getenv("PROMPT_CONTEXT_CACHE", "false").lower() == "true"
+    PROMPT_CONTEXT_CACHE_MIN_TOKENS: int = int(os.getenv("PROMPT_CONTEXT_CACHE_MIN_TOKENS", "1024"))
+    PROMPT_CONTEXT_CACHE_TTL: int = int(os.getenv("PROMPT_CONTEXT_CACHE_TTL", "3600"))
+
+    # Chat answer cache: seconds an answer is reused (0 disables it), minimum
+    # question similarity for a hit, answers kept per prescription and memory budget (0 = unlimited)
+    ANSWER_CACHE_TTL: float = float(os.getenv("ANSWER_CACHE_TTL", "86400"))
+    ANSWER_CACHE_THRESHOLD: float = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+    ANSWER_CACHE_MAX_PER_PRESCRIPTION: int = int(os.getenv("ANSWER_CACHE_MAX_PER_PRESCRIPTION", "200"))
+    ANSWER_CACHE_MAX_BYTES: int = int(os.getenv("ANSWER_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+    # RAG retrieval: chunks returned, and the share of (idf-weighted) question terms
+    # the best BM25 chunk must contain to skip the embedding call (above 1 never skips)
+    RAG_TOP_K: int = int(os.getenv("RAG_TOP_K", "8"))
+    RAG_LEXICAL_CONFIDENCE: float = float(os.getenv("RAG_LEXICAL_CONFIDENCE", "0.8"))
+
+    # Per-prescription index encoding: "flat", "fp16", "sq8" or "pq".
+    # sq8 and pq need a codebook trained by app.benchmarks.embedding_compression_report
+    # (--write-codebook); without one, new stores use fp16.
+    VECTOR_INDEX_TYPE: str = os.getenv("VECTOR_INDEX_TYPE", "flat")
+    VECTOR_PQ_M: int = int(os.getenv("VECTOR_PQ_M", "0"))  # 0 = dimension // 16
+    VECTOR_CODEBOOK_PATH: str = os.getenv("VECTOR_CODEBOOK_PATH", "vector_indexes/codebook.faiss")
+
+    # Vector index persistence
+    VECTOR_INDEX_DIR: str = os.getenv("VECTOR_INDEX_DIR", "vector_indexes")
+    VECTOR_INDEX_MMAP: bool = os.getenv("VECTOR_INDEX_MMAP", "true").lower() == "true"
+
+    # In-memory vector registry budget (0 = unlimited)
+    VECTOR_REGISTRY_MAX_BYTES: int = int(os.getenv("VECTOR_REGISTRY_MAX_BYTES", str(512 * 1024 * 1024)))
+    VECTOR_REGISTRY_MAX_ENTRIES: int = int(os.getenv("VECTOR_REGISTRY_MAX_ENTRIES", "0"))
+
+    # "per_prescription" (one index each) or "shared" (sharded ANN indexes).
+    # Shared shards are compressed through the factory string, e.g. "HNSW32,SQ8" or "IVF4096,PQ64".
+    VECTOR_STORE_MODE: str = os.getenv("VECTOR_STORE_MODE", "per_prescription")
+    SHARED_INDEX_SHARDS: int = int(os.getenv("SHARED_INDEX_SHARDS", "4"))
+    SHARED_INDEX_FACTORY: str = os.getenv("SHARED_INDEX_FACTORY", "HNSW32,Flat")
+    SHARED_INDEX_TRAIN_SIZE: int = int(os.getenv("SHARED_INDEX_TRAIN_SIZE", "20000"))
+    # A changed shard is saved in the background SAVE_INTERVAL seconds after its last
+    # save, or sooner once its changes reach SAVE_FRACTION of its size (saves copy the shard)
+    SHARED_INDEX_SAVE_INTERVAL: float = float(os.getenv("SHARED_INDEX_SAVE_INTERVAL", "300"))
+    SHARED_INDEX_SAVE_FRACTION: float = float(os.getenv("SHARED_INDEX_SAVE_FRACTION", "0.1"))
+    SHARED_INDEX_EF_SEARCH: int = int(os.getenv("SHARED_INDEX_EF_SEARCH", "128"))
+    SHARED_INDEX_NPROBE: int = int(os.getenv("SHARED_INDEX_NPROBE", "16"))
+
+    # OCR worker processes (0 = OCR on the request thread), queue bound and per-image timeout
+    OCR_WORKERS: int = int(os.getenv("OCR_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+    OCR_MAX_PENDING: int = int(os.getenv("OCR_MAX_PENDING", "32"))
+    OCR_TIMEOUT: float = float(os.getenv("OCR_TIMEOUT", "120"))
+    OCR_PDF_DPI: int = int(os.getenv("OCR_PDF_DPI", "200"))
+    # PDF pages with less text than this in their text layer are OCR'd
+    PDF_MIN_PAGE_TEXT_CHARS: int = int(os.getenv("PDF_MIN_PAGE_TEXT_CHARS", "16"))
+
+    # Startup warmup of heavy subsystems: "background", "blocking" or "off"
+    STARTUP_WARMUP: str = os.getenv("STARTUP_WARMUP", "background")
+
+    # /startup-report and /cache-stats (signed-in users only, and only when enabled)
+    DEBUG_ENDPOINTS: bool = os.getenv("DEBUG_ENDPOINTS", "false").lower() == "true"
+
+    # Background ingestion jobs
+    INGESTION_QUEUE_BACKEND: str = os.getenv("INGESTION_QUEUE_BACKEND", "inprocess")
+    INGESTION_WORKERS: int = int(os.getenv("INGESTION_WORKERS", "2"))
+    # Seconds between heartbeats of a running job, and without one before the job
+    # counts as abandoned by a dead worker and is failed
+    INGESTION_HEARTBEAT_INTERVAL: float = float(os.getenv("INGESTION_HEARTBEAT_INTERVAL", "15"))
+    INGESTION_HEARTBEAT_TIMEOUT: float = float(os.getenv("INGESTION_HEARTBEAT_TIMEOUT", "120"))
+
 
 settings = Settings()
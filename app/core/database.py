@@ -1,11 +1,75 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+import threading
+from contextlib import asynccontextmanager
+from typing import TYPE_CHECKING, Union
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
 from app.core.config import settings
+import logging
 
-engine = create_engine(
-    settings.DATABASE_URL,
-    connect_args={"check_same_thread": False}  # needed for SQLite
-)
+if TYPE_CHECKING:
+    # Imported lazily at runtime: sqlalchemy.ext.asyncio needs greenlet
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+logger = logging.getLogger(__name__)
+
+# backend -> async driver used when DATABASE_ASYNC_URL is not set
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "mysql": "mysql+aiomysql",
+}
+
+# Either kind of session; repositories take the sync one (see run_db)
+DbSession = Union[Session, "AsyncSession"]
+
+
+def _is_sqlite(url) -> bool:
+    return make_url(url).get_backend_name() == "sqlite"
+
+
+def engine_options(url) -> dict:
+    """
+    Pool settings for server databases. SQLite keeps SQLAlchemy's default
+    pool: connections to a local file are cheap.
+    """
+    if _is_sqlite(url):
+        return {}
+    return {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    }
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    if settings.SQLITE_WAL:
+        # Readers no longer block the writer (and vice versa); NORMAL sync is safe under WAL
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={settings.SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute(f"PRAGMA cache_size=-{settings.SQLITE_CACHE_KB}")
+    cursor.close()
+
+
+def _configure(engine, url):
+    if _is_sqlite(url):
+        event.listen(engine, "connect", _set_sqlite_pragmas)
+    return engine
+
+
+def _create_engine(url):
+    # Sessions cross threadpool threads, which SQLite refuses by default
+    connect_args = {"check_same_thread": False} if _is_sqlite(url) else {}
+    return _configure(create_engine(url, connect_args=connect_args, **engine_options(url)), url)
+
+
+engine = _create_engine(settings.DATABASE_URL)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -17,3 +81,133 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+_async_engine = None
+_async_session_factory = None
+_async_lock = threading.Lock()
+_async_checked = False
+
+
+def async_database_url() -> str:
+    if settings.DATABASE_ASYNC_URL:
+        return settings.DATABASE_ASYNC_URL
+    url = make_url(settings.DATABASE_URL)
+    return url.set(drivername=ASYNC_DRIVERS.get(url.get_backend_name(), url.drivername)).render_as_string(hide_password=False)
+
+
+def async_session_factory():
+    """
+    async_sessionmaker for async routes, created on first use, or None when
+    DATABASE_ASYNC is "false" or ("auto") the async driver is not installed.
+    """
+    global _async_engine, _async_session_factory, _async_checked
+    if _async_checked:
+        return _async_session_factory
+
+    with _async_lock:
+        if _async_checked:
+            return _async_session_factory
+
+        mode = settings.DATABASE_ASYNC.lower()
+        if mode != "false":
+            url = async_database_url()
+            try:
+                # Also raises ImportError without greenlet
+                from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+                _async_engine = create_async_engine(url, **engine_options(url))
+            except ImportError as e:
+                if mode == "true":
+                    raise
+                logger.info(f"Async database driver unavailable ({e}); async routes use the threadpool")
+            else:
+                _configure(_async_engine.sync_engine, url)
+                # Loaded attributes stay usable after commit: no lazy reload on the event loop
+                _async_session_factory = async_sessionmaker(_async_engine, autoflush=False, expire_on_commit=False)
+                logger.info(f"Async database engine: {_async_engine.url.drivername}")
+        _async_checked = True
+        return _async_session_factory
+
+
+@asynccontextmanager
+async def open_async_db():
+    """
+    An AsyncSession when available, otherwise a sync Session; either way
+    pass it to run_db.
+    """
+    factory = async_session_factory()
+    if factory is not None:
+        async with factory() as db:
+            yield db
+        return
+
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        await run_in_threadpool(db.close)
+
+
+async def get_async_db():
+    async with open_async_db() as db:
+        yield db
+
+
+async def run_db(db: DbSession, fn, *args, **kwargs):
+    """
+    Call a sync repository function fn(session, *args, **kwargs) from async
+    code: through AsyncSession.run_sync (async driver, no request thread)
+    or, for a sync Session, in the threadpool.
+
+    With an AsyncSession fn runs on the event loop thread, so it must only
+    issue SQL: file, CPU and network work goes through run_in_threadpool.
+    """
+    if isinstance(db, Session):
+        return await run_in_threadpool(fn, db, *args, **kwargs)
+    return await db.run_sync(lambda session: fn(session, *args, **kwargs))
+
+
+async def dispose_async_engine():
+    if _async_engine is not None:
+        await _async_engine.dispose()
+
+
+def add_missing_columns(bind=engine):
+    """
+    Additive schema sync for existing databases: create_all() creates missing
+    tables but never alters existing ones, so add nullable model columns an
+    existing table lacks. Anything beyond that needs a real migration.
+    """
+    inspector = inspect(bind)
+    with bind.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                if not column.nullable:
+                    logger.warning(f"Cannot add NOT NULL column {table.name}.{column.name}; migrate manually")
+                    continue
+                column_type = column.type.compile(dialect=bind.dialect)
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+                logger.info(f"Added column {table.name}.{column.name}")
+
+
+def add_missing_indexes(bind=engine):
+    """
+    Create model indexes an existing table lacks (create_all() skips tables
+    that already exist). Run after add_missing_columns().
+    """
+    inspector = inspect(bind)
+    with bind.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {index["name"] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name in existing:
+                    continue
+                index.create(conn)
+                logger.info(f"Created index {index.name} on {table.name}")
@@ -0,0 +1,38 @@
+import time
+import threading
+from contextlib import contextmanager
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class StartupTimings:
+    """
+    Records how long each subsystem took to import or initialize.
+    """
+
+    def __init__(self):
+        self.entries = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def measure(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.entries[name] = round(elapsed, 4)
+            logger.info(f"Startup timing: {name} took {elapsed:.3f}s")
+
+    def report(self) -> dict:
+        with self._lock:
+            entries = dict(self.entries)
+        return {
+            "subsystems": entries,
+            "total_seconds": round(sum(entries.values()), 4),
+        }
+
+
+startup_timings = StartupTimings()
@@ -1,12 +1,28 @@
-from fastapi import FastAPI, Request
-from app.core.database import engine
-from app.models import user, prescription
+from contextlib import asynccontextmanager
+import threading
+from fastapi import FastAPI, Request, Depends
+from app.core.startup_timing import startup_timings
+from app.core.config import settings
+from app.core.database import engine, add_missing_columns, add_missing_indexes, async_session_factory, dispose_async_engine
+from app.models import user, prescription, ingestion_job, uploaded_file
 from app.core.database import Base
-from app.api.v1 import prescription_routes
-from app.api.v1 import user_routes
-from app.api.v1 import chat_routes
-from app.api.v1 import auth_routes
+with startup_timings.measure("import api routes"):
+    from app.api.v1 import prescription_routes
+    from app.api.v1 import user_routes
+    from app.api.v1 import chat_routes
+    from app.api.v1 import auth_routes
 from app.core.logging_config import setup_logging
+from app.api.dependencies import require_debug_access
+from app.services.vector_registry import vector_registry
+from app.services.answer_cache import answer_cache
+from app.services.embedding_cache import embedding_cache
+from app.services.extraction_cache import extraction_cache
+from app.services.prompt_builder import prompt_prefixes
+from app.services.prompt_cache import context_cache, prompt_stats
+from app.services.job_queue import shutdown_job_queue
+from app.services.ingestion_service import recover_interrupted_jobs, watch_stale_jobs
+from app.services.ocr_service import shutdown_ocr_pool
+from app.services.warmup_service import warm_up
 import logging
 import time
 
@@ -14,15 +30,41 @@ setup_logging()
 logger = logging.getLogger(__name__)
 
 
-app = FastAPI(title="MedAssist AI")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    with startup_timings.measure("database create_all"):
+        Base.metadata.create_all(bind=engine)
+        add_missing_columns(engine)
+        add_missing_indexes(engine)
+    with startup_timings.measure("async database engine"):
+        async_session_factory()
+    with startup_timings.measure("ingestion job recovery"):
+        recover_interrupted_jobs()
+    stale_job_watch = threading.Event()
+    threading.Thread(target=watch_stale_jobs, args=(stale_job_watch,), name="stale-jobs", daemon=True).start()
 
-Base.metadata.create_all(bind=engine)
+    if settings.STARTUP_WARMUP == "blocking":
+        warm_up()
+    elif settings.STARTUP_WARMUP == "background":
+        threading.Thread(target=warm_up, name="warmup", daemon=True).start()
+
+    yield
+
+    stale_job_watch.set()
+    shutdown_job_queue()
+    shutdown_ocr_pool()
+    vector_registry.flush()
+    await dispose_async_engine()
+
+
+app = FastAPI(title="MedAssist AI", lifespan=lifespan)
 
 app.include_router(user_routes.router)
 app.include_router(prescription_routes.router)
 app.include_router(chat_routes.router)
 app.include_router(auth_routes.router)
 
+
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
     start_time = time.time()
@@ -48,3 +90,21 @@ async def log_requests(request: Request, call_next):
 @app.get("/")
 def root():
     return {"message": "MedAssist AI running with DB"}
+
+
+@app.get("/startup-report", dependencies=[Depends(require_debug_access)])
+def startup_report():
+    return startup_timings.report()
+
+
+@app.get("/cache-stats", dependencies=[Depends(require_debug_access)])
+def cache_stats():
+    return {
+        "answers": answer_cache.stats(),
+        "embeddings": embedding_cache.stats(),
+        "extractions": extraction_cache.stats(),
+        "prompt_prefixes": prompt_prefixes.stats(),
+        "context_cache": context_cache.stats(),
+        "prompt_tokens": prompt_stats.stats(),
+        "vector_registry": vector_registry.stats(),
+    }
@@ -1,8 +1,13 @@
-from sqlalchemy import Column, Integer, ForeignKey, Text, DateTime, String
+from sqlalchemy import Column, Integer, ForeignKey, Text, DateTime, String, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.models.base import Base
 
+# answered_by: which path produced an assistant message
+ANSWERED_BY_TEMPLATE = "template"  # structured field lookup, no LLM
+ANSWERED_BY_CACHE = "cache"        # answer cache hit
+ANSWERED_BY_LLM = "llm"
+
 class ChatMessage(Base):
     __tablename__ = "chat_messages"
 
@@ -10,6 +15,12 @@ class ChatMessage(Base):
     session_id = Column(Integer, ForeignKey("chat_sessions.id"), nullable=False)
     role = Column(String(20), nullable=False)  # user / assistant
     content = Column(Text, nullable=False)
+    answered_by = Column(String(20), nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
 
     session = relationship("ChatSession", back_populates="messages")
+
+    __table_args__ = (
+        # Latest messages of a session and keyset pages: (session_id, created_at, id)
+        Index("ix_chat_messages_session_created", "session_id", "created_at", "id"),
+    )
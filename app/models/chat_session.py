@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, ForeignKey, DateTime, Text, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.models.base import Base
@@ -10,8 +10,16 @@ class ChatSession(Base):
     prescription_id = Column(Integer, ForeignKey("prescriptions.id"), nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
 
+    # Rolling summary of all messages up to summary_message_id (history_service)
+    summary = Column(Text, nullable=True)
+    summary_message_id = Column(Integer, nullable=True)
+
     messages = relationship(
         "ChatMessage",
         back_populates="session",
         cascade="all, delete-orphan"
     )
+
+    __table_args__ = (
+        Index("ix_chat_sessions_prescription_created", "prescription_id", "created_at"),
+    )
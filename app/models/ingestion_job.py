@@ -0,0 +1,34 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text
+from datetime import datetime
+from app.models.base import Base
+
+# status
+STATUS_QUEUED = "queued"
+STATUS_RUNNING = "running"
+STATUS_COMPLETED = "completed"
+STATUS_FAILED = "failed"
+
+# stage
+STAGE_OCR = "ocr"
+STAGE_EXTRACTION = "extraction"
+STAGE_INDEXING = "indexing"
+STAGE_DONE = "done"
+
+
+class IngestionJob(Base):
+    __tablename__ = "ingestion_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    file_path = Column(String, nullable=False)
+    content_type = Column(String(50), nullable=False)
+    content_hash = Column(String(64), nullable=False)
+    status = Column(String(20), nullable=False, default=STATUS_QUEUED)
+    stage = Column(String(20), nullable=True)
+    prescription_id = Column(Integer, ForeignKey("prescriptions.id"), nullable=True)
+    error = Column(Text, nullable=True)
+    # Worker running the job and its last sign of life (see INGESTION_HEARTBEAT_*)
+    claimed_by = Column(String(64), nullable=True)
+    heartbeat_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
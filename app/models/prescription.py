@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, JSON
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, JSON, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.models.base import Base
@@ -14,3 +14,7 @@ class Prescription(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
 
     user = relationship("User")
+
+    __table_args__ = (
+        Index("ix_prescriptions_user_created", "user_id", "created_at"),
+    )
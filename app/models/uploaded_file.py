@@ -0,0 +1,20 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, JSON
+from datetime import datetime
+from app.models.base import Base
+
+
+class UploadedFile(Base):
+    """
+    Processing results of an upload, keyed by the sha256 of its bytes, so
+    re-uploads of the same file skip OCR, extraction and embedding.
+    """
+    __tablename__ = "uploaded_files"
+
+    content_hash = Column(String(64), primary_key=True)
+    file_path = Column(String, nullable=False)
+    content_type = Column(String(50), nullable=False)
+    extracted_text = Column(Text)
+    analysis_result = Column(JSON)
+    # Prescription whose vector index can be copied for duplicates
+    prescription_id = Column(Integer, ForeignKey("prescriptions.id"), nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
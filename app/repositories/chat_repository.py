@@ -1,4 +1,8 @@
+import base64
+from datetime import datetime
+from sqlalchemy import and_, or_
 from sqlalchemy.orm import Session
+from app.models.prescription import Prescription
 from app.models.chat_session import ChatSession
 from app.models.chat_message import ChatMessage
 import logging
@@ -6,6 +10,25 @@ import logging
 logger = logging.getLogger(__name__)
 
 
+def encode_cursor(message: ChatMessage) -> str:
+    """
+    Opaque keyset cursor: the (created_at, id) of the last message of a page.
+    """
+    raw = f"{message.created_at.isoformat()}|{message.id}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str):
+    """
+    (created_at, id) from encode_cursor(); ValueError when malformed.
+    """
+    try:
+        created_at, message_id = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8").split("|")
+        return datetime.fromisoformat(created_at), int(message_id)
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
 class ChatRepository:
 
     @staticmethod
@@ -24,12 +47,25 @@ class ChatRepository:
         ).first()
 
     @staticmethod
-    def save_message(db: Session, session_id: int, role: str, content: str):
+    def get_user_session(db: Session, session_id: int, user_id: int):
+        """
+        The session if its prescription belongs to user_id, else None.
+        """
+        return (
+            db.query(ChatSession)
+            .join(Prescription, Prescription.id == ChatSession.prescription_id)
+            .filter(ChatSession.id == session_id, Prescription.user_id == user_id)
+            .first()
+        )
+
+    @staticmethod
+    def save_message(db: Session, session_id: int, role: str, content: str, answered_by: str = None):
         logger.info(f"Saving message for session {session_id}, role={role}")
         message = ChatMessage(
             session_id=session_id,
             role=role,
-            content=content
+            content=content,
+            answered_by=answered_by
         )
         db.add(message)
         db.commit()
@@ -37,9 +73,137 @@ class ChatRepository:
         return message
 
     @staticmethod
-    def get_last_messages(db: Session, session_id: int, limit: int = 10):
-        messages = db.query(ChatMessage).filter(
-            ChatMessage.session_id == session_id
-        ).order_by(ChatMessage.created_at.desc()).limit(limit).all()
+    def update_summary(db: Session, session: ChatSession, summary: str, last_message_id: int):
+        session.summary = summary
+        session.summary_message_id = last_message_id
+        db.commit()
+
+    @staticmethod
+    def load_turn(db: Session, prescription_id: int, session_id: int, history_limit: int = 9):
+        """
+        Everything a chat turn reads, in two queries: the prescription with
+        the session (None unless it belongs to the prescription), then the
+        session's last history_limit messages not yet folded into its summary.
+        Returns (prescription, session, history).
+        """
+        if session_id:
+            row = db.query(Prescription, ChatSession).outerjoin(
+                ChatSession,
+                and_(ChatSession.id == session_id, ChatSession.prescription_id == Prescription.id)
+            ).filter(Prescription.id == prescription_id).first()
+            prescription, session = row if row else (None, None)
+        else:
+            prescription = db.query(Prescription).filter(Prescription.id == prescription_id).first()
+            session = None
+
+        if prescription is None or session is None:
+            return prescription, session, []
+
+        history = ChatRepository.get_last_messages(
+            db, session.id, limit=history_limit, after_id=session.summary_message_id
+        )
+        return prescription, session, history
+
+    @staticmethod
+    def get_last_messages(db: Session, session_id: int, limit: int = 10, after_id: int = None):
+        query = db.query(ChatMessage).filter(ChatMessage.session_id == session_id)
+        if after_id is not None:
+            query = query.filter(ChatMessage.id > after_id)
+        messages = query.order_by(ChatMessage.created_at.desc(), ChatMessage.id.desc()).limit(limit).all()
 
         return list(reversed(messages))
+
+    @staticmethod
+    def get_messages_between(db: Session, session_id: int, after_id: int = None, before_id: int = None, limit: int = 100):
+        """
+        Up to limit messages with after_id < id < before_id, oldest first.
+        """
+        query = db.query(ChatMessage).filter(ChatMessage.session_id == session_id)
+        if after_id is not None:
+            query = query.filter(ChatMessage.id > after_id)
+        if before_id is not None:
+            query = query.filter(ChatMessage.id < before_id)
+        return query.order_by(ChatMessage.id.asc()).limit(limit).all()
+
+    @staticmethod
+    def get_messages_page(db: Session, session_id: int, limit: int = 100, cursor: str = None):
+        """
+        One page of a session's history, newest page first, walked by keyset
+        on (created_at, id) so deep pages cost the same as the first.
+        Returns (messages oldest first, cursor of the next older page or None).
+        """
+        query = db.query(ChatMessage).filter(ChatMessage.session_id == session_id)
+        if cursor:
+            created_at, message_id = decode_cursor(cursor)
+            query = query.filter(or_(
+                ChatMessage.created_at < created_at,
+                and_(ChatMessage.created_at == created_at, ChatMessage.id < message_id)
+            ))
+
+        # One extra row tells whether an older page exists
+        messages = query.order_by(
+            ChatMessage.created_at.desc(), ChatMessage.id.desc()
+        ).limit(limit + 1).all()
+
+        next_cursor = encode_cursor(messages[limit - 1]) if len(messages) > limit else None
+        return list(reversed(messages[:limit])), next_cursor
+
+
+class ChatTurnUnitOfWork:
+    """
+    DB side of one chat turn. The prescription, session and recent history
+    are read up front (two queries); the user and assistant messages, plus
+    the session when it is new, are written together by commit() in a
+    single transaction. Nothing is written if the turn fails.
+    """
+
+    def __init__(self, db: Session, prescription, session, history: list, question: str):
+        self.db = db
+        self.prescription = prescription
+        self.prescription_id = prescription.id
+        self.session_id = session.id if session is not None else None
+        self.summary = session.summary if session is not None else None
+        self.history = history
+        self.question = question
+        self.asked_at = datetime.utcnow()
+
+    def ensure_session(self, db: Session = None) -> int:
+        """
+        Persist a new session right away, for callers that must hand out
+        its id before the answer exists (streaming).
+        """
+        db = db or self.db
+        if self.session_id is None:
+            session = ChatSession(prescription_id=self.prescription_id, created_at=self.asked_at)
+            db.add(session)
+            db.flush()
+            self.session_id = session.id
+            db.commit()
+        return self.session_id
+
+    def commit(self, answer: str, answered_by: str = None, db: Session = None) -> datetime:
+        """
+        Write the question and answer (and a new session) in one transaction.
+        db overrides the session used for writing, e.g. after the request's
+        one was closed. Returns the answer's created_at.
+        """
+        db = db or self.db
+        if self.session_id is None:
+            session = ChatSession(prescription_id=self.prescription_id, created_at=self.asked_at)
+            db.add(session)
+            db.flush()
+            self.session_id = session.id
+
+        answered_at = datetime.utcnow()
+        logger.info(f"Saving chat turn for session {self.session_id}")
+        db.add_all([
+            ChatMessage(
+                session_id=self.session_id, role="user", content=self.question, created_at=self.asked_at
+            ),
+            ChatMessage(
+                session_id=self.session_id, role="assistant", content=answer,
+                answered_by=answered_by, created_at=answered_at
+            ),
+        ])
+        db.commit()
+        return answered_at
@@ -0,0 +1,98 @@
+from datetime import datetime
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+from app.models.ingestion_job import IngestionJob, STATUS_QUEUED, STATUS_RUNNING, STATUS_FAILED
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class IngestionJobRepository:
+
+    @staticmethod
+    def create_job(db: Session, user_id: int, file_path: str, content_type: str, content_hash: str):
+        job = IngestionJob(
+            user_id=user_id,
+            file_path=file_path,
+            content_type=content_type,
+            content_hash=content_hash
+        )
+        db.add(job)
+        db.commit()
+        db.refresh(job)
+        return job
+
+    @staticmethod
+    def get_job(db: Session, job_id: int):
+        return db.query(IngestionJob).filter(IngestionJob.id == job_id).first()
+
+    @staticmethod
+    def update_job(db: Session, job: IngestionJob, **fields):
+        for name, value in fields.items():
+            setattr(job, name, value)
+        db.add(job)
+        db.commit()
+        db.refresh(job)
+        logger.info(f"Ingestion job {job.id}: status={job.status}, stage={job.stage}")
+        return job
+
+    @staticmethod
+    def claim_job(db: Session, job_id: int, worker_id: str) -> bool:
+        """
+        Move a queued job to running on worker_id. False if it was already
+        claimed (e.g. enqueued twice by startup recovery) or is no longer queued.
+        """
+        now = datetime.utcnow()
+        claimed = (
+            db.query(IngestionJob)
+            .filter(IngestionJob.id == job_id, IngestionJob.status == STATUS_QUEUED)
+            .update(
+                {"status": STATUS_RUNNING, "claimed_by": worker_id, "heartbeat_at": now, "updated_at": now},
+                synchronize_session=False
+            )
+        )
+        db.commit()
+        return claimed == 1
+
+    @staticmethod
+    def heartbeat(db: Session, job_id: int, worker_id: str) -> bool:
+        """
+        Record that worker_id is still running the job. False once the job
+        is no longer running on it (finished, or failed as stale).
+        """
+        touched = (
+            db.query(IngestionJob)
+            .filter(
+                IngestionJob.id == job_id,
+                IngestionJob.status == STATUS_RUNNING,
+                IngestionJob.claimed_by == worker_id
+            )
+            .update({"heartbeat_at": datetime.utcnow()}, synchronize_session=False)
+        )
+        db.commit()
+        return touched == 1
+
+    @staticmethod
+    def get_queued_job_ids(db: Session):
+        rows = db.query(IngestionJob.id).filter(IngestionJob.status == STATUS_QUEUED).order_by(IngestionJob.id).all()
+        return [row.id for row in rows]
+
+    @staticmethod
+    def fail_stale_jobs(db: Session, error: str, stale_before: datetime) -> int:
+        """
+        Fail running jobs whose worker has not sent a heartbeat since
+        stale_before; jobs live workers are still running are left alone.
+        """
+        failed = (
+            db.query(IngestionJob)
+            .filter(
+                IngestionJob.status == STATUS_RUNNING,
+                or_(IngestionJob.heartbeat_at.is_(None), IngestionJob.heartbeat_at < stale_before)
+            )
+            .update(
+                {"status": STATUS_FAILED, "error": error, "updated_at": datetime.utcnow()},
+                synchronize_session=False
+            )
+        )
+        db.commit()
+        return failed
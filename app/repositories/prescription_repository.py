@@ -24,6 +24,13 @@ class PrescriptionRepository:
         db.refresh(prescription)
         return prescription
 
+    @staticmethod
+    def get_user_prescription_for_file(db: Session, user_id: int, image_path: str):
+        return db.query(Prescription).filter(
+            Prescription.user_id == user_id,
+            Prescription.image_path == image_path
+        ).first()
+
     @staticmethod
     def get_prescriptions_by_user(db: Session, user_id: int):
         return db.query(Prescription).filter(
@@ -0,0 +1,44 @@
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.models.uploaded_file import UploadedFile
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class UploadedFileRepository:
+
+    @staticmethod
+    def get_by_hash(db: Session, content_hash: str):
+        return db.query(UploadedFile).filter(UploadedFile.content_hash == content_hash).first()
+
+    @staticmethod
+    def record(
+        db: Session,
+        content_hash: str,
+        file_path: str,
+        content_type: str,
+        extracted_text: str,
+        analysis_result,
+        prescription_id: int
+    ):
+        """
+        Insert the results for content_hash. When a concurrent first upload
+        of the same bytes recorded it first, keep (and return) that row.
+        """
+        uploaded = UploadedFile(
+            content_hash=content_hash,
+            file_path=file_path,
+            content_type=content_type,
+            extracted_text=extracted_text,
+            analysis_result=analysis_result,
+            prescription_id=prescription_id
+        )
+        db.add(uploaded)
+        try:
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+            logger.info(f"Upload {content_hash[:12]} was recorded concurrently; keeping the first record")
+            return UploadedFileRepository.get_by_hash(db, content_hash)
+        return uploaded
@@ -15,6 +15,10 @@ class UserRepository:
         db.refresh(user)
         return user
 
+    @staticmethod
+    def get_user_by_id(db: Session, user_id: int):
+        return db.query(User).filter(User.id == user_id).first()
+
     @staticmethod
     def get_user_by_email(db: Session, email: str):
         return db.query(User).filter(User.email == email).first()
@@ -12,6 +12,7 @@ class ChatResponse(BaseModel):
     session_id: int
     answer: str
     created_at: datetime
+    answered_by: Optional[str] = None
 
 
 class ChatMessageResponse(BaseModel):
@@ -20,6 +21,7 @@ class ChatMessageResponse(BaseModel):
     role: str
     content: str
     created_at: datetime
+    answered_by: Optional[str] = None
 
     class Config:
         from_attributes = True
@@ -0,0 +1,16 @@
+from pydantic import BaseModel
+from typing import Optional
+from datetime import datetime
+
+
+class IngestionJobResponse(BaseModel):
+    id: int
+    status: str
+    stage: Optional[str] = None
+    prescription_id: Optional[int] = None
+    error: Optional[str] = None
+    created_at: datetime
+    updated_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
@@ -0,0 +1,23 @@
+"""
+Rebuild on-disk vector indexes for prescriptions that were never saved.
+
+Usage: python -m app.scripts.rebuild_vector_indexes
+"""
+from app.core.database import SessionLocal
+from app.core.logging_config import setup_logging
+from app.models import user, prescription  # noqa: F401 (register mappers)
+from app.services.indexing_service import rebuild_missing_indexes
+
+
+def main():
+    setup_logging()
+    db = SessionLocal()
+    try:
+        count = rebuild_missing_indexes(db)
+    finally:
+        db.close()
+    print(f"Rebuilt {count} vector indexes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from app.core.config import settings
+from app.services.embedding_cache import normalize_for_cache
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def question_key(question: str) -> str:
+    """
+    Normalized question text: case, spacing and trailing punctuation ignored.
+    """
+    return normalize_for_cache(question).rstrip("?!. ")
+
+
+def medicines_key(medicines) -> str:
+    """
+    Stable digest of the medicines a structured answer was built from.
+    """
+    if not medicines:
+        return ""
+    raw = json.dumps(medicines, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class AnswerCache:
+    """
+    Chat answers per prescription, scoped by (route, medicines key).
+    get_exact() finds the same question by its normalized text; get()
+    returns the answer of the most similar earlier question in the same
+    scope when its cosine similarity reaches the threshold. Only
+    questions asked without conversation history belong here: follow-ups
+    ("why?", "how long?") depend on context the key does not capture.
+
+    Entries expire after ttl seconds (0 disables the cache); each
+    prescription keeps at most max_entries answers and the whole cache at
+    most max_bytes (0 = unlimited), least recently used dropped first.
+    """
+
+    def __init__(
+        self,
+        ttl: float = settings.ANSWER_CACHE_TTL,
+        threshold: float = settings.ANSWER_CACHE_THRESHOLD,
+        max_entries: int = settings.ANSWER_CACHE_MAX_PER_PRESCRIPTION,
+        max_bytes: int = settings.ANSWER_CACHE_MAX_BYTES
+    ):
+        self.ttl = ttl
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        # (prescription_id, route, medicines key, question) -> (vector, answer, stored_at, size), LRU order
+        self._entries = OrderedDict()
+        # prescription_id -> {entry key: None}, insertion order
+        self._by_prescription = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    def _remove(self, key):
+        _, _, _, size = self._entries.pop(key)
+        self._bytes -= size
+        keys = self._by_prescription[key[0]]
+        del keys[key]
+        if not keys:
+            del self._by_prescription[key[0]]
+
+    def _evict(self, now: float):
+        # Expired entries at the LRU end first, then whatever exceeds the budget
+        while self._entries:
+            key, (_, _, stored_at, _) = next(iter(self._entries.items()))
+            expired = now - stored_at > self.ttl
+            if not expired and not (self.max_bytes and self._bytes > self.max_bytes):
+                break
+            self._remove(key)
+            if not expired:
+                self.evictions += 1
+
+    def get_exact(self, prescription_id: int, route: str, medicines: str, question: str):
+        """
+        Cached answer for the same question (see question_key), or None.
+        Needs no embedding, so it can run before any is computed.
+        """
+        if not self.enabled:
+            return None
+
+        key = (prescription_id, route, medicines, question_key(question))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[2] <= self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                logger.info(f"Answer cache hit for prescription_id={prescription_id} (same question)")
+                return entry[1]
+            return None
+
+    def get(self, prescription_id: int, route: str, medicines: str, question_vector):
+        """
+        Cached answer for a near-duplicate question, or None.
+        """
+        if not self.enabled or question_vector is None:
+            return None
+
+        query = np.asarray(question_vector, dtype="float32")
+        now = time.monotonic()
+        best_score, best_key = -1.0, None
+
+        with self._lock:
+            for key in list(self._by_prescription.get(prescription_id, ())):
+                vector, _, stored_at, _ = self._entries[key]
+                if now - stored_at > self.ttl:
+                    self._remove(key)
+                    continue
+                if key[1] != route or key[2] != medicines or vector is None:
+                    continue
+                # Embeddings are normalized, so the dot product is cosine similarity
+                score = float(np.dot(vector, query))
+                if score > best_score:
+                    best_score, best_key = score, key
+
+            if best_key is not None and best_score >= self.threshold:
+                self._entries.move_to_end(best_key)
+                self.hits += 1
+                logger.info(f"Answer cache hit for prescription_id={prescription_id} (similarity {best_score:.3f})")
+                return self._entries[best_key][1]
+
+            self.misses += 1
+            return None
+
+    def put(self, prescription_id: int, route: str, medicines: str, question: str, question_vector, answer: str):
+        """
+        Store an answer. Without question_vector (the turn never needed an
+        embedding) it is only found again by get_exact().
+        """
+        if not self.enabled or not answer:
+            return
+
+        vector = np.asarray(question_vector, dtype="float32") if question_vector is not None else None
+        key = (prescription_id, route, medicines, question_key(question))
+        # Rough: vector, both strings and per-entry overhead
+        size = (vector.nbytes if vector is not None else 0) + len(answer) + len(key[3]) + 200
+        now = time.monotonic()
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (vector, answer, now, size)
+            self._by_prescription.setdefault(prescription_id, {})[key] = None
+            self._bytes += size
+            self.stores += 1
+
+            keys = self._by_prescription[prescription_id]
+            while len(keys) > self.max_entries:
+                self._remove(next(iter(keys)))
+                self.evictions += 1
+            self._evict(now)
+
+    def invalidate(self, prescription_id: int):
+        """
+        Drop every answer for a prescription (its data changed).
+        """
+        with self._lock:
+            keys = list(self._by_prescription.get(prescription_id, ()))
+            for key in keys:
+                self._remove(key)
+            if keys:
+                self.invalidations += 1
+                logger.info(f"Answer cache invalidated for prescription_id={prescription_id}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "prescriptions": len(self._by_prescription),
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "stores": self.stores,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+answer_cache = AnswerCache()
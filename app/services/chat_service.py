@@ -1,62 +1,141 @@
+from dataclasses import dataclass
 from sqlalchemy.orm import Session
 from fastapi import HTTPException
+from app.core.config import settings
+from fastapi.concurrency import run_in_threadpool
+from app.core.database import DbSession, open_async_db, run_db
 from app.models.prescription import Prescription
-from app.repositories.chat_repository import ChatRepository
-from app.services.llm_service import client
-from app.utils.medicine_matcher import MedicineMatcher
+from app.repositories.chat_repository import ChatRepository, ChatTurnUnitOfWork
+from app.models.chat_message import ANSWERED_BY_TEMPLATE, ANSWERED_BY_CACHE, ANSWERED_BY_LLM
+from app.services.gemini_client import get_client, gemini_slot
+from app.utils.medicine_matcher import medicine_matchers
 from app.services.prompt_builder import (
+    Prompt,
+    prompt_prefixes,
     build_structured_prompt,
     build_rag_prompt
 )
-from app.services.embedding_service import generate_embedding
-from app.services.vector_registry import vector_registry
+from app.services.prompt_cache import context_cache, prompt_request, prompt_stats
+from app.services.embedding_service import generate_embedding_async
+from app.services.indexing_service import get_or_rebuild_store
+from app.services.answer_cache import answer_cache, medicines_key
+from app.utils.lexical_search import reciprocal_rank_fusion
+from app.utils.field_intent import detect_field_intent, render_field_answer, refers_to_several
+from app.services.history_service import build_history, history_tokens, maybe_schedule_summary
 import logging
 import json
 
 logger = logging.getLogger(__name__)
 
 
+CHAT_MODEL = "models/gemini-2.5-flash"
+LLM_UNAVAILABLE = "AI service temporarily unavailable. Please try again."
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+ROUTE_GENERAL = "general"
+ROUTE_MEDICINE = "medicine"
+ROUTE_RAG = "rag"
+
+
+@dataclass
+class ChatTurn:
+    """
+    State of one chat turn. medicines is None for the RAG route (exact_match
+    when they were named word for word or by position); analysis holds all
+    of the prescription's medicines. RAG turns also carry the store and its
+    BM25 results. Once the turn is prepared either prompt is set, or answer
+    (with answered_by) when no LLM call is needed.
+    """
+    work: ChatTurnUnitOfWork
+    question: str
+    conversation: str
+    route: str
+    history_tokens: int = 0
+    medicines: list = None
+    exact_match: bool = False
+    analysis: list = None
+    analysis_key: str = ""
+    store: object = None
+    lexical_chunks: list = None
+    lexical_confident: bool = False
+    question_embedding: object = None
+    embedding_failed: bool = False
+    prompt: Prompt = None
+    answer: str = None
+    answered_by: str = ANSWERED_BY_LLM
+
+    @property
+    def prescription(self) -> Prescription:
+        return self.work.prescription
+
+    @property
+    def session_id(self) -> int:
+        return self.work.session_id
+
+    @property
+    def cacheable(self) -> bool:
+        # Answers to follow-ups depend on the conversation, which the cache key ignores
+        return answer_cache.enabled and not self.conversation
+
+    def cache_scope(self):
+        # The analysis digest keeps answers from before an edit (made through any worker) out of scope
+        return self.work.prescription_id, self.route, f"{self.analysis_key}:{medicines_key(self.medicines)}"
+
+
+async def _save_turn(turn: ChatTurn, answer: str):
+    # Own session: the request's one may already be closed while streaming
+    async with open_async_db() as db:
+        return await run_db(db, lambda session: turn.work.commit(answer, turn.answered_by, db=session))
+
+
 class ChatService:
 
     @staticmethod
-    def handle_chat(db: Session, prescription_id: int, session_id: int, question: str):
+    def load_turn(db: Session, prescription_id: int, session_id: int, question: str) -> ChatTurnUnitOfWork:
+        """
+        SQL part of a turn (called through run_db, so nothing else belongs
+        here): load and validate. Nothing is written until the turn is
+        committed.
+        """
 
         logger.info(f"Processing chat for prescription_id={prescription_id}")
 
-        # Normalize question
-        question = question.strip()
-        question_lower = question.lower()
-
-        # 1️⃣ Validate prescription
-        prescription = db.query(Prescription).filter(
-            Prescription.id == prescription_id
-        ).first()
+        # 1️⃣ Load prescription, session and recent history in one go
+        prescription, session, history = ChatRepository.load_turn(
+            db, prescription_id, session_id, settings.CHAT_HISTORY_MAX_MESSAGES
+        )
 
         if not prescription:
             logger.warning("Prescription not found")
             raise HTTPException(status_code=404, detail="Prescription not found")
 
-        # 2️⃣ Session handling
-        if session_id:
-            session = ChatRepository.get_session(db, session_id, prescription_id)
-            if not session:
-                raise HTTPException(status_code=404, detail="Invalid session")
-        else:
-            session = ChatRepository.create_session(db, prescription_id)
+        # 2️⃣ Session handling (a new session is created when the turn is committed)
+        if session_id and not session:
+            raise HTTPException(status_code=404, detail="Invalid session")
 
-        logger.info(f"Chat session ID: {session.id}")
+        work = ChatTurnUnitOfWork(db, prescription, session, history, question.strip())
+        logger.info(f"Chat session ID: {work.session_id or 'new'}")
+        return work
 
-        # 3️⃣ Save user message
-        ChatRepository.save_message(db, session.id, "user", question)
-
-        # 4️⃣ Fetch recent history (exclude current message for clean context)
-        history = ChatRepository.get_last_messages(db, session.id, limit=10)
+    @staticmethod
+    def start_turn(work: ChatTurnUnitOfWork) -> ChatTurn:
+        """
+        CPU part of a turn (threadpool): build the conversation text and
+        pick the route.
+        """
+        prescription = work.prescription
+        question = work.question
+        question_lower = question.lower()
 
-        conversation = ""
-        for msg in history[:-1]:
-            conversation += f"{msg.role}: {msg.content}\n"
+        # 3️⃣ Session summary + recent history within the token budget
+        # (the current question is not stored yet)
+        conversation = build_history(work.summary, work.history)
 
-        # 5️⃣ Parse structured analysis safely
+        # 4️⃣ Parse structured analysis safely
         analysis_result = prescription.analysis_result or []
 
         if isinstance(analysis_result, str):
@@ -69,7 +148,10 @@ class ChatService:
         if not isinstance(analysis_result, list):
             analysis_result = []
 
-        # 6️⃣ Detect General Structured Intent (ALL medicines)
+        # Version of the analysis for the per-prescription caches below
+        analysis_key = medicines_key(analysis_result)
+
+        # 5️⃣ Detect General Structured Intent (ALL medicines)
         general_keywords = [
             "each", "all", "everything",
             "complete", "full", "entire",
@@ -78,83 +160,286 @@ class ChatService:
 
         is_general_query = any(word in question_lower for word in general_keywords)
 
-        # 7️⃣ Detect Structured Medicine Match
-        match_result = MedicineMatcher.detect(question, analysis_result)
+        # 6️⃣ Detect Structured Medicine Match
+        match_result = medicine_matchers.get(prescription.id, analysis_result, analysis_key).detect(question)
 
         # 🔵 ROUTE 1: GENERAL STRUCTURED
         if is_general_query:
             logger.info("General structured query detected. Returning ALL medicines.")
-
-            prompt = build_structured_prompt(
-                question=question,
-                medicines=analysis_result,
-                history=conversation,
-                raw_text=prescription.extracted_text
-            )
+            route, medicines = ROUTE_GENERAL, analysis_result
 
         # 🔵 ROUTE 2: SPECIFIC MEDICINE STRUCTURED
-        elif match_result["type"]:
+        # (a fuzzy name match in a question about "these"/"them" is likely spurious)
+        elif match_result["type"] and (match_result["exact"] or not refers_to_several(question)):
             logger.info(
                 f"Specific structured route triggered. Type: {match_result['type']}"
             )
-
-            prompt = build_structured_prompt(
-                question=question,
-                medicines=match_result["medicines"],
-                history=conversation,
-                raw_text=prescription.extracted_text
-            )
+            route, medicines = ROUTE_MEDICINE, match_result["medicines"]
 
         # 🔵 ROUTE 3: RAG (Fallback)
         else:
             logger.info("RAG route triggered.")
+            route, medicines = ROUTE_RAG, None
+
+        return ChatTurn(
+            work=work,
+            question=question,
+            conversation=conversation,
+            route=route,
+            history_tokens=history_tokens(work.history),
+            medicines=medicines,
+            exact_match=route == ROUTE_MEDICINE and match_result["exact"],
+            analysis=analysis_result,
+            analysis_key=analysis_key
+        )
 
-            store = vector_registry.get_store(prescription_id)
+    @staticmethod
+    def _lexical_search(store, question: str, top_k: int):
+        """
+        BM25 chunks, best first, and whether the best one covers the question
+        well enough to answer without dense retrieval.
+        """
+        hits = store.lexical.search(question, top_k)
+        chunks = [store.chunks[doc_id] for doc_id, _ in hits]
+        confident = bool(hits) and store.lexical.coverage(question, hits[0][0]) >= settings.RAG_LEXICAL_CONFIDENCE
+        return chunks, confident
 
-            if not store:
-                logger.warning(
-                    "Vector store not found. Falling back to full prescription text."
-                )
-                retrieved_chunks = [prescription.extracted_text]
+    @staticmethod
+    async def lexical_retrieval(turn: ChatTurn):
+        """
+        Load the RAG store and run BM25, before any embedding is computed.
+        """
+        try:
+            turn.store = await run_in_threadpool(get_or_rebuild_store, turn.prescription)
+        except Exception as e:
+            logger.error(f"Vector store rebuild failed: {str(e)}")
+            turn.store = None
 
-            else:
-                logger.info("Vector store found. Performing semantic retrieval.")
-                try:
-                    question_embedding = generate_embedding(question_lower)
-                    retrieved_chunks = store.search(question_embedding, top_k=8)
-                    logger.info(f"Retrieved {len(retrieved_chunks)} chunks from vector store.")
-                except Exception as e:
-                    logger.error(f"Embedding/RAG error: {str(e)}")
-                    retrieved_chunks = [prescription.extracted_text]
+        if turn.store:
+            turn.lexical_chunks, turn.lexical_confident = await run_in_threadpool(
+                ChatService._lexical_search, turn.store, turn.question, settings.RAG_TOP_K
+            )
 
-            prompt = build_rag_prompt(
-                question=question,
-                retrieved_chunks=retrieved_chunks,
-                history=conversation
+    @staticmethod
+    async def embed_question(turn: ChatTurn):
+        """
+        The question embedding, computed at most once per turn: a failure
+        is remembered so retrieval does not retry it.
+        """
+        if turn.question_embedding is None and not turn.embedding_failed:
+            try:
+                turn.question_embedding = await generate_embedding_async(turn.question.lower())
+            except Exception as e:
+                logger.error(f"Question embedding failed: {str(e)}")
+                turn.embedding_failed = True
+        return turn.question_embedding
+
+    @staticmethod
+    async def retrieve_chunks(turn: ChatTurn) -> list:
+        """
+        Hybrid retrieval for the RAG route: BM25 (see lexical_retrieval) and
+        FAISS results fused by reciprocal rank. BM25 alone is used when it
+        is confident or the embedding failed. Falls back to the full text.
+        """
+        prescription = turn.prescription
+        top_k = settings.RAG_TOP_K
+        store = turn.store
+
+        if not store:
+            logger.warning(
+                "Vector store not found. Falling back to full prescription text."
             )
+            return [prescription.extracted_text]
 
-        # 8️⃣ Generate Response
-        logger.info("Generating response from Gemini")
+        lexical_chunks = turn.lexical_chunks or []
+        if turn.lexical_confident:
+            logger.info(f"Lexical retrieval confident; skipping embedding ({len(lexical_chunks)} chunks).")
+            return lexical_chunks
+
+        logger.info("Vector store found. Performing hybrid retrieval.")
+        question_embedding = await ChatService.embed_question(turn)
+        if question_embedding is None:
+            return lexical_chunks or [prescription.extracted_text]
 
         try:
-            response = client.models.generate_content(
-                model="models/gemini-2.5-flash",
-                contents=prompt
-            )
+            dense_chunks = await run_in_threadpool(store.search, question_embedding, top_k)
         except Exception as e:
-            logger.error(f"LLM error: {str(e)}")
-            raise HTTPException(
-                status_code=500,
-                detail="AI service temporarily unavailable. Please try again."
+            logger.error(f"Dense retrieval error: {str(e)}")
+            return lexical_chunks or [prescription.extracted_text]
+
+        retrieved_chunks = reciprocal_rank_fusion([lexical_chunks, dense_chunks], top_k)
+        logger.info(
+            f"Retrieved {len(retrieved_chunks)} chunks "
+            f"({len(lexical_chunks)} lexical, {len(dense_chunks)} dense)."
+        )
+        return retrieved_chunks
+
+    @staticmethod
+    async def prepare_turn(db: DbSession, prescription_id: int, session_id: int, question: str) -> ChatTurn:
+        """
+        Validate, persist the user message, then answer from the structured
+        data (field lookups), find a cached answer to a near-duplicate
+        question, or build the prompt.
+        """
+        work = await run_db(db, ChatService.load_turn, prescription_id, session_id, question)
+        turn = await run_in_threadpool(ChatService.start_turn, work)
+
+        # ⚡ Fast path: single-field lookups need no LLM, but only for medicines
+        # named exactly (or by position) and questions about just those
+        if turn.exact_match and not refers_to_several(turn.question):
+            field = detect_field_intent(turn.question)
+            answer = render_field_answer(field, turn.medicines) if field else None
+            if answer is not None:
+                logger.info(f"Answered '{field}' lookup from structured data")
+                turn.answer, turn.answered_by = answer, ANSWERED_BY_TEMPLATE
+                return turn
+
+        # The same question asked before: no embedding needed
+        if turn.cacheable:
+            cached = answer_cache.get_exact(*turn.cache_scope(), turn.question)
+            if cached is not None:
+                turn.answer, turn.answered_by = cached, ANSWERED_BY_CACHE
+                return turn
+
+        # RAG: BM25 next. A confident lexical match is answered from its chunks,
+        # without the embedding call or the (embedding-keyed) semantic lookup
+        if turn.route == ROUTE_RAG:
+            await ChatService.lexical_retrieval(turn)
+
+        if turn.cacheable and not turn.lexical_confident:
+            # Needed for the cache lookup and reused for RAG retrieval
+            cached = answer_cache.get(*turn.cache_scope(), await ChatService.embed_question(turn))
+            if cached is not None:
+                turn.answer, turn.answered_by = cached, ANSWERED_BY_CACHE
+                return turn
+
+        if turn.medicines is not None:
+            # Rules and raw text (plus every medicine when all are needed or the
+            # prefix is served from a context cache), rendered once per prescription
+            with_medicines = turn.route == ROUTE_GENERAL or context_cache.enabled
+            prefix = prompt_prefixes.get(
+                turn.work.prescription_id, turn.analysis, turn.prescription.extracted_text, with_medicines,
+                version=turn.analysis_key
+            )
+            turn.prompt = build_structured_prompt(
+                question=turn.question,
+                medicines=turn.medicines,
+                history=turn.conversation,
+                prefix=prefix,
+                all_medicines=turn.analysis,
+                prefix_has_medicines=with_medicines
+            )
+        else:
+            turn.prompt = build_rag_prompt(
+                question=turn.question,
+                retrieved_chunks=await ChatService.retrieve_chunks(turn),
+                history=turn.conversation
             )
 
-        answer = response.text.strip()
+        return turn
 
-        # 9️⃣ Save assistant message
-        assistant_msg = ChatRepository.save_message(
-            db, session.id, "assistant", answer
-        )
+    @staticmethod
+    def remember_answer(turn: ChatTurn, answer: str):
+        if not turn.cacheable:
+            return
+        answer_cache.put(*turn.cache_scope(), turn.question, turn.question_embedding, answer)
+
+    @staticmethod
+    def after_commit(turn: ChatTurn, answer: str):
+        # Summaries are refreshed in the background, never in the request
+        maybe_schedule_summary(turn.session_id, turn.history_tokens, turn.question, answer)
+
+    @staticmethod
+    async def handle_chat(db: DbSession, prescription_id: int, session_id: int, question: str):
+
+        turn = await ChatService.prepare_turn(db, prescription_id, session_id, question)
+
+        # 7️⃣ Generate Response (unless answered from structured data or the cache)
+        if turn.answer is not None:
+            answer = turn.answer
+        else:
+            logger.info("Generating response from Gemini")
+
+            try:
+                contents, config = await prompt_request(CHAT_MODEL, turn.route, turn.prompt)
+                async with gemini_slot():
+                    response = await get_client().aio.models.generate_content(
+                        model=CHAT_MODEL,
+                        contents=contents,
+                        config=config
+                    )
+            except Exception as e:
+                logger.error(f"LLM error: {str(e)}")
+                raise HTTPException(
+                    status_code=500,
+                    detail=LLM_UNAVAILABLE
+                )
 
-        logger.info("Chat response generated successfully")
+            answer = response.text.strip()
+            prompt_stats.record_usage(turn.route, response.usage_metadata)
+            ChatService.remember_answer(turn, answer)
 
-        return session.id, answer, assistant_msg.created_at
+        # 8️⃣ Save question and answer in one transaction
+        created_at = await run_db(db, lambda session: turn.work.commit(answer, turn.answered_by, db=session))
+        ChatService.after_commit(turn, answer)
+
+        logger.info(f"Chat response generated successfully ({turn.answered_by})")
+
+        return turn.session_id, answer, created_at, turn.answered_by
+
+    @staticmethod
+    async def stream_chat(db: DbSession, prescription_id: int, session_id: int, question: str):
+        """
+        Like handle_chat, but returns (session_id, events) where events is an
+        async generator of server-sent events: "token" per streamed text
+        piece, then "done" (or "error"). An answer that needs no LLM call
+        arrives as a single "token". The assistant message is saved once,
+        after the last token, together with the question; an aborted stream
+        saves nothing (apart from a new session, whose id is needed up front).
+        """
+
+        # Validation errors raise here, before the response starts
+        turn = await ChatService.prepare_turn(db, prescription_id, session_id, question)
+        session_id = await run_db(db, lambda session: turn.work.ensure_session(db=session))
+
+        async def events():
+            if turn.answer is not None:
+                answer = turn.answer
+                yield _sse("token", {"text": answer})
+            else:
+                parts = []
+                logger.info("Streaming response from Gemini")
+
+                usage = None
+                try:
+                    contents, config = await prompt_request(CHAT_MODEL, turn.route, turn.prompt)
+                    async with gemini_slot():
+                        stream = await get_client().aio.models.generate_content_stream(
+                            model=CHAT_MODEL,
+                            contents=contents,
+                            config=config
+                        )
+                        async for chunk in stream:
+                            usage = chunk.usage_metadata or usage
+                            if chunk.text:
+                                parts.append(chunk.text)
+                                yield _sse("token", {"text": chunk.text})
+                except Exception as e:
+                    logger.error(f"LLM streaming error: {str(e)}")
+                    yield _sse("error", {"detail": LLM_UNAVAILABLE})
+                    return
+
+                answer = "".join(parts).strip()
+                prompt_stats.record_usage(turn.route, usage)
+                ChatService.remember_answer(turn, answer)
+            created_at = await _save_turn(turn, answer)
+            ChatService.after_commit(turn, answer)
+
+            logger.info(f"Chat response streamed successfully ({turn.answered_by})")
+            yield _sse("done", {
+                "session_id": session_id,
+                "created_at": created_at.isoformat(),
+                "answered_by": turn.answered_by
+            })
+
+        return session_id, events()
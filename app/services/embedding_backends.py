@@ -0,0 +1,174 @@
+import hashlib
+import re
+import threading
+import numpy as np
+from fastapi.concurrency import run_in_threadpool
+from app.core.config import settings
+from app.services.gemini_client import get_client, gemini_slot
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingBackend:
+    """
+    Turns texts into embedding rows. model_id is part of the embedding cache
+    key; dimension is the native size, which callers may truncate.
+    Remote backends get batching, retries and concurrency from
+    embedding_service; local ones are called with all texts at once.
+    """
+
+    model_id = None
+    dimension = None
+    remote = False
+
+    def embed(self, texts: list, dimension: int) -> np.ndarray:
+        raise NotImplementedError
+
+    async def embed_async(self, texts: list, dimension: int) -> np.ndarray:
+        return await run_in_threadpool(self.embed, texts, dimension)
+
+    def load(self):
+        """
+        Load models/clients ahead of first use (warmup).
+        """
+
+
+class GeminiBackend(EmbeddingBackend):
+    model_id = "models/gemini-embedding-001"
+    dimension = 3072
+    remote = True
+
+    def _config(self, dimension: int):
+        from google.genai import types
+        return types.EmbedContentConfig(output_dimensionality=dimension)
+
+    def _rows(self, response, texts: list, dimension: int) -> np.ndarray:
+        if len(response.embeddings) != len(texts):
+            raise ValueError(f"Expected {len(texts)} embeddings, got {len(response.embeddings)}")
+
+        embeddings = np.empty((len(texts), dimension), dtype="float32")
+        for i, emb in enumerate(response.embeddings):
+            embeddings[i] = np.asarray(emb.values[:dimension], dtype="float32")
+        return embeddings
+
+    def embed(self, texts: list, dimension: int) -> np.ndarray:
+        response = get_client().models.embed_content(
+            model=self.model_id,
+            contents=texts,
+            config=self._config(dimension)
+        )
+        return self._rows(response, texts, dimension)
+
+    async def embed_async(self, texts: list, dimension: int) -> np.ndarray:
+        async with gemini_slot():
+            response = await get_client().aio.models.embed_content(
+                model=self.model_id,
+                contents=texts,
+                config=self._config(dimension)
+            )
+        return self._rows(response, texts, dimension)
+
+    def load(self):
+        get_client()
+
+
+class HashingBackend(EmbeddingBackend):
+    """
+    Dependency-free signed feature hashing of word unigrams and bigrams.
+    Purely lexical, but deterministic and instant: meant for tests, offline
+    benchmarks and development without an API key.
+    """
+
+    model_id = "hashing-v1"
+    dimension = 1024
+
+    def _features(self, text: str) -> list:
+        words = re.findall(r"[a-z0-9]+", text.lower())
+        return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+    def embed(self, texts: list, dimension: int) -> np.ndarray:
+        embeddings = np.zeros((len(texts), dimension), dtype="float32")
+        for i, text in enumerate(texts):
+            for feature in self._features(text):
+                digest = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+                sign = 1.0 if digest >> 63 else -1.0
+                embeddings[i, digest % dimension] += sign
+        # Sublinear term frequency, as in TF-IDF
+        np.copyto(embeddings, np.sign(embeddings) * np.log1p(np.abs(embeddings)))
+        return embeddings
+
+
+class SentenceTransformerBackend(EmbeddingBackend):
+    """
+    Local CPU sentence-embedding model (sentence-transformers), loaded on
+    first use.
+    """
+
+    def __init__(self, model_name: str = settings.EMBEDDING_LOCAL_MODEL):
+        self.model_id = model_name
+        self._model = None
+        self._lock = threading.Lock()
+
+    def _get_model(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    from sentence_transformers import SentenceTransformer
+                    self._model = SentenceTransformer(self.model_id, device="cpu")
+                    logger.info(f"Loaded local embedding model {self.model_id}")
+        return self._model
+
+    @property
+    def dimension(self) -> int:
+        return self._get_model().get_sentence_embedding_dimension()
+
+    def embed(self, texts: list, dimension: int) -> np.ndarray:
+        vectors = self._get_model().encode(texts, batch_size=32, convert_to_numpy=True)
+        return np.asarray(vectors[:, :dimension], dtype="float32")
+
+    def load(self):
+        self._get_model()
+
+
+# backend name -> factory, selected by EMBEDDING_BACKEND
+EMBEDDING_BACKENDS = {
+    "gemini": GeminiBackend,
+    "hashing": HashingBackend,
+    "sentence_transformers": SentenceTransformerBackend,
+}
+
+
+def register_embedding_backend(name: str, factory):
+    EMBEDDING_BACKENDS[name] = factory
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def create_embedding_backend(name: str) -> EmbeddingBackend:
+    if name not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown embedding backend: {name}")
+    return EMBEDDING_BACKENDS[name]()
+
+
+def get_embedding_backend() -> EmbeddingBackend:
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = create_embedding_backend(settings.EMBEDDING_BACKEND)
+                logger.info(f"Embedding backend: {settings.EMBEDDING_BACKEND} ({_backend.model_id})")
+    return _backend
+
+
+def embedding_dimension(backend: EmbeddingBackend = None) -> int:
+    """
+    Index/embedding size in use: EMBEDDING_DIM when set (a truncated
+    prefix), otherwise the backend's native dimension.
+    """
+    backend = backend or get_embedding_backend()
+    if settings.EMBEDDING_DIM:
+        return min(settings.EMBEDDING_DIM, backend.dimension)
+    return backend.dimension
@@ -0,0 +1,117 @@
+import hashlib
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+import numpy as np
+from app.core.config import settings
+from app.utils.sqlite_kv import SQLiteKVStore
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Per-entry memory beyond the vector itself: key string, array header, LRU node
+ENTRY_OVERHEAD = 200
+
+
+def normalize_for_cache(text: str) -> str:
+    text = unicodedata.normalize("NFKC", text)
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+class EmbeddingCache:
+    """
+    Content-addressed embedding cache: an in-process LRU in front of an
+    optional SQLite file, keyed by sha256(model, dimension, normalized text).
+    The LRU holds at most max_entries vectors and max_bytes (0 = unlimited):
+    vector size depends on the embedding dimension.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = settings.EMBEDDING_CACHE_SIZE,
+        path: str = settings.EMBEDDING_CACHE_PATH,
+        max_bytes: int = settings.EMBEDDING_CACHE_MAX_BYTES
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.memory = OrderedDict()
+        self._bytes = 0
+        self.store = SQLiteKVStore(path, "embeddings") if path else None
+        self._lock = threading.Lock()
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(model: str, dimension: int, text: str) -> str:
+        raw = f"{model}\x00{dimension}\x00{normalize_for_cache(text)}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _remember(self, key: str, vector: np.ndarray):
+        previous = self.memory.pop(key, None)
+        if previous is not None:
+            self._bytes -= previous.nbytes + ENTRY_OVERHEAD
+        self.memory[key] = vector
+        self._bytes += vector.nbytes + ENTRY_OVERHEAD
+        while len(self.memory) > self.max_entries or (self.max_bytes and self._bytes > self.max_bytes):
+            _, evicted = self.memory.popitem(last=False)
+            self._bytes -= evicted.nbytes + ENTRY_OVERHEAD
+
+    def get_many(self, keys: list) -> list:
+        """
+        Return a vector or None per key, in order.
+        """
+        results = [None] * len(keys)
+        disk_lookup = []
+
+        with self._lock:
+            for i, key in enumerate(keys):
+                vector = self.memory.get(key)
+                if vector is not None:
+                    self.memory.move_to_end(key)
+                    self.memory_hits += 1
+                    results[i] = vector
+                else:
+                    disk_lookup.append(i)
+
+        if disk_lookup and self.store is not None:
+            found = self.store.get_many([keys[i] for i in disk_lookup])
+            with self._lock:
+                for i in disk_lookup:
+                    blob = found.get(keys[i])
+                    if blob is not None:
+                        vector = np.frombuffer(blob, dtype="float32")
+                        self._remember(keys[i], vector)
+                        self.disk_hits += 1
+                        results[i] = vector
+
+        with self._lock:
+            self.misses += sum(1 for vector in results if vector is None)
+        return results
+
+    def put_many(self, items: dict):
+        with self._lock:
+            for key, vector in items.items():
+                self._remember(key, np.asarray(vector, dtype="float32"))
+        if self.store is not None:
+            self.store.set_many({
+                key: np.asarray(vector, dtype="float32").tobytes() for key, vector in items.items()
+            })
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self.memory),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+            }
+
+
+embedding_cache = EmbeddingCache()
@@ -1,59 +1,273 @@
-from google import genai
-import os
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import numpy as np
-from dotenv import load_dotenv
+from fastapi.concurrency import run_in_threadpool
+from app.core.config import settings
+from app.services.embedding_cache import embedding_cache
+from app.services.embedding_backends import get_embedding_backend, embedding_dimension
+from app.utils.tokens import estimate_tokens
 import logging
 
 logger = logging.getLogger(__name__)
 
-load_dotenv()
+# Shared by all requests, so it also bounds embedding calls in flight process-wide
+_batch_executor = ThreadPoolExecutor(
+    max_workers=settings.EMBEDDING_MAX_CONCURRENCY,
+    thread_name_prefix="embedding"
+)
 
-client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
+# Async counterpart of _batch_executor's bound, created on first use (see embedding_slot)
+_async_embedding_slots = None
 
-def generate_embeddings_batch(texts: list[str]):
+
+def embedding_slot() -> asyncio.Semaphore:
+    """
+    Semaphore bounding async embedding batches in flight to
+    EMBEDDING_MAX_CONCURRENCY, so one large document cannot take every
+    gemini_slot() from chat completions.
+    """
+    global _async_embedding_slots
+    if _async_embedding_slots is None:
+        _async_embedding_slots = asyncio.Semaphore(settings.EMBEDDING_MAX_CONCURRENCY)
+    return _async_embedding_slots
+
+
+def truncate_and_normalize(vectors: np.ndarray, dimension: int) -> np.ndarray:
+    """
+    Keep the first `dimension` components of each row and re-normalize,
+    so inner product stays cosine similarity.
+    """
+    vectors = np.ascontiguousarray(vectors[..., :dimension], dtype="float32")
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    np.divide(vectors, norms, out=vectors, where=norms > 0)
+    return vectors
+
+
+def _embed_once(texts: list[str], dimension: int) -> np.ndarray:
+    return truncate_and_normalize(get_embedding_backend().embed(texts, dimension), dimension)
+
+
+async def _embed_once_async(texts: list[str], dimension: int) -> np.ndarray:
+    return truncate_and_normalize(await get_embedding_backend().embed_async(texts, dimension), dimension)
+
+
+def _retry_delay(texts: list[str], attempt: int, error: Exception) -> float:
+    delay = 0.5 * 2 ** (attempt - 1)
+    logger.warning(f"Embedding batch of {len(texts)} failed (attempt {attempt}): {error}. Retrying in {delay}s")
+    return delay
+
+
+def _embed_with_retry(texts: list[str], dimension: int) -> np.ndarray:
+    # One attempt plus EMBEDDING_MAX_RETRIES retries; the last failure is raised
+    attempts = max(settings.EMBEDDING_MAX_RETRIES, 0) + 1
+    for attempt in range(1, attempts + 1):
+        try:
+            return _embed_once(texts, dimension)
+        except Exception as e:
+            if attempt >= attempts:
+                raise
+            time.sleep(_retry_delay(texts, attempt, e))
+
+
+async def _embed_with_retry_async(texts: list[str], dimension: int) -> np.ndarray:
+    attempts = max(settings.EMBEDDING_MAX_RETRIES, 0) + 1
+    for attempt in range(1, attempts + 1):
+        try:
+            async with embedding_slot():
+                return await _embed_once_async(texts, dimension)
+        except Exception as e:
+            if attempt >= attempts:
+                raise
+            await asyncio.sleep(_retry_delay(texts, attempt, e))
+
+
+def split_batches(texts: list[str]) -> list[tuple]:
+    """
+    Split texts into [start, end) ranges that respect the per-request item
+    and estimated token limits.
+    """
+    batches = []
+    start = 0
+    tokens = 0
+
+    for i, text in enumerate(texts):
+        text_tokens = estimate_tokens(text)
+        if i > start and (
+            i - start >= settings.EMBEDDING_MAX_BATCH_ITEMS
+            or tokens + text_tokens > settings.EMBEDDING_MAX_BATCH_TOKENS
+        ):
+            batches.append((start, i))
+            start = i
+            tokens = 0
+        tokens += text_tokens
+
+    if start < len(texts):
+        batches.append((start, len(texts)))
+
+    return batches
+
+
+def _embed_remote(texts: list[str], dimension: int) -> np.ndarray:
+    """
+    Embed texts in limit-sized batches sent concurrently. A failing batch is
+    retried on its own; rows come back in input order. Local backends get
+    all texts in one call.
+    """
+    if not get_embedding_backend().remote:
+        return _embed_once(texts, dimension)
+
+    batches = split_batches(texts)
+
+    if len(batches) == 1:
+        return _embed_with_retry(texts, dimension)
+
+    logger.info(f"Embedding {len(texts)} texts in {len(batches)} concurrent batches")
+
+    embeddings = np.empty((len(texts), dimension), dtype="float32")
+    futures = {
+        _batch_executor.submit(_embed_with_retry, texts[start:end], dimension): (start, end)
+        for start, end in batches
+    }
+
+    try:
+        for future in as_completed(futures):
+            start, end = futures[future]
+            embeddings[start:end] = future.result()
+    except Exception:
+        for future in futures:
+            future.cancel()
+        raise
+
+    return embeddings
+
+
+async def _embed_remote_async(texts: list[str], dimension: int) -> np.ndarray:
+    """
+    Async counterpart of _embed_remote; batches in flight are bounded by
+    embedding_slot() (and, per Gemini call, by gemini_slot()).
+    """
+    if not get_embedding_backend().remote:
+        return await _embed_once_async(texts, dimension)
+
+    batches = split_batches(texts)
+    results = await asyncio.gather(*[
+        _embed_with_retry_async(texts[start:end], dimension) for start, end in batches
+    ])
+
+    embeddings = np.empty((len(texts), dimension), dtype="float32")
+    for (start, end), rows in zip(batches, results):
+        embeddings[start:end] = rows
+    return embeddings
+
+
+def _lookup_cached(texts: list[str], dimension: int):
+    """
+    Returns (embeddings, pending): the result matrix with cached rows filled
+    in, and {cache key: positions} for the texts still to embed.
+    """
+    embeddings = np.empty((len(texts), dimension), dtype="float32")
+    model_id = get_embedding_backend().model_id
+    keys = [embedding_cache.key(model_id, dimension, text) for text in texts]
+
+    pending = {}
+    for i, (key, vector) in enumerate(zip(keys, embedding_cache.get_many(keys))):
+        if vector is not None:
+            embeddings[i] = vector
+        else:
+            pending.setdefault(key, []).append(i)
+
+    return embeddings, pending
+
+
+def _fill_fresh(embeddings: np.ndarray, pending: dict, fresh: np.ndarray):
+    for vector, positions in zip(fresh, pending.values()):
+        embeddings[positions] = vector
+    embedding_cache.put_many(dict(zip(pending.keys(), fresh)))
+
+
+def _pending_texts(texts: list[str], pending: dict) -> list[str]:
+    # Each distinct text once
+    return [texts[positions[0]] for positions in pending.values()]
+
+
+def _resolve_dimension(dimension: int = None) -> int:
     """
-    Generate normalized embeddings for multiple texts in one API call.
+    dimension, defaulting to embedding_dimension(). Truncation can only
+    shorten vectors, so sizes above the backend's native one are rejected.
     """
+    if not dimension:
+        return embedding_dimension()
+    native = get_embedding_backend().dimension
+    if not 0 < dimension <= native:
+        raise ValueError(f"Embedding dimension must be between 1 and {native}, got {dimension}")
+    return dimension
 
-    response = client.models.embed_content(
-        model="models/gemini-embedding-001",
-        contents=texts
-    )
 
-    embeddings = []
+def generate_embeddings_batch(texts: list[str], dimension: int = None):
+    """
+    Generate normalized embeddings for multiple texts with the configured
+    backend. Returns a (len(texts), dimension) float32 matrix; dimension
+    defaults to embedding_dimension(). Only texts missing from the embedding
+    cache are embedded, each distinct text once.
+    """
+    dimension = _resolve_dimension(dimension)
 
-    for emb in response.embeddings:
-        vector = np.array(emb.values).astype("float32")
+    embeddings, pending = _lookup_cached(texts, dimension)
 
-        norm = np.linalg.norm(vector)
-        if norm > 0:
-            vector = vector / norm
+    if pending:
+        fresh = _embed_remote(_pending_texts(texts, pending), dimension)
+        _fill_fresh(embeddings, pending, fresh)
 
-        embeddings.append(vector)
+    logger.info(f"Embeddings for {len(texts)} texts: {len(texts) - sum(map(len, pending.values()))} from cache")
 
     return embeddings
 
 
-def generate_embedding(text: str):
+async def generate_embeddings_batch_async(texts: list[str], dimension: int = None):
     """
-    Generate normalized embedding using Gemini.
+    Async generate_embeddings_batch (pooled async client for Gemini, a
+    worker thread for local backends). Cache I/O runs in a worker thread.
     """
+    dimension = _resolve_dimension(dimension)
 
-    logger.info("Generating embedding from Gemini")
+    embeddings, pending = await run_in_threadpool(_lookup_cached, texts, dimension)
 
-    response = client.models.embed_content(
-        model="models/gemini-embedding-001",
-        contents=text
-    )
+    if pending:
+        fresh = await _embed_remote_async(_pending_texts(texts, pending), dimension)
+        await run_in_threadpool(_fill_fresh, embeddings, pending, fresh)
 
-    vector = response.embeddings[0].values
-    vector = np.array(vector).astype("float32")
+    logger.info(f"Embeddings for {len(texts)} texts: {len(texts) - sum(map(len, pending.values()))} from cache")
+
+    return embeddings
 
-    # Normalize for cosine similarity
-    norm = np.linalg.norm(vector)
-    if norm > 0:
-        vector = vector / norm
+
+def generate_embedding(text: str, dimension: int = None):
+    """
+    Generate normalized embedding with the configured backend (served from
+    cache when seen before).
+    """
+    dimension = _resolve_dimension(dimension)
+    backend = get_embedding_backend()
+
+    key = embedding_cache.key(backend.model_id, dimension, text)
+    cached = embedding_cache.get_many([key])[0]
+    if cached is not None:
+        logger.info("Embedding served from cache")
+        return cached
+
+    logger.info(f"Generating embedding with {backend.model_id}")
+
+    vector = _embed_remote([text], dimension)[0]
+    embedding_cache.put_many({key: vector})
 
     logger.info(f"Embedding generated. Dimension: {len(vector)}")
 
     return vector
+
+
+async def generate_embedding_async(text: str, dimension: int = None):
+    """
+    Async generate_embedding.
+    """
+    return (await generate_embeddings_batch_async([text], dimension))[0]
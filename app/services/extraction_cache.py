@@ -0,0 +1,71 @@
+import hashlib
+import json
+import threading
+from app.core.config import settings
+from app.services.embedding_cache import normalize_for_cache
+from app.utils.sqlite_kv import SQLiteKVStore
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def prompt_version(model: str, template: str) -> str:
+    """
+    Short digest of a model + prompt template; editing either one yields a
+    new version and so a fresh cache namespace.
+    """
+    return hashlib.sha256(f"{model}\x00{template}".encode("utf-8")).hexdigest()[:16]
+
+
+class ExtractionCache:
+    """
+    Parsed medicine extraction results in a SQLite file, keyed by
+    sha256(prompt version, normalized OCR text).
+    """
+
+    def __init__(self, path: str = settings.EXTRACTION_CACHE_PATH):
+        self.store = SQLiteKVStore(path, "extractions") if path else None
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(version: str, text: str) -> str:
+        raw = f"{version}\x00{normalize_for_cache(text)}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, version: str, text: str):
+        """
+        Cached result list, or None.
+        """
+        if self.store is None:
+            return None
+
+        value = self.store.get(self.key(version, text))
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+
+        logger.info(f"Extraction served from cache (prompt {version})")
+        return json.loads(value)
+
+    def put(self, version: str, text: str, result: list):
+        if self.store is None:
+            return
+        self.store.set(self.key(version, text), json.dumps(result).encode("utf-8"))
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.store is not None,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+extraction_cache = ExtractionCache()
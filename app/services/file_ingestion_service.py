@@ -1,13 +1,15 @@
 import os
-import mimetypes
-import pdfplumber
-import fitz  # PyMuPDF
-from PIL import Image
-from app.services.ocr_service import extract_text_from_image
+from collections import deque
+import numpy as np
+from app.core.config import settings
+from app.services.ocr_service import extract_text_from_image, submit_ocr
+from app.utils.lazy_import import LazyModule
 import logging
 
 logger = logging.getLogger(__name__)
 
+fitz = LazyModule("fitz")  # PyMuPDF
+
 SUPPORTED_TYPES = [
     "image/png",
     "image/jpeg",
@@ -46,44 +48,57 @@ class FileIngestionService:
 
         elif content_type == "application/pdf":
             logger.info("Processing PDF file.")
-
-            # First attempt: direct text extraction
-            text = FileIngestionService._extract_text_from_pdf(file_path)
-
-            if text.strip():
-                logger.info("Text-based PDF detected.")
-                return text
-
-            logger.info("Scanned PDF detected. Converting to images.")
-            return FileIngestionService._ocr_scanned_pdf(file_path)
+            page_texts = [text for _, text in FileIngestionService.iter_pdf_pages(file_path)]
+            return "\n".join(page_texts)
 
         else:
             raise ValueError("Unsupported file format.")
 
     @staticmethod
-    def _extract_text_from_pdf(file_path: str):
-        text_content = ""
-
-        with pdfplumber.open(file_path) as pdf:
-            for page in pdf.pages:
-                text_content += page.extract_text() or ""
-
-        return text_content
+    def _render_page(page, dpi: int) -> np.ndarray:
+        """
+        Render a PDF page straight to an HxW(xC) uint8 array for OCR.
+        """
+        pix = page.get_pixmap(dpi=dpi, alpha=False)
+        image = np.frombuffer(pix.samples, dtype=np.uint8)
+        if pix.n == 1:
+            return image.reshape(pix.height, pix.width)
+        return image.reshape(pix.height, pix.width, pix.n)
 
     @staticmethod
-    def _ocr_scanned_pdf(file_path: str):
-        doc = fitz.open(file_path)
-        full_text = ""
-
-        for page_number in range(len(doc)):
-            page = doc[page_number]
-            pix = page.get_pixmap()
-            image_path = f"temp_page_{page_number}.png"
-            pix.save(image_path)
-
-            text = extract_text_from_image(image_path)
-            full_text += text
-
-            os.remove(image_path)
-
-        return full_text
+    def iter_pdf_pages(file_path: str, dpi: int = None):
+        """
+        Yield (page_number, text) in page order.
+
+        Each page's text layer is read with PyMuPDF; only pages without
+        usable text are rendered and sent to OCR. OCR jobs are submitted as
+        pages are scanned, so they run in parallel while text pages before
+        the first pending OCR page are yielded right away.
+        """
+        dpi = dpi or settings.OCR_PDF_DPI
+        pending = deque()  # (page_number, text or Future)
+        ocr_pages = 0
+
+        with fitz.open(file_path) as doc:
+            for page in doc:
+                text = page.get_text("text")
+                if len(text.strip()) >= settings.PDF_MIN_PAGE_TEXT_CHARS:
+                    pending.append((page.number, text))
+                else:
+                    pending.append((page.number, submit_ocr(FileIngestionService._render_page(page, dpi))))
+                    ocr_pages += 1
+
+                while pending and isinstance(pending[0][1], str):
+                    yield pending.popleft()
+
+        for page_number, future in pending:
+            if isinstance(future, str):
+                yield page_number, future
+                continue
+            try:
+                yield page_number, future.result(timeout=settings.OCR_TIMEOUT)
+            except Exception as e:
+                logger.error(f"OCR failed for page {page_number}: {e}")
+                yield page_number, ""
+
+        logger.info(f"PDF extracted: {ocr_pages} page(s) via OCR at {dpi} DPI, rest via text layer")
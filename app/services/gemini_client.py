@@ -0,0 +1,55 @@
+import asyncio
+import threading
+from app.core.config import settings
+from app.core.startup_timing import startup_timings
+
+_client = None
+_client_lock = threading.Lock()
+_async_slots = None
+
+
+def _http_options():
+    """
+    One pooled, keep-alive HTTP connection pool per client (sync and async),
+    sized to the concurrency limit.
+    """
+    import httpx
+    from google.genai import types
+
+    limits = httpx.Limits(
+        max_connections=settings.GEMINI_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.GEMINI_MAX_CONNECTIONS
+    )
+    return types.HttpOptions(
+        client_args={"limits": limits},
+        async_client_args={"limits": limits}
+    )
+
+
+def get_client():
+    """
+    Process-wide Gemini client, created on first use. Async calls go
+    through get_client().aio.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                with startup_timings.measure("gemini client"):
+                    from google import genai
+                    _client = genai.Client(
+                        api_key=settings.GEMINI_API_KEY,
+                        http_options=_http_options()
+                    )
+    return _client
+
+
+def gemini_slot() -> asyncio.Semaphore:
+    """
+    Semaphore bounding concurrent async Gemini calls:
+    `async with gemini_slot(): await get_client().aio...`
+    """
+    global _async_slots
+    if _async_slots is None:
+        _async_slots = asyncio.Semaphore(settings.GEMINI_MAX_CONCURRENCY)
+    return _async_slots
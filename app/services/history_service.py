@@ -0,0 +1,165 @@
+import threading
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.chat_session import ChatSession
+from app.repositories.chat_repository import ChatRepository
+from app.services.gemini_client import get_client
+from app.services.job_queue import register_task, get_job_queue
+from app.utils.tokens import estimate_tokens
+import logging
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_MODEL = "models/gemini-2.5-flash"
+SUMMARIZE_TASK = "summarize_chat_session"
+
+# Flush-left: indentation inside a prompt is sent (and billed) on every call
+SUMMARY_PROMPT_TEMPLATE = """You maintain a running summary of a conversation between a patient and an
+assistant about the patient's prescription.
+
+Update the summary with the new messages. Keep the medicines, doses,
+questions and facts the patient was told; drop greetings and repetition.
+Write at most {max_words} words of plain text.
+
+Current summary:
+{summary}
+
+New messages:
+{messages}"""
+
+# Sessions with a summary job queued or running (in this process)
+_in_flight = set()
+_in_flight_lock = threading.Lock()
+
+
+def _line(message) -> str:
+    return f"{message.role}: {message.content}\n"
+
+
+def history_tokens(messages: list) -> int:
+    return sum(estimate_tokens(_line(message)) for message in messages)
+
+
+def build_history(summary: str, messages: list, budget: int = settings.CHAT_HISTORY_TOKEN_BUDGET) -> str:
+    """
+    Conversation text for a prompt: the session summary followed by the
+    newest messages that fit in `budget` tokens, so prompt size stays
+    bounded however long the session runs.
+    """
+    lines = []
+    used = 0
+    for message in reversed(messages):
+        line = _line(message)
+        tokens = estimate_tokens(line)
+        if used + tokens > budget:
+            if not lines:
+                # A single oversized message: keep its start
+                lines.append(line[:budget * 4] + "\n")
+            break
+        lines.append(line)
+        used += tokens
+
+    conversation = "".join(reversed(lines))
+    if summary:
+        conversation = f"Summary of earlier conversation: {summary}\n{conversation}"
+    return conversation
+
+
+def schedule_summary(session_id: int):
+    """
+    Queue a summary refresh for a session unless one is already pending.
+    """
+    with _in_flight_lock:
+        if session_id in _in_flight:
+            return
+        _in_flight.add(session_id)
+
+    try:
+        get_job_queue().enqueue(SUMMARIZE_TASK, session_id=session_id)
+    except Exception as e:
+        logger.error(f"Could not queue summary for session {session_id}: {e}")
+        with _in_flight_lock:
+            _in_flight.discard(session_id)
+
+
+def maybe_schedule_summary(session_id: int, unsummarized_tokens: int, *new_texts: str):
+    """
+    Schedule a refresh once the unsummarized history outgrows the budget.
+    unsummarized_tokens is history_tokens() of the history, computed before
+    the turn's commit expires the message objects.
+    """
+    tokens = unsummarized_tokens + sum(estimate_tokens(text) for text in new_texts)
+    if tokens > settings.CHAT_HISTORY_TOKEN_BUDGET:
+        schedule_summary(session_id)
+
+
+def _split_for_summary(messages: list):
+    """
+    (to_fold, to_keep): the newest messages filling half the budget stay
+    verbatim, leaving headroom before the next refresh.
+    """
+    keep = 0
+    used = 0
+    for message in reversed(messages):
+        tokens = estimate_tokens(_line(message))
+        if used + tokens > settings.CHAT_HISTORY_TOKEN_BUDGET // 2:
+            break
+        used += tokens
+        keep += 1
+    return messages[:len(messages) - keep], messages[len(messages) - keep:]
+
+
+def _summarize(summary: str, messages: list) -> str:
+    prompt = SUMMARY_PROMPT_TEMPLATE.format(
+        max_words=settings.CHAT_SUMMARY_TOKEN_BUDGET * 3 // 4,
+        summary=summary or "(none yet)",
+        messages="".join(_line(message) for message in messages)
+    )
+    response = get_client().models.generate_content(model=SUMMARY_MODEL, contents=prompt)
+    return response.text.strip()[:settings.CHAT_SUMMARY_TOKEN_BUDGET * 4]
+
+
+@register_task(SUMMARIZE_TASK)
+def refresh_summary(session_id: int):
+    """
+    Fold every unsummarized message except the newest ones (see
+    _split_for_summary) into the session's summary, reading forward from
+    summary_message_id one batch per Gemini call until caught up.
+    """
+    db = SessionLocal()
+    try:
+        session = db.query(ChatSession).filter(ChatSession.id == session_id).first()
+        if not session:
+            return
+
+        batch_size = settings.CHAT_HISTORY_MAX_MESSAGES * 5
+        newest = ChatRepository.get_last_messages(
+            db, session_id, limit=batch_size, after_id=session.summary_message_id
+        )
+        if not newest:
+            return
+        _, to_keep = _split_for_summary(newest)
+        # Everything older than the kept tail is folded, however far back it goes
+        keep_from = to_keep[0].id if to_keep else newest[-1].id + 1
+
+        folded = 0
+        while True:
+            to_fold = ChatRepository.get_messages_between(
+                db, session_id, after_id=session.summary_message_id, before_id=keep_from, limit=batch_size
+            )
+            if not to_fold:
+                break
+            summary = _summarize(session.summary, to_fold)
+            ChatRepository.update_summary(db, session, summary, to_fold[-1].id)
+            folded += len(to_fold)
+
+        if folded:
+            logger.info(f"Summarized {folded} messages of session {session_id}")
+
+    except Exception as e:
+        logger.error(f"Summary refresh failed for session {session_id}: {e}", exc_info=e)
+        db.rollback()
+    finally:
+        db.close()
+        with _in_flight_lock:
+            _in_flight.discard(session_id)
@@ -0,0 +1,100 @@
+from sqlalchemy.orm import Session
+from fastapi.concurrency import run_in_threadpool
+from app.models.prescription import Prescription
+from app.utils.text_chunker import chunk_text
+from app.services.embedding_service import generate_embeddings_batch, generate_embeddings_batch_async
+from app.services.vector_registry import vector_registry
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def _register_index(prescription_id: int, chunks: list[str], chunk_embeddings):
+    store = vector_registry.create_store(prescription_id)
+    store.add_chunks(chunk_embeddings, chunks)
+
+    vector_registry.save_store(prescription_id, store)
+
+    logger.info(f"RAG index built for Prescription ID: {prescription_id}")
+    logger.info(f"Total OCR chunks indexed: {len(chunks)}")
+
+    return store
+
+
+def build_prescription_index(prescription_id: int, extracted_text: str):
+    """
+    Chunk + embed the OCR text, register the FAISS store and persist it to disk.
+    Embedding errors propagate to the caller.
+    """
+
+    normalized_text = extracted_text.lower()
+    chunks = chunk_text(normalized_text)
+
+    chunk_embeddings = generate_embeddings_batch(chunks)
+
+    return _register_index(prescription_id, chunks, chunk_embeddings)
+
+
+async def build_prescription_index_async(prescription_id: int, extracted_text: str):
+    """
+    Async build_prescription_index: embeds with the async Gemini client, then
+    adds and saves the store in a worker thread.
+    """
+
+    normalized_text = extracted_text.lower()
+    chunks = chunk_text(normalized_text)
+
+    chunk_embeddings = await generate_embeddings_batch_async(chunks)
+
+    return await run_in_threadpool(_register_index, prescription_id, chunks, chunk_embeddings)
+
+
+def clone_or_build_index(source_id: int, prescription_id: int, extracted_text: str):
+    """
+    Reuse the index of an identical earlier upload, or build it (cached
+    embeddings make the rebuild free of API calls for known text).
+    """
+    if source_id is not None and vector_registry.clone_store(source_id, prescription_id):
+        return
+    build_prescription_index(prescription_id, extracted_text)
+
+
+def get_or_rebuild_store(prescription: Prescription):
+    """
+    Return the prescription's store, loading it from disk or, for prescriptions
+    that were never saved, rebuilding it from the text stored in the DB.
+    """
+
+    store = vector_registry.get_store(prescription.id)
+    if store is not None:
+        return store
+
+    if not prescription.extracted_text or not prescription.extracted_text.strip():
+        return None
+
+    logger.info(f"No persisted index for prescription_id={prescription.id}. Rebuilding from DB.")
+    return build_prescription_index(prescription.id, prescription.extracted_text)
+
+
+def rebuild_missing_indexes(db: Session) -> int:
+    """
+    Build and persist indexes for every prescription without a saved store.
+    """
+
+    rebuilt = 0
+    prescriptions = db.query(Prescription).all()
+
+    for prescription in prescriptions:
+        if vector_registry.has_persisted_store(prescription.id):
+            continue
+        if not prescription.extracted_text or not prescription.extracted_text.strip():
+            continue
+
+        try:
+            build_prescription_index(prescription.id, prescription.extracted_text)
+            rebuilt += 1
+        except Exception as e:
+            logger.error(f"Index rebuild failed for prescription_id={prescription.id}: {e}")
+
+    logger.info(f"Rebuilt {rebuilt} vector indexes from DB")
+    return rebuilt
@@ -0,0 +1,424 @@
+import os
+import socket
+import hashlib
+import tempfile
+import threading
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from sqlalchemy.orm import Session
+from fastapi.concurrency import run_in_threadpool
+from app.core.config import settings
+from app.core.database import DbSession, SessionLocal, run_db
+from app.models.ingestion_job import (
+    STATUS_COMPLETED, STATUS_FAILED,
+    STAGE_OCR, STAGE_EXTRACTION, STAGE_INDEXING, STAGE_DONE
+)
+from app.repositories.ingestion_job_repository import IngestionJobRepository
+from app.repositories.prescription_repository import PrescriptionRepository
+from app.repositories.uploaded_file_repository import UploadedFileRepository
+from app.services.file_ingestion_service import FileIngestionService
+from app.services.llm_service import (
+    extract_medicines_from_text, extract_and_enrich_medicines,
+    extract_medicines_from_text_async, extract_and_enrich_medicines_async
+)
+from app.services.indexing_service import (
+    build_prescription_index, build_prescription_index_async, clone_or_build_index
+)
+from app.services.job_queue import register_task, get_job_queue
+import logging
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_DIR = "uploads"
+READ_CHUNK_SIZE = 1024 * 1024
+
+INGEST_TASK = "ingest_prescription"
+
+JOB_FAILED_MESSAGE = "Prescription processing failed."
+JOB_INTERRUPTED_MESSAGE = "Processing was interrupted by a server restart. Please upload the file again."
+
+# Owner recorded on the jobs this process claims
+WORKER_ID = f"{socket.gethostname()[:40]}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class TextExtractionError(ValueError):
+    """No usable text could be extracted from the upload."""
+
+
+class IndexingError(RuntimeError):
+    """The RAG index (embeddings) could not be built."""
+
+
+def save_upload(file):
+    """
+    Stream the upload to disk while hashing it and store it content-addressed
+    as UPLOAD_DIR/<h[:2]>/<sha256><ext>. Returns (file_path, content_hash).
+    """
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    extension = os.path.splitext(os.path.basename(file.filename or ""))[1].lower()
+
+    digest = hashlib.sha256()
+    file.file.seek(0)
+    buffer = tempfile.NamedTemporaryFile(dir=UPLOAD_DIR, suffix=".part", delete=False)
+    temp_path = buffer.name
+    try:
+        with buffer:
+            while True:
+                block = file.file.read(READ_CHUNK_SIZE)
+                if not block:
+                    break
+                digest.update(block)
+                buffer.write(block)
+
+        content_hash = digest.hexdigest()
+        target_dir = os.path.join(UPLOAD_DIR, content_hash[:2])
+        os.makedirs(target_dir, exist_ok=True)
+        file_path = os.path.join(target_dir, content_hash + extension)
+
+        if os.path.exists(file_path):
+            os.remove(temp_path)
+        else:
+            os.replace(temp_path, file_path)
+    except Exception:
+        # Client disconnect, full disk...: don't leave the partial file behind
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+    return file_path, content_hash
+
+
+def _usable_fallback(fallback) -> list:
+    # The simple extractor returns "LLM Error: ..." rather than raising
+    return fallback if isinstance(fallback, list) else []
+
+
+def extract_medicines(extracted_text: str) -> list:
+    """
+    Medicine extraction (LLM) with fallback to the simple extractor.
+    """
+    enriched_medicines = extract_and_enrich_medicines(extracted_text)
+    if enriched_medicines:
+        return enriched_medicines
+
+    logger.warning("LLM extraction returned empty; falling back to simple extractor.")
+    try:
+        return _usable_fallback(extract_medicines_from_text(extracted_text))
+    except Exception as e:
+        logger.error("Fallback extraction also failed: %s", e, exc_info=e)
+        return []
+
+
+async def extract_medicines_async(extracted_text: str) -> list:
+    """
+    Async extract_medicines.
+    """
+    enriched_medicines = await extract_and_enrich_medicines_async(extracted_text)
+    if enriched_medicines:
+        return enriched_medicines
+
+    logger.warning("LLM extraction returned empty; falling back to simple extractor.")
+    try:
+        return _usable_fallback(await extract_medicines_from_text_async(extracted_text))
+    except Exception as e:
+        logger.error("Fallback extraction also failed: %s", e, exc_info=e)
+        return []
+
+
+def _no_stage_updates(stage: str, **fields):
+    pass
+
+
+def _reuse_duplicate(db: Session, user_id: int, content_hash: str):
+    """
+    DB part of duplicate handling, for bytes that were processed before.
+    Returns (prescription, needs_index, source_id): the user's own
+    prescription, or a new one reusing text and analysis whose index must
+    still be cloned from source_id (see _index_duplicate).
+    (None, False, None) for new bytes.
+    """
+    known = UploadedFileRepository.get_by_hash(db, content_hash)
+    if not known:
+        return None, False, None
+
+    existing = PrescriptionRepository.get_user_prescription_for_file(db, user_id, known.file_path)
+    if existing:
+        logger.info(f"Duplicate upload {content_hash[:12]}; returning prescription {existing.id}")
+        return existing, False, None
+
+    source_id = known.prescription_id
+    logger.info(f"Duplicate upload {content_hash[:12]}; reusing results of prescription {source_id}")
+    prescription = PrescriptionRepository.create_prescription(
+        db=db,
+        user_id=user_id,
+        image_path=known.file_path,
+        extracted_text=known.extracted_text,
+        analysis_result=known.analysis_result
+    )
+    return prescription, True, source_id
+
+
+@contextmanager
+def _indexing_errors():
+    try:
+        yield
+    except Exception as e:
+        raise IndexingError("Embedding service failed.") from e
+
+
+def _index_duplicate(source_id: int, prescription_id: int, extracted_text: str):
+    """
+    Clone (or rebuild) the vector index of a reused prescription; file and
+    embedding work, so never inside a DB session's run_sync.
+    """
+    with _indexing_errors():
+        clone_or_build_index(source_id, prescription_id, extracted_text)
+
+
+def _save_prescription(db: Session, user_id: int, file_path: str, extracted_text: str, medicines: list):
+    return PrescriptionRepository.create_prescription(
+        db=db,
+        user_id=user_id,
+        image_path=file_path,
+        extracted_text=extracted_text,
+        analysis_result=medicines
+    )
+
+
+def _record_upload(db: Session, prescription, content_hash: str, file_path: str, content_type: str):
+    """
+    Remember results for future uploads of the same bytes.
+    """
+    UploadedFileRepository.record(
+        db,
+        content_hash=content_hash,
+        file_path=file_path,
+        content_type=content_type,
+        extracted_text=prescription.extracted_text,
+        analysis_result=prescription.analysis_result,
+        prescription_id=prescription.id
+    )
+    # The commit may have expired it; reload inside the session's own context
+    db.refresh(prescription)
+    logger.info(f"Total structured medicines stored: {len(prescription.analysis_result or [])}")
+    return prescription
+
+
+def _check_extracted_text(extracted_text: str):
+    if not extracted_text or extracted_text.strip() == "" or extracted_text.startswith("OCR Error:"):
+        raise TextExtractionError("Unable to extract sufficient text from file.")
+
+
+def ingest_file(
+    db: Session,
+    user_id: int,
+    file_path: str,
+    content_type: str,
+    content_hash: str,
+    on_stage=_no_stage_updates
+):
+    """
+    OCR -> extraction -> DB -> indexing for a saved upload, short-circuited
+    when the same bytes were processed before. on_stage(stage, **fields) is
+    called as each stage starts.
+    """
+
+    # ♻️ Duplicate upload: reuse text, analysis and vector index
+    reused, needs_index, source_id = _reuse_duplicate(db, user_id, content_hash)
+    if reused:
+        if needs_index:
+            on_stage(STAGE_INDEXING, prescription_id=reused.id)
+            _index_duplicate(source_id, reused.id, reused.extracted_text)
+        return reused
+
+    # 1️⃣ Extract text
+    on_stage(STAGE_OCR)
+    extracted_text = FileIngestionService.extract_text(file_path, content_type)
+    _check_extracted_text(extracted_text)
+
+    # 2️⃣ Medicine extraction (LLM) with fallback
+    on_stage(STAGE_EXTRACTION)
+    enriched_medicines = extract_medicines(extracted_text)
+
+    # 3️⃣ Save to DB
+    prescription = _save_prescription(db, user_id, file_path, extracted_text, enriched_medicines)
+
+    # 4️⃣ Build RAG Vector Index (OCR text only) and persist it to disk
+    on_stage(STAGE_INDEXING, prescription_id=prescription.id)
+    with _indexing_errors():
+        build_prescription_index(prescription.id, extracted_text)
+
+    # 5️⃣ Remember results for future uploads of the same bytes
+    return _record_upload(db, prescription, content_hash, file_path, content_type)
+
+
+async def ingest_file_async(
+    db: DbSession,
+    user_id: int,
+    file_path: str,
+    content_type: str,
+    content_hash: str
+):
+    """
+    ingest_file for async routes: Gemini calls go through the async client,
+    DB work through run_db and OCR in the threadpool.
+    """
+
+    # ♻️ Duplicate upload: reuse text, analysis and vector index
+    reused, needs_index, source_id = await run_db(db, _reuse_duplicate, user_id, content_hash)
+    if reused:
+        if needs_index:
+            await run_in_threadpool(_index_duplicate, source_id, reused.id, reused.extracted_text)
+        return reused
+
+    # 1️⃣ Extract text (OCR itself runs in the OCR process pool)
+    extracted_text = await run_in_threadpool(FileIngestionService.extract_text, file_path, content_type)
+    _check_extracted_text(extracted_text)
+
+    # 2️⃣ Medicine extraction (LLM) with fallback
+    enriched_medicines = await extract_medicines_async(extracted_text)
+
+    # 3️⃣ Save to DB
+    prescription = await run_db(db, _save_prescription, user_id, file_path, extracted_text, enriched_medicines)
+
+    # 4️⃣ Build RAG Vector Index (OCR text only) and persist it to disk
+    with _indexing_errors():
+        await build_prescription_index_async(prescription.id, extracted_text)
+
+    # 5️⃣ Remember results for future uploads of the same bytes
+    return await run_db(db, _record_upload, prescription, content_hash, file_path, content_type)
+
+
+@contextmanager
+def _heartbeat(job_id: int):
+    """
+    Refresh the job's heartbeat from a side thread (with its own session)
+    while the body runs, so peers' stale-job sweeps leave the job alone.
+    """
+    stop = threading.Event()
+
+    def beat():
+        db = SessionLocal()
+        try:
+            while not stop.wait(settings.INGESTION_HEARTBEAT_INTERVAL):
+                try:
+                    if not IngestionJobRepository.heartbeat(db, job_id, WORKER_ID):
+                        logger.warning(f"Ingestion job {job_id} is no longer running on this worker")
+                        return
+                except Exception as e:
+                    db.rollback()
+                    logger.warning(f"Ingestion job {job_id} heartbeat failed: {e}")
+        finally:
+            db.close()
+
+    thread = threading.Thread(target=beat, name=f"job-{job_id}-heartbeat", daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+@register_task(INGEST_TASK)
+def run_ingestion_job(job_id: int):
+    """
+    Run ingest_file for one queued upload, recording the current stage on
+    the job row so clients can poll it.
+    """
+    db = SessionLocal()
+    try:
+        job = IngestionJobRepository.get_job(db, job_id)
+        if not job:
+            logger.warning(f"Ingestion job {job_id} not found")
+            return
+
+        def on_stage(stage: str, **fields):
+            IngestionJobRepository.update_job(db, job, stage=stage, **fields)
+
+        if not IngestionJobRepository.claim_job(db, job_id, WORKER_ID):
+            logger.info(f"Ingestion job {job_id} is {job.status}; skipping")
+            return
+        db.refresh(job)
+
+        try:
+            with _heartbeat(job_id):
+                prescription = ingest_file(
+                    db,
+                    user_id=job.user_id,
+                    file_path=job.file_path,
+                    content_type=job.content_type,
+                    content_hash=job.content_hash,
+                    on_stage=on_stage
+                )
+            IngestionJobRepository.update_job(
+                db, job, status=STATUS_COMPLETED, stage=STAGE_DONE, prescription_id=prescription.id
+            )
+
+        except Exception as e:
+            logger.error(f"Ingestion job {job_id} failed at stage {job.stage}: {e}", exc_info=e)
+            db.rollback()
+            IngestionJobRepository.update_job(db, job, status=STATUS_FAILED, error=_job_error(e))
+    finally:
+        db.close()
+
+
+def _job_error(error: Exception) -> str:
+    """
+    Message stored on a failed job (and shown to the client). Only our own
+    errors are passed through; anything else is logged, not exposed.
+    """
+    if isinstance(error, (TextExtractionError, IndexingError)):
+        return str(error)
+    return JOB_FAILED_MESSAGE
+
+
+def fail_stale_jobs() -> int:
+    """
+    Fail running jobs without a heartbeat for INGESTION_HEARTBEAT_TIMEOUT
+    seconds: their worker died (possibly half-done), so clients stop
+    polling and can re-upload. Jobs live workers are running keep going.
+    """
+    stale_before = datetime.utcnow() - timedelta(seconds=settings.INGESTION_HEARTBEAT_TIMEOUT)
+    db = SessionLocal()
+    try:
+        failed = IngestionJobRepository.fail_stale_jobs(db, JOB_INTERRUPTED_MESSAGE, stale_before)
+    finally:
+        db.close()
+    if failed:
+        logger.warning(f"Marked {failed} interrupted ingestion jobs as failed")
+    return failed
+
+
+def recover_interrupted_jobs():
+    """
+    Startup recovery for jobs the previous process never finished: queued
+    jobs are enqueued again and stale running ones are failed. With
+    several workers sharing one database, claim_job keeps a re-enqueued
+    job from running twice.
+    """
+    fail_stale_jobs()
+
+    db = SessionLocal()
+    try:
+        queued = IngestionJobRepository.get_queued_job_ids(db)
+    finally:
+        db.close()
+
+    for job_id in queued:
+        get_job_queue().enqueue(INGEST_TASK, job_id=job_id)
+    if queued:
+        logger.info(f"Re-enqueued {len(queued)} queued ingestion jobs")
+
+
+def watch_stale_jobs(stop: threading.Event):
+    """
+    Sweep for stale jobs until stop is set. A job running when its worker
+    crashed is still fresh at the next startup, so startup alone misses it.
+    """
+    while not stop.wait(settings.INGESTION_HEARTBEAT_TIMEOUT):
+        try:
+            fail_stale_jobs()
+        except Exception as e:
+            logger.warning(f"Stale ingestion job sweep failed: {e}")
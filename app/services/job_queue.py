@@ -0,0 +1,82 @@
+from concurrent.futures import ThreadPoolExecutor
+from app.core.config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+# task name -> callable, filled by @register_task
+TASKS = {}
+
+
+def register_task(name: str):
+    def decorator(fn):
+        TASKS[name] = fn
+        return fn
+    return decorator
+
+
+class JobQueue:
+    """
+    Background job backend. Tasks are enqueued by name with JSON-friendly
+    keyword arguments so out-of-process backends can serialize them.
+    """
+
+    def enqueue(self, task: str, **kwargs):
+        raise NotImplementedError
+
+    def shutdown(self):
+        pass
+
+
+class InProcessJobQueue(JobQueue):
+    """
+    Runs tasks on a local thread pool. Jobs still queued at shutdown are
+    dropped here and picked up again by recover_interrupted_jobs() on the
+    next startup.
+    """
+
+    def __init__(self, max_workers: int):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ingestion")
+
+    def _run(self, task: str, kwargs: dict):
+        try:
+            TASKS[task](**kwargs)
+        except Exception as e:
+            logger.error(f"Background task {task} crashed: {e}", exc_info=e)
+
+    def enqueue(self, task: str, **kwargs):
+        if task not in TASKS:
+            raise ValueError(f"Unknown task: {task}")
+        logger.info(f"Enqueued task {task} {kwargs}")
+        self.executor.submit(self._run, task, kwargs)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+BACKENDS = {
+    "inprocess": lambda: InProcessJobQueue(settings.INGESTION_WORKERS),
+}
+
+
+def register_backend(name: str, factory):
+    BACKENDS[name] = factory
+
+
+_queue = None
+
+
+def get_job_queue() -> JobQueue:
+    global _queue
+    if _queue is None:
+        backend = settings.INGESTION_QUEUE_BACKEND
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown ingestion queue backend: {backend}")
+        _queue = BACKENDS[backend]()
+        logger.info(f"Job queue backend: {backend}")
+    return _queue
+
+
+def shutdown_job_queue():
+    if _queue is not None:
+        _queue.shutdown()
@@ -1,14 +1,15 @@
 import json
 import re
-from google import genai
-from app.core.config import settings
+from dataclasses import dataclass
+from typing import Any, Callable
+from fastapi.concurrency import run_in_threadpool
+from app.services.gemini_client import get_client, gemini_slot
+from app.services.extraction_cache import extraction_cache, prompt_version
 import logging
 import time
 
 logger = logging.getLogger(__name__)
 
-client = genai.Client(api_key=settings.GEMINI_API_KEY)
-
 
 def clean_json_response(text: str):
     # Remove markdown if present
@@ -17,8 +18,11 @@ def clean_json_response(text: str):
     return text
 
 
-def extract_and_enrich_medicines(ocr_text: str):
-    prompt = f"""
+ENRICH_MODEL = "models/gemini-2.5-flash"
+EXTRACT_MODEL = "gemini-2.5-flash"
+
+# Filled with str.format(ocr_text=...)
+ENRICH_PROMPT_TEMPLATE = """
             You are a medical prescription analyzer.
 
             Extract structured medicine information AND provide medical details.
@@ -59,34 +63,7 @@ def extract_and_enrich_medicines(ocr_text: str):
             {ocr_text}
             """
 
-
-    try:
-        start = time.time()
-        logger.info("Calling Gemini for extraction + enrichment")
-
-        response = client.models.generate_content(
-            model="models/gemini-2.5-flash",
-            contents=prompt
-        )
-
-        logger.info(f"Gemini response received in {time.time() - start:.2f}s")
-
-        cleaned = clean_json_response(response.text)
-        parsed = json.loads(cleaned)
-
-        if not isinstance(parsed, list):
-            raise ValueError("LLM did not return list")
-
-        return parsed
-
-    except Exception as e:
-        logger.error(f"Unified extraction failed: {e}")
-        return []
-
-
-
-def extract_medicines_from_text(ocr_text: str):
-    prompt = f"""
+EXTRACT_PROMPT_TEMPLATE = """
     You are a medical prescription analyzer.
 
     Extract structured medicine information from the following text.
@@ -113,23 +90,109 @@ def extract_medicines_from_text(ocr_text: str):
     {ocr_text}
     """
 
+
+# Part of the extraction cache key: editing a template or model invalidates its entries
+ENRICH_PROMPT_VERSION = prompt_version(ENRICH_MODEL, ENRICH_PROMPT_TEMPLATE)
+EXTRACT_PROMPT_VERSION = prompt_version(EXTRACT_MODEL, EXTRACT_PROMPT_TEMPLATE)
+
+
+def parse_medicine_list(text: str) -> list:
+    cleaned = clean_json_response(text)
+    parsed = json.loads(cleaned)
+
+    if not isinstance(parsed, list):
+        raise ValueError("LLM did not return list")
+
+    return parsed
+
+
+@dataclass(frozen=True)
+class _Extraction:
+    """
+    One extraction prompt: model, template, cache version and the value
+    returned when the call or parsing fails.
+    """
+    label: str
+    model: str
+    template: str
+    version: str
+    on_error: Callable[[Exception], Any]
+
+
+ENRICH = _Extraction(
+    "extraction + enrichment", ENRICH_MODEL, ENRICH_PROMPT_TEMPLATE, ENRICH_PROMPT_VERSION,
+    on_error=lambda e: []
+)
+EXTRACT = _Extraction(
+    "extraction", EXTRACT_MODEL, EXTRACT_PROMPT_TEMPLATE, EXTRACT_PROMPT_VERSION,
+    on_error=lambda e: f"LLM Error: {str(e)}"
+)
+
+
+def _store_response(extraction: _Extraction, ocr_text: str, response_text: str, start: float) -> list:
+    logger.info(f"Gemini response received in {time.time() - start:.2f}s")
+
+    medicines = parse_medicine_list(response_text)
+    extraction_cache.put(extraction.version, ocr_text, medicines)
+    return medicines
+
+
+def _run_extraction(extraction: _Extraction, ocr_text: str):
+    cached = extraction_cache.get(extraction.version, ocr_text)
+    if cached is not None:
+        return cached
+
     try:
         start = time.time()
-        logger.info("Calling Gemini model for extraction")
+        logger.info(f"Calling Gemini for {extraction.label}")
 
-        response = client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=prompt
+        response = get_client().models.generate_content(
+            model=extraction.model,
+            contents=extraction.template.format(ocr_text=ocr_text)
         )
-        logger.info(f"Gemini response received in {time.time() - start:.2f}s")
-        cleaned = clean_json_response(response.text)
+        return _store_response(extraction, ocr_text, response.text, start)
+
+    except Exception as e:
+        logger.error(f"Gemini {extraction.label} failed: {e}")
+        return extraction.on_error(e)
+
+
+async def _run_extraction_async(extraction: _Extraction, ocr_text: str):
+    """
+    _run_extraction with the async client; cache reads/writes (SQLite) run
+    in the threadpool.
+    """
+    cached = await run_in_threadpool(extraction_cache.get, extraction.version, ocr_text)
+    if cached is not None:
+        return cached
 
-        parsed = json.loads(cleaned)
+    try:
+        start = time.time()
+        logger.info(f"Calling Gemini (async) for {extraction.label}")
 
-        if not isinstance(parsed, list):
-            raise ValueError("LLM did not return list")
+        async with gemini_slot():
+            response = await get_client().aio.models.generate_content(
+                model=extraction.model,
+                contents=extraction.template.format(ocr_text=ocr_text)
+            )
+        return await run_in_threadpool(_store_response, extraction, ocr_text, response.text, start)
 
-        return parsed
     except Exception as e:
-        logger.error(f"LLM was not able to generate response: {e}")
-        return f"LLM Error: {str(e)}"
+        logger.error(f"Gemini {extraction.label} failed: {e}")
+        return extraction.on_error(e)
+
+
+def extract_and_enrich_medicines(ocr_text: str):
+    return _run_extraction(ENRICH, ocr_text)
+
+
+async def extract_and_enrich_medicines_async(ocr_text: str):
+    return await _run_extraction_async(ENRICH, ocr_text)
+
+
+def extract_medicines_from_text(ocr_text: str):
+    return _run_extraction(EXTRACT, ocr_text)
+
+
+async def extract_medicines_from_text_async(ocr_text: str):
+    return await _run_extraction_async(EXTRACT, ocr_text)
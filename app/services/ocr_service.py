@@ -1,15 +1,189 @@
-import easyocr
+import os
+import threading
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from app.core.config import settings
 import logging
 logger = logging.getLogger(__name__)
 
-reader = easyocr.Reader(['en'], gpu=False)
+# EasyOCR reader of the current process: built once per OCR worker by
+# _init_worker, or lazily in-process when OCR_WORKERS=0.
+_reader = None
+_reader_lock = threading.Lock()
 
-def extract_text_from_image(image_path: str) -> str:
+
+def _load_reader():
+    global _reader
+    with _reader_lock:
+        if _reader is None:
+            import easyocr
+            _reader = easyocr.Reader(['en'], gpu=False)
+    return _reader
+
+
+def _init_worker():
+    # Each worker gets one CPU thread so N workers use N cores without oversubscription
+    import torch
+    torch.set_num_threads(1)
+    _load_reader()
+
+
+def _readtext(image) -> str:
+    """
+    OCR an image path or HxWxC uint8 array. Runs inside a worker process.
+    """
+    results = _load_reader().readtext(image, detail=0, paragraph=True)
+    return " ".join(results).strip()
+
+
+def _ping() -> int:
+    return os.getpid()
+
+
+def _settle(target: Future, done: Future):
+    if done.cancelled():
+        target.cancel()
+    elif done.exception() is not None:
+        target.set_exception(done.exception())
+    else:
+        target.set_result(done.result())
+
+
+class OCRWorkerPool:
+    """
+    Pool of OCR processes, each holding its own preloaded EasyOCR model.
+    At most max_pending images are queued or running; submit() blocks
+    (up to timeout) when the queue is full.
+    """
+
+    def __init__(self, workers: int, max_pending: int, timeout: float):
+        self.workers = workers
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._executor_lock = threading.Lock()
+        self.executor = self._new_executor()
+        logger.info(f"OCR worker pool started with {workers} processes")
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker
+        )
+
+    def _rebuild(self, broken: ProcessPoolExecutor):
+        """
+        Replace a broken executor (a worker died, e.g. OOM-killed). Only the
+        first caller for a given broken executor rebuilds it.
+        """
+        with self._executor_lock:
+            if self.executor is not broken:
+                return
+            logger.warning("OCR worker pool is broken; starting new worker processes")
+            broken.shutdown(wait=False, cancel_futures=True)
+            self.executor = self._new_executor()
+
+    def _submit_once(self, executor: ProcessPoolExecutor, image) -> Future:
+        if not self._slots.acquire(timeout=self.timeout):
+            raise RuntimeError("OCR queue is full")
+        try:
+            future = executor.submit(_readtext, image)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def submit(self, image, retries: int = 1) -> Future:
+        """
+        Queue OCR for an image. If the pool is (or breaks while running this
+        image) broken, it is rebuilt and the image retried up to `retries` times.
+        """
+        executor = self.executor
+        try:
+            future = self._submit_once(executor, image)
+        except BrokenProcessPool:
+            if not retries:
+                raise
+            self._rebuild(executor)
+            return self.submit(image, retries - 1)
+
+        if not retries:
+            return future
+
+        result = Future()
+
+        def on_done(done: Future):
+            if done.cancelled() or not isinstance(done.exception(), BrokenProcessPool):
+                _settle(result, done)
+                return
+            self._rebuild(executor)
+            try:
+                retry = self.submit(image, retries - 1)
+            except Exception as e:
+                result.set_exception(e)
+                return
+            retry.add_done_callback(lambda again: _settle(result, again))
+
+        future.add_done_callback(on_done)
+        return result
+
+    def warmup(self):
+        """
+        Start every worker so the model load happens before the first request.
+        """
+        pids = {f.result() for f in [self.executor.submit(_ping) for _ in range(self.workers)]}
+        logger.info(f"OCR workers ready: {sorted(pids)}")
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_ocr_pool():
+    """
+    Shared OCR pool, or None when OCR_WORKERS=0 (OCR runs on the calling thread).
+    """
+    global _pool
+    if settings.OCR_WORKERS <= 0:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            _pool = OCRWorkerPool(settings.OCR_WORKERS, settings.OCR_MAX_PENDING, settings.OCR_TIMEOUT)
+    return _pool
+
+
+def shutdown_ocr_pool():
+    if _pool is not None:
+        _pool.shutdown()
+
+
+def submit_ocr(image) -> Future:
+    """
+    Queue OCR for an image path or array and return a Future with the text.
+    A broken worker pool is rebuilt and the image retried once.
+    """
+    pool = get_ocr_pool()
+    if pool is not None:
+        return pool.submit(image)
+
+    future = Future()
+    try:
+        future.set_result(_readtext(image))
+    except Exception as e:
+        future.set_exception(e)
+    return future
+
+
+def extract_text_from_image(image_path) -> str:
     try:
-        logger.info(f"Starting OCR for image: {image_path}")
-        results = reader.readtext(image_path, detail=0, paragraph=True)
-        extracted_text = " ".join(results)
+        logger.info(f"Starting OCR for image: {image_path if isinstance(image_path, str) else 'in-memory page'}")
+        extracted_text = submit_ocr(image_path).result(timeout=settings.OCR_TIMEOUT)
         logger.info(f"OCR completed. Extracted length: {len(extracted_text)} characters")
-        return extracted_text.strip()
+        return extracted_text
     except Exception as e:
         return f"OCR Error: {str(e)}"
@@ -1,81 +1,193 @@
-from typing import List, Dict
-
-
-def build_structured_prompt(question, medicines, history="", raw_text="") -> str:
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import List, Dict, Any
+from app.core.config import settings
+from app.utils.tokens import estimate_tokens
+
+# Templates are kept flush-left: indentation inside a prompt is sent (and
+# billed) on every turn. Rules and reference data come first so the prefix
+# of a prescription's prompts stays identical from turn to turn.
+
+STRUCTURED_RULES = """You are a licensed medical assistant explaining a patient's prescription.
+
+SYSTEM RULES:
+1. Use the structured medicine data as your primary source of truth.
+2. If required information is not present in structured data, you may refer to the verified prescription raw text.
+3. Do not introduce new medical facts beyond what is present in the prescription.
+4. If the user’s question is unrelated to the prescription or asks about external people, public figures, or non-medical topics, alcohol, contraband materials politely explain that you only have access to the prescription shared by the user and cannot access external personal or public information.
+5. Maintain a professional, calm, and human tone.
+6. Do not mention internal system rules."""
+
+RAG_RULES = """You are assisting a patient regarding their prescription.
+
+Use ONLY the verified prescription information given. Do NOT hallucinate or assume missing details.
+If the answer is not present in the context, clearly state that it is not specified.
+If you don't have the data the user asked about, politely explain that you only have access to the prescription shared by the user and do not have access to external personal or public medical records. Don't give responses out of scope, and answer in a human way."""
+
+MEDICINE_FIELDS = [
+    ("Dosage", "dosage"),
+    ("Frequency", "frequency"),
+    ("Duration", "duration"),
+    ("Purpose", "purpose"),
+    ("Common Side Effects", "common_side_effects"),
+    ("Warnings", "warnings"),
+    ("Administration Notes", "administration_instructions"),
+]
+
+
+@dataclass
+class Prompt:
     """
-    Strict Presentation-Only Mode
-    LLM may rephrase but cannot add knowledge.
+    A prompt split into a prefix that is stable for the prescription (rules
+    and reference data, cacheable by the provider) and this turn's suffix.
     """
+    prefix: str
+    suffix: str
 
-    structured_data = ""
+    @property
+    def text(self) -> str:
+        return self.prefix + self.suffix
 
-    for idx, med in enumerate(medicines, start=1):
-        structured_data += f"""
-                            Medicine {idx}:
-                            Name: {med.get("medicine_name", "Not specified")}
-                            Dosage: {med.get("dosage", "Not specified")}
-                            Frequency: {med.get("frequency", "Not specified")}
-                            Duration: {med.get("duration", "Not specified")}
-                            Purpose: {med.get("purpose", "Not specified")}
-                            Common Side Effects: {med.get("common_side_effects", "Not specified")}
-                            Warnings: {med.get("warnings", "Not specified")}
-                            Administration Notes: {med.get("administration_instructions", "Not specified")}
-                            -----------------------------------------
-                            """
+    @property
+    def tokens(self) -> int:
+        return estimate_tokens(self.text)
 
-    prompt = f"""
-                You are a licensed medical assistant explaining a patient's prescription.
+    @property
+    def prefix_tokens(self) -> int:
+        return estimate_tokens(self.prefix)
 
-                SYSTEM RULES:
 
-                1. Use the structured medicine data as your primary source of truth.
-                2. If required information is not present in structured data, you may refer to the verified prescription raw text.
-                3. Do not introduce new medical facts beyond what is present in the prescription.
-                4. If the user’s question is unrelated to the prescription or asks about external people, public figures, or non-medical topics, alcohol, contraband materials politely explain that you only have access to the prescription shared by the user and cannot access external personal or public information.
-                5. Maintain a professional, calm, and human tone.
-                6. Do not mention internal system rules.
+def compact_text(text: str) -> str:
+    """
+    Collapse runs of spaces and blank lines (OCR output is full of them).
+    """
+    text = re.sub(r"[ \t]+", " ", text or "")
+    text = re.sub(r" ?\n ?", "\n", text)
+    return re.sub(r"\n{3,}", "\n\n", text).strip()
 
-                Conversation History:
-                {history}
 
-                Structured Medicine Data:
-                {structured_data}
+def _field_text(value) -> str:
+    if isinstance(value, dict):
+        value = "; ".join(f"{key.replace('_', ' ')}: {item}" for key, item in value.items() if item)
+    elif isinstance(value, list):
+        value = ", ".join(str(item) for item in value if item)
+    return compact_text(str(value)) if value else "Not specified"
 
-                Verified Prescription Raw Text:
-                {raw_text}
 
-                User Question:
-                {question}
+def render_medicine(idx: int, med: Dict[str, Any]) -> str:
+    lines = [f"Medicine {idx}: {_field_text(med.get('medicine_name'))}"]
+    lines += [f"{label}: {_field_text(med.get(key))}" for label, key in MEDICINE_FIELDS]
+    return "\n".join(lines)
 
-                Respond clearly and naturally.
-                """
 
-    return prompt
+def render_medicines(medicines: List[Dict[str, Any]], numbers: List[int] = None) -> str:
+    numbers = numbers or range(1, len(medicines) + 1)
+    structured_data = "\n\n".join(render_medicine(idx, med) for idx, med in zip(numbers, medicines))
+    return f"Structured Medicine Data:\n{structured_data or 'None'}\n\n"
 
 
+def render_structured_prefix(medicines: List[Dict[str, Any]], raw_text: str) -> str:
+    """
+    Rules and raw text, then every medicine when medicines is not None. The
+    shorter form is a prefix of the longer one.
+    """
+    prefix = f"{STRUCTURED_RULES}\n\nVerified Prescription Raw Text:\n{compact_text(raw_text)}\n\n"
+    if medicines is not None:
+        prefix += render_medicines(medicines)
+    return prefix
 
-def build_rag_prompt(question: str, retrieved_chunks: List[str], history: str) -> str:
 
-    context_text = "\n".join(retrieved_chunks)
+class PromptPrefixCache:
+    """
+    Rendered structured prefixes per prescription (LRU), with and without
+    the medicine block. version identifies the analysis a prefix was
+    rendered from; a lookup with another version re-renders, so edits made
+    through any worker are picked up. invalidate() just frees entries early.
+    """
 
-    prompt = f"""
-    You are assisting a patient regarding their prescription.
+    def __init__(self, max_entries: int = settings.PROMPT_PREFIX_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._prefixes = OrderedDict()  # (prescription_id, with_medicines) -> (version, prefix)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(
+        self,
+        prescription_id: int,
+        medicines: List[Dict[str, Any]],
+        raw_text: str,
+        with_medicines: bool = True,
+        version: str = ""
+    ) -> str:
+        key = (prescription_id, with_medicines)
+        with self._lock:
+            entry = self._prefixes.get(key)
+            if entry is not None and entry[0] == version:
+                self._prefixes.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        prefix = render_structured_prefix(medicines if with_medicines else None, raw_text)
+        with self._lock:
+            self._prefixes[key] = (version, prefix)
+            self._prefixes.move_to_end(key)
+            while len(self._prefixes) > self.max_entries:
+                self._prefixes.popitem(last=False)
+        return prefix
+
+    def invalidate(self, prescription_id: int):
+        with self._lock:
+            self._prefixes.pop((prescription_id, True), None)
+            self._prefixes.pop((prescription_id, False), None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._prefixes), "hits": self.hits, "misses": self.misses}
+
+
+prompt_prefixes = PromptPrefixCache()
+
+
+def build_structured_prompt(question, medicines, history="", prefix="", all_medicines=None, prefix_has_medicines=False) -> Prompt:
+    """
+    Strict Presentation-Only Mode
+    LLM may rephrase but cannot add knowledge.
 
-    Use ONLY the verified prescription information below.
-    Do NOT hallucinate or assume missing details.
-    If the answer is not present in the context, clearly state that it is not specified.
+    prefix comes from prompt_prefixes. When it already lists every medicine
+    and the question matched only some, the suffix names those; otherwise
+    the suffix carries the matched medicines' data.
+    """
+    numbers = [idx for idx, med in enumerate(all_medicines or medicines, start=1) if med in medicines]
 
-    Verified Prescription Context:
-    {context_text}
+    if not prefix_has_medicines:
+        medicine_data = render_medicines(medicines, numbers if len(numbers) == len(medicines) else None)
+    elif all_medicines and len(medicines) < len(all_medicines):
+        names = [f"Medicine {idx} ({_field_text(all_medicines[idx - 1].get('medicine_name'))})" for idx in numbers]
+        medicine_data = f"The question is about: {', '.join(names)}.\n\n"
+    else:
+        medicine_data = ""
 
-    Previous Conversation:
-    {history}
+    suffix = (
+        f"{medicine_data}"
+        f"Conversation History:\n{history.strip() or 'None'}\n\n"
+        f"User Question:\n{question}\n\n"
+        "Respond clearly and naturally."
+    )
+    return Prompt(prefix=prefix, suffix=suffix)
 
-    Patient Question:
-    {question}
-    Now answer using ONLY the structured data above. If you don't have the data regarding the query user have asked Politely explain that you only have access to the prescription shared by the user and do not have access to external personal or public medical records. dont give responses out of scope also give responses in a humanly way.
-    Provide a clear, professional, and reassuring answer.
-    """
 
-    return prompt
+def build_rag_prompt(question: str, retrieved_chunks: List[str], history: str) -> Prompt:
+
+    context_text = "\n".join(retrieved_chunks)
 
+    suffix = (
+        f"Verified Prescription Context:\n{context_text}\n\n"
+        f"Previous Conversation:\n{history.strip() or 'None'}\n\n"
+        f"Patient Question:\n{question}\n\n"
+        "Now answer using ONLY the context above. Provide a clear, professional, and reassuring answer."
+    )
+    return Prompt(prefix=f"{RAG_RULES}\n\n", suffix=suffix)
@@ -0,0 +1,165 @@
+import asyncio
+import hashlib
+import threading
+import time
+from app.core.config import settings
+from app.services.gemini_client import get_client, gemini_slot
+from app.services.prompt_builder import Prompt
+import logging
+
+logger = logging.getLogger(__name__)
+
+# After a failed cache creation (model without explicit caching, quota...), wait this long
+RETRY_AFTER = 300.0
+# Renew cached content this long before it expires
+EXPIRY_MARGIN = 60.0
+
+
+class ContextCache:
+    """
+    Gemini explicit context caches for stable prompt prefixes, keyed by
+    model + prefix digest. Prefixes below min_tokens are sent as-is
+    (Gemini 2.5 still applies implicit caching to repeated prefixes).
+    """
+
+    def __init__(
+        self,
+        enabled: bool = settings.PROMPT_CONTEXT_CACHE,
+        min_tokens: int = settings.PROMPT_CONTEXT_CACHE_MIN_TOKENS,
+        ttl: int = settings.PROMPT_CONTEXT_CACHE_TTL
+    ):
+        self.enabled = enabled
+        self.min_tokens = min_tokens
+        self.ttl = ttl
+        self._names = {}  # digest -> (cached content name, expires_at)
+        self._creating = {}  # digest -> task creating it, shared by concurrent turns
+        self._retry_at = 0.0
+        self.created = 0
+        self.failures = 0
+
+    async def name_for(self, model: str, prompt: Prompt):
+        """
+        Cached content name covering prompt.prefix, or None to send the
+        whole prompt. Turns needing the same prefix share one creation;
+        different prefixes are created concurrently.
+        """
+        if not self.enabled or prompt.prefix_tokens < self.min_tokens:
+            return None
+
+        now = time.monotonic()
+        if now < self._retry_at:
+            return None
+
+        digest = hashlib.sha256(f"{model}\x00{prompt.prefix}".encode("utf-8")).hexdigest()
+        entry = self._names.get(digest)
+        if entry and entry[1] - EXPIRY_MARGIN > now:
+            return entry[0]
+
+        task = self._creating.get(digest)
+        if task is None:
+            task = asyncio.ensure_future(self._create(model, prompt, digest))
+            self._creating[digest] = task
+            task.add_done_callback(lambda _: self._creating.pop(digest, None))
+        # A cancelled request must not cancel the creation other turns wait on
+        return await asyncio.shield(task)
+
+    async def _create(self, model: str, prompt: Prompt, digest: str):
+        try:
+            from google.genai import types
+            async with gemini_slot():
+                cached = await get_client().aio.caches.create(
+                    model=model,
+                    config=types.CreateCachedContentConfig(
+                        contents=[prompt.prefix],
+                        ttl=f"{self.ttl}s"
+                    )
+                )
+        except Exception as e:
+            self.failures += 1
+            self._retry_at = time.monotonic() + RETRY_AFTER
+            logger.warning(f"Context cache creation failed, sending full prompts: {str(e)}")
+            return None
+
+        now = time.monotonic()
+        self._names = {key: value for key, value in self._names.items() if value[1] > now}
+        self._names[digest] = (cached.name, now + self.ttl)
+        self.created += 1
+        logger.info(f"Created context cache {cached.name} ({prompt.prefix_tokens} tokens)")
+        return cached.name
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "live": len(self._names),
+            "created": self.created,
+            "failures": self.failures,
+        }
+
+
+context_cache = ContextCache()
+
+
+class PromptStats:
+    """
+    Prompt token counts per chat route: estimated tokens built, tokens
+    sent (prefix excluded when served from an explicit context cache) and,
+    from the response usage metadata, prompt tokens billed and how many of
+    them were served from a cache (explicit or implicit).
+    """
+
+    def __init__(self):
+        self._routes = {}
+        self._lock = threading.Lock()
+
+    def _route(self, route: str) -> dict:
+        return self._routes.setdefault(route, {
+            "prompts": 0,
+            "estimated_tokens": 0,
+            "estimated_tokens_sent": 0,
+            "prompt_tokens": 0,
+            "cached_tokens": 0,
+        })
+
+    def record_sent(self, route: str, prompt: Prompt, cached: bool):
+        tokens = prompt.tokens
+        with self._lock:
+            stats = self._route(route)
+            stats["prompts"] += 1
+            stats["estimated_tokens"] += tokens
+            stats["estimated_tokens_sent"] += tokens - prompt.prefix_tokens if cached else tokens
+
+    def record_usage(self, route: str, usage):
+        if usage is None:
+            return
+        with self._lock:
+            stats = self._route(route)
+            stats["prompt_tokens"] += usage.prompt_token_count or 0
+            stats["cached_tokens"] += usage.cached_content_token_count or 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            report = {}
+            for route, stats in self._routes.items():
+                report[route] = dict(stats)
+                # Prefix tokens not re-uploaded, and tokens billed at the cached rate
+                report[route]["tokens_not_sent"] = stats["estimated_tokens"] - stats["estimated_tokens_sent"]
+                report[route]["tokens_saved"] = stats["cached_tokens"]
+                report[route]["avg_prompt_tokens"] = stats["estimated_tokens"] / stats["prompts"] if stats["prompts"] else 0
+            return report
+
+
+prompt_stats = PromptStats()
+
+
+async def prompt_request(model: str, route: str, prompt: Prompt):
+    """
+    (contents, config) for generate_content: only the suffix when the
+    prefix is in a context cache, otherwise the whole prompt.
+    """
+    name = await context_cache.name_for(model, prompt)
+    prompt_stats.record_sent(route, prompt, cached=name is not None)
+    if name is None:
+        return prompt.text, None
+
+    from google.genai import types
+    return prompt.suffix, types.GenerateContentConfig(cached_content=name)
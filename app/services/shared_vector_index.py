@@ -0,0 +1,364 @@
+import os
+import json
+import time
+import shutil
+import threading
+import numpy as np
+from app.services.vector_store_service import write_chunks, read_chunks
+from app.utils.lazy_import import LazyModule
+from app.utils.lexical_search import BM25Index
+import logging
+logger = logging.getLogger(__name__)
+
+faiss = LazyModule("faiss")
+
+# Vector ids are (prescription_id << CHUNK_ID_BITS) | chunk_no, so every
+# prescription owns one contiguous id range and a search can be restricted
+# to it with an IDSelectorRange.
+CHUNK_ID_BITS = 20
+MAX_CHUNK_NO = 1 << CHUNK_ID_BITS
+
+# Largest prescription whose vectors search() rescores exactly (under the
+# shard lock) when the filtered ANN search returns too few of them
+MAX_EXACT_RESCORE = 512
+
+# Shards with fewer unsaved changes than this wait for the save interval
+MIN_SAVE_CHANGES = 256
+
+INDEX_FILENAME = "index.faiss"
+META_FILENAME = "meta.json"
+PENDING_FILENAME = "pending.npz"
+
+
+def encode_id(prescription_id: int, chunk_no: int) -> int:
+    return (prescription_id << CHUNK_ID_BITS) | chunk_no
+
+
+class _Shard:
+    """
+    One FAISS ID-mapped index plus the chunk ranges of the prescriptions in it.
+
+    Index types that need training (IVF, PQ) buffer vectors until
+    train_size of them are available; buffered vectors are searched exactly.
+    """
+
+    def __init__(self, path_prefix: str, dimension: int, factory: str, train_size: int, ef_search: int, nprobe: int):
+        self.lock = threading.Lock()
+        # One writer at a time; held while writing files, never by searches
+        self.save_lock = threading.Lock()
+        self.path_prefix = path_prefix
+        # Names the complete version directory; replacing it switches all files at once
+        self.manifest_path = path_prefix + ".current"
+        self.dimension = dimension
+        self.train_size = train_size
+        self.ef_search = ef_search
+        self.nprobe = nprobe
+
+        # prescription_id -> [base_chunk_no, next_chunk_no]
+        self.tenants = {}
+        self.pending_ids = np.empty((0,), dtype="int64")
+        self.pending_vectors = np.empty((0, dimension), dtype="float32")
+        self.dirty = 0
+        self.version = 0
+        self.saved_at = time.monotonic()
+
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                self.version = json.load(f)["version"]
+            directory = self._version_dir(self.version)
+            self.index = faiss.read_index(os.path.join(directory, INDEX_FILENAME))
+            with open(os.path.join(directory, META_FILENAME), "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            self.tenants = {int(k): v for k, v in meta["tenants"].items()}
+            pending_path = os.path.join(directory, PENDING_FILENAME)
+            if os.path.exists(pending_path):
+                pending = np.load(pending_path)
+                self.pending_ids = pending["ids"]
+                self.pending_vectors = pending["vectors"]
+            logger.info(f"Loaded shared shard {directory} ({self.index.ntotal} vectors)")
+        else:
+            inner = faiss.index_factory(dimension, factory, faiss.METRIC_INNER_PRODUCT)
+            self.index = faiss.IndexIDMap2(inner)
+
+    def _version_dir(self, version: int) -> str:
+        return f"{self.path_prefix}.v{version}"
+
+    def _train_and_flush_pending(self):
+        logger.info(f"Training shared shard on {len(self.pending_ids)} vectors")
+        self.index.train(self.pending_vectors)
+        self.index.add_with_ids(self.pending_vectors, self.pending_ids)
+        self.pending_ids = np.empty((0,), dtype="int64")
+        self.pending_vectors = np.empty((0, self.dimension), dtype="float32")
+
+    def add(self, prescription_id: int, vectors: np.ndarray):
+        with self.lock:
+            tenant = self.tenants.setdefault(prescription_id, [0, 0])
+            start = tenant[1]
+            if start + len(vectors) > MAX_CHUNK_NO:
+                raise ValueError(f"Too many chunks for prescription_id={prescription_id}")
+
+            ids = np.arange(start, start + len(vectors), dtype="int64") + encode_id(prescription_id, 0)
+
+            if self.index.is_trained:
+                self.index.add_with_ids(vectors, ids)
+            else:
+                self.pending_ids = np.concatenate([self.pending_ids, ids])
+                self.pending_vectors = np.vstack([self.pending_vectors, vectors])
+                if len(self.pending_ids) >= self.train_size:
+                    self._train_and_flush_pending()
+
+            tenant[1] += len(vectors)
+            self.dirty += len(vectors)
+
+    def reset(self, prescription_id: int):
+        """
+        Drop a prescription's vectors before it is re-indexed.
+        """
+        with self.lock:
+            tenant = self.tenants.get(prescription_id)
+            if tenant is None:
+                self.tenants[prescription_id] = [0, 0]
+                return
+
+            lo, hi = encode_id(prescription_id, 0), encode_id(prescription_id + 1, 0)
+            keep = (self.pending_ids < lo) | (self.pending_ids >= hi)
+            self.pending_ids = self.pending_ids[keep]
+            self.pending_vectors = self.pending_vectors[keep]
+
+            try:
+                self.index.remove_ids(faiss.IDSelectorRange(lo, hi))
+                tenant[0] = tenant[1] = 0
+            except RuntimeError:
+                # Graph indexes (HNSW) cannot delete; orphan the old ids instead.
+                tenant[0] = tenant[1]
+            self.dirty += 1
+
+    def _search_params(self, selector):
+        inner = faiss.downcast_index(self.index.index)
+        if isinstance(inner, faiss.IndexHNSW):
+            return faiss.SearchParametersHNSW(sel=selector, efSearch=self.ef_search)
+        if faiss.try_extract_index_ivf(inner) is not None:
+            return faiss.SearchParametersIVF(sel=selector, nprobe=self.nprobe)
+        return faiss.SearchParameters(sel=selector)
+
+    def search(self, prescription_id: int, query: np.ndarray, top_k: int):
+        """
+        Return [(chunk_no, score)] for the prescription, best first.
+        """
+        with self.lock:
+            tenant = self.tenants.get(prescription_id)
+            if not tenant or tenant[1] == tenant[0]:
+                return []
+
+            lo = encode_id(prescription_id, tenant[0])
+            hi = encode_id(prescription_id, tenant[1])
+            wanted = min(top_k, tenant[1] - tenant[0])
+            scores = {}
+
+            if self.index.ntotal:
+                selector = faiss.IDSelectorRange(lo, hi)
+                params = self._search_params(selector)
+                distances, ids = self.index.search(query[None, :], top_k, params=params)
+                for score, vid in zip(distances[0], ids[0]):
+                    if vid >= 0:
+                        scores[int(vid)] = float(score)
+
+                if len(scores) < wanted and hi - lo <= MAX_EXACT_RESCORE:
+                    # Very selective filters can starve ANN traversal; score the
+                    # prescription's few vectors exactly when they can be reconstructed.
+                    try:
+                        for vid in range(lo, hi):
+                            if vid not in scores:
+                                vector = self.index.reconstruct(vid)
+                                scores[vid] = float(np.dot(vector, query))
+                    except RuntimeError:
+                        pass
+
+            mask = (self.pending_ids >= lo) & (self.pending_ids < hi)
+            if mask.any():
+                for vid, score in zip(self.pending_ids[mask], self.pending_vectors[mask] @ query):
+                    scores[int(vid)] = float(score)
+
+            base = tenant[0]
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top_k]
+        return [(vid - encode_id(prescription_id, base), score) for vid, score in ranked]
+
+    def chunk_count(self, prescription_id: int) -> int:
+        tenant = self.tenants.get(prescription_id)
+        return tenant[1] - tenant[0] if tenant else 0
+
+    def size(self) -> int:
+        return self.index.ntotal + len(self.pending_ids)
+
+    def _snapshot(self):
+        # In-memory copy of the whole shard: the shard lock is not held during
+        # disk I/O, but searches and adds wait for the copy (see should_save)
+        with self.lock:
+            data = faiss.serialize_index(self.index)
+            meta = {"tenants": {k: list(v) for k, v in self.tenants.items()}}
+            pending = (self.pending_ids.copy(), self.pending_vectors.copy()) if len(self.pending_ids) else None
+            return data, meta, pending, self.dirty
+
+    def should_save(self, interval: float, fraction: float) -> bool:
+        """
+        True once the shard has changes and either interval seconds passed
+        since its last save or the changes reach fraction of its size:
+        each save copies the whole shard, so saves grow rarer as it grows.
+        """
+        if not self.dirty:
+            return False
+        if time.monotonic() - self.saved_at >= interval:
+            return True
+        return self.dirty >= max(MIN_SAVE_CHANGES, fraction * self.size())
+
+    def save(self):
+        """
+        Write the shard into a new version directory, then point the manifest
+        at it: a crash leaves either the old or the new files, never a mix.
+        """
+        with self.save_lock:
+            data, meta, pending, saved = self._snapshot()
+
+            version = self.version + 1
+            directory = self._version_dir(version)
+            staging = directory + ".tmp"
+            shutil.rmtree(staging, ignore_errors=True)
+            os.makedirs(staging)
+
+            data.tofile(os.path.join(staging, INDEX_FILENAME))
+            with open(os.path.join(staging, META_FILENAME), "w", encoding="utf-8") as f:
+                json.dump(meta, f)
+            if pending is not None:
+                np.savez(os.path.join(staging, PENDING_FILENAME), ids=pending[0], vectors=pending[1])
+
+            shutil.rmtree(directory, ignore_errors=True)
+            os.replace(staging, directory)
+            with open(self.manifest_path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump({"version": version}, f)
+            os.replace(self.manifest_path + ".tmp", self.manifest_path)
+
+            shutil.rmtree(self._version_dir(self.version), ignore_errors=True)
+            self.version = version
+
+            # Vectors added since the snapshot stay dirty
+            with self.lock:
+                self.dirty = max(0, self.dirty - saved)
+                self.saved_at = time.monotonic()
+        logger.info(f"Shared shard saved to {directory}")
+
+
+class SharedVectorIndex:
+    """
+    All prescriptions' chunks in a few sharded FAISS ANN indexes
+    (HNSW by default; any index_factory string such as "IVF1024,Flat" works).
+    Prescriptions are assigned to shards by id.
+    """
+
+    def __init__(
+        self,
+        index_dir: str,
+        dimension: int = 3072,
+        num_shards: int = 4,
+        factory: str = "HNSW32,Flat",
+        train_size: int = 20000,
+        save_interval: float = 300,
+        save_fraction: float = 0.1,
+        ef_search: int = 128,
+        nprobe: int = 16
+    ):
+        os.makedirs(index_dir, exist_ok=True)
+        self.save_interval = save_interval
+        self.save_fraction = save_fraction
+        self._saving = set()
+        self._saving_lock = threading.Lock()
+        self.shards = [
+            _Shard(os.path.join(index_dir, f"shard_{i}"), dimension, factory, train_size, ef_search, nprobe)
+            for i in range(num_shards)
+        ]
+
+    def _shard(self, prescription_id: int) -> _Shard:
+        return self.shards[prescription_id % len(self.shards)]
+
+    def add(self, prescription_id: int, vectors: np.ndarray):
+        shard = self._shard(prescription_id)
+        shard.add(prescription_id, np.ascontiguousarray(vectors, dtype="float32"))
+        if shard.should_save(self.save_interval, self.save_fraction):
+            self._save_in_background(shard)
+
+    def _save_in_background(self, shard: _Shard):
+        """
+        Periodic persistence off the request path, at most one save per
+        shard in flight; flush() persists the rest at shutdown.
+        """
+        with self._saving_lock:
+            if shard in self._saving:
+                return
+            self._saving.add(shard)
+
+        def run():
+            try:
+                shard.save()
+            except Exception as e:
+                logger.error(f"Saving shared shard {shard.index_path} failed: {e}", exc_info=e)
+            finally:
+                with self._saving_lock:
+                    self._saving.discard(shard)
+
+        threading.Thread(target=run, name="shard-save", daemon=True).start()
+
+    def reset(self, prescription_id: int):
+        self._shard(prescription_id).reset(prescription_id)
+
+    def search(self, prescription_id: int, query: np.ndarray, top_k: int):
+        query = np.ascontiguousarray(query, dtype="float32")
+        return self._shard(prescription_id).search(prescription_id, query, top_k)
+
+    def chunk_count(self, prescription_id: int) -> int:
+        return self._shard(prescription_id).chunk_count(prescription_id)
+
+    def flush(self):
+        for shard in self.shards:
+            if shard.dirty:
+                shard.save()
+
+
+class SharedStoreView:
+    """
+    Per-prescription facade over SharedVectorIndex with the same interface
+    as VectorStoreService. Chunk texts are kept per prescription on disk.
+    """
+
+    def __init__(self, shared: SharedVectorIndex, prescription_id: int, chunks=None):
+        self.shared = shared
+        self.prescription_id = prescription_id
+        self.chunks = chunks if chunks is not None else []
+        self.lexical = BM25Index(self.chunks)
+
+    def memory_usage(self) -> int:
+        return sum(len(chunk) + 49 for chunk in self.chunks) + self.lexical.memory_usage()
+
+    def add_chunks(self, embeddings: np.ndarray, text_chunks: list):
+        self.shared.add(self.prescription_id, embeddings)
+        self.chunks.extend(text_chunks)
+        self.lexical.add(text_chunks)
+
+    def add_chunk(self, embedding: np.ndarray, text_chunk: str):
+        self.add_chunks(np.expand_dims(embedding, axis=0), [text_chunk])
+
+    def search(self, query_embedding: np.ndarray, top_k: int = 3):
+        hits = self.shared.search(self.prescription_id, query_embedding, top_k)
+        results = [self.chunks[chunk_no] for chunk_no, _ in hits if chunk_no < len(self.chunks)]
+        logger.info(f"Shared index search for prescription_id={self.prescription_id}: {len(results)} chunks")
+        return results
+
+    def save(self, directory: str):
+        write_chunks(directory, self.chunks)
+
+    @classmethod
+    def load(cls, directory: str, shared: SharedVectorIndex, prescription_id: int):
+        chunks = read_chunks(directory)
+        if chunks is None or shared.chunk_count(prescription_id) != len(chunks):
+            # Vectors not flushed yet (or stale); caller rebuilds from the DB.
+            return None
+        return cls(shared, prescription_id, chunks)
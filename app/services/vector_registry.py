@@ -1,24 +1,210 @@
-from app.services.vector_store_service import VectorStoreService
+import os
+import shutil
+import threading
+from collections import OrderedDict
+from app.core.config import settings
+from app.services.vector_store_service import VectorStoreService, INDEX_FILENAME, CHUNKS_FILENAME
+from app.services.shared_vector_index import SharedVectorIndex, SharedStoreView
+from app.services.embedding_backends import embedding_dimension
 import logging
 logger = logging.getLogger(__name__)
 
 class VectorRegistry:
     """
-    Holds vector stores per prescription in memory.
+    Holds vector stores per prescription in memory, backed by an on-disk
+    copy so stores survive restarts and are rehydrated lazily.
+
+    The in-memory part is an LRU bounded by a byte budget and/or an entry
+    cap (0 disables either limit). Evicted stores are reloaded from disk on
+    their next access.
+
+    In "shared" mode the vectors of all prescriptions live in one
+    SharedVectorIndex and the registry hands out per-prescription views
+    with the same interface, so callers do not change.
     """
 
-    def __init__(self):
-        self.registry = {}
+    def __init__(
+        self,
+        index_dir: str = settings.VECTOR_INDEX_DIR,
+        mmap: bool = settings.VECTOR_INDEX_MMAP,
+        max_bytes: int = settings.VECTOR_REGISTRY_MAX_BYTES,
+        max_entries: int = settings.VECTOR_REGISTRY_MAX_ENTRIES,
+        mode: str = settings.VECTOR_STORE_MODE
+    ):
+        self.registry = OrderedDict()
+        self.index_dir = index_dir
+        self.mmap = mmap
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.mode = mode
+        self._shared = None
+
+        self._sizes = {}
+        self._resident_bytes = 0
+        self._lock = threading.RLock()
+
+        self.hits = 0
+        self.misses = 0
+        self.disk_loads = 0
+        self.evictions = 0
+
+    def _store_dir(self, prescription_id: int) -> str:
+        return os.path.join(self.index_dir, str(prescription_id))
+
+    @property
+    def shared(self) -> SharedVectorIndex:
+        # Created on first use: loading the shards can be expensive.
+        with self._lock:
+            if self._shared is None:
+                self._shared = SharedVectorIndex(
+                    os.path.join(self.index_dir, "shared"),
+                    dimension=embedding_dimension(),
+                    num_shards=settings.SHARED_INDEX_SHARDS,
+                    factory=settings.SHARED_INDEX_FACTORY,
+                    train_size=settings.SHARED_INDEX_TRAIN_SIZE,
+                    save_interval=settings.SHARED_INDEX_SAVE_INTERVAL,
+                    save_fraction=settings.SHARED_INDEX_SAVE_FRACTION,
+                    ef_search=settings.SHARED_INDEX_EF_SEARCH,
+                    nprobe=settings.SHARED_INDEX_NPROBE
+                )
+            return self._shared
+
+    def _new_store(self, prescription_id: int):
+        if self.mode == "shared":
+            self.shared.reset(prescription_id)
+            return SharedStoreView(self.shared, prescription_id)
+        return VectorStoreService()
+
+    def _load_store(self, prescription_id: int):
+        directory = self._store_dir(prescription_id)
+        if self.mode == "shared":
+            return SharedStoreView.load(directory, self.shared, prescription_id)
+
+        store = VectorStoreService.load(directory, mmap=self.mmap)
+        if store is not None and store.dimension != embedding_dimension():
+            # Built with another embedding backend/size; caller rebuilds it
+            logger.info(f"Ignoring {store.dimension}-dim FAISS store for prescription_id={prescription_id}")
+            return None
+        return store
+
+    def _put(self, prescription_id: int, store: VectorStoreService):
+        with self._lock:
+            self._remove(prescription_id)
+            size = store.memory_usage()
+            self.registry[prescription_id] = store
+            self._sizes[prescription_id] = size
+            self._resident_bytes += size
+            self._evict(keep=prescription_id)
+
+    def _remove(self, prescription_id: int):
+        if prescription_id in self.registry:
+            del self.registry[prescription_id]
+            self._resident_bytes -= self._sizes.pop(prescription_id, 0)
+
+    def _over_budget(self) -> bool:
+        if self.max_entries and len(self.registry) > self.max_entries:
+            return True
+        if self.max_bytes and self._resident_bytes > self.max_bytes:
+            return True
+        return False
+
+    def _evict(self, keep: int):
+        while self._over_budget():
+            lru_id = next(iter(self.registry))
+            if lru_id == keep:
+                # Only the newest store is left; a single oversized store stays resident.
+                break
+            self._remove(lru_id)
+            self.evictions += 1
+            logger.info(f"Evicted FAISS store for prescription_id={lru_id}")
 
     def create_store(self, prescription_id: int):
         logger.info(f"Creating FAISS store for prescription_id={prescription_id}")
-        store = VectorStoreService()
-        self.registry[prescription_id] = store
+        store = self._new_store(prescription_id)
+        self._put(prescription_id, store)
         return store
 
     def get_store(self, prescription_id: int):
         logger.info(f"Fetching FAISS store for prescription_id={prescription_id}")
-        return self.registry.get(prescription_id)
+        with self._lock:
+            store = self.registry.get(prescription_id)
+            if store is not None:
+                self.registry.move_to_end(prescription_id)
+                self.hits += 1
+                return store
+            self.misses += 1
+
+        store = self._load_store(prescription_id)
+        if store is not None:
+            logger.info(f"Rehydrated FAISS store from disk for prescription_id={prescription_id}")
+            self.disk_loads += 1
+            self._put(prescription_id, store)
+        return store
+
+    def save_store(self, prescription_id: int, store: VectorStoreService = None):
+        """
+        Persist a store. Passing the store explicitly keeps this safe when it
+        was evicted while still being built.
+        """
+        with self._lock:
+            registered = self.registry.get(prescription_id)
+        store = store or registered
+        if store is None:
+            logger.warning(f"No FAISS store to save for prescription_id={prescription_id}")
+            return
+
+        store.save(self._store_dir(prescription_id))
+
+        # Re-account the now fully built store against the budget
+        if registered is store:
+            self._put(prescription_id, store)
+
+    def clone_store(self, source_id: int, prescription_id: int) -> bool:
+        """
+        Give prescription_id a copy of source_id's saved index by copying its
+        files. Returns False when there is nothing to copy (or in shared mode,
+        where vectors live in the shards); callers then rebuild.
+        """
+        if self.mode == "shared" or not self.has_persisted_store(source_id):
+            return False
+
+        target_dir = self._store_dir(prescription_id)
+        shutil.copytree(self._store_dir(source_id), target_dir, dirs_exist_ok=True)
+        logger.info(f"Copied FAISS store from prescription_id={source_id} to prescription_id={prescription_id}")
+        return True
+
+    def has_persisted_store(self, prescription_id: int) -> bool:
+        directory = self._store_dir(prescription_id)
+        if self.mode == "shared":
+            return (
+                os.path.exists(os.path.join(directory, CHUNKS_FILENAME))
+                and self.shared.chunk_count(prescription_id) > 0
+            )
+        return os.path.exists(os.path.join(directory, INDEX_FILENAME))
+
+    def flush(self):
+        """
+        Write out shared shards with unsaved vectors (no-op per prescription).
+        """
+        if self._shared is not None:
+            self._shared.flush()
+
+    @property
+    def resident_bytes(self) -> int:
+        return self._resident_bytes
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self.registry),
+                "resident_bytes": self._resident_bytes,
+                "max_bytes": self.max_bytes,
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "disk_loads": self.disk_loads,
+                "evictions": self.evictions,
+            }
 
 
 vector_registry = VectorRegistry()
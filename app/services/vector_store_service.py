@@ -1,32 +1,190 @@
-import faiss
+import os
+import json
+import threading
 import numpy as np
+from app.core.config import settings
+from app.utils.lazy_import import LazyModule
+from app.utils.lexical_search import BM25Index
+from app.services.embedding_backends import embedding_dimension
 import logging
 logger = logging.getLogger(__name__)
 
+faiss = LazyModule("faiss")
+
+INDEX_FILENAME = "index.faiss"
+CHUNKS_FILENAME = "chunks.json"
+
+_codebook = None
+_codebook_lock = threading.Lock()
+_missing_codebook_warned = False
+
+
+def build_index(dimension: int, index_type: str = "flat", pq_m: int = 0):
+    """
+    Create an empty inner-product index for the given encoding.
+
+    flat: 4 bytes/dim, fp16: 2 bytes/dim, sq8: 1 byte/dim (needs training),
+    pq: pq_m bytes/vector (needs training on a large sample).
+    """
+    if index_type == "flat":
+        return faiss.IndexFlatIP(dimension)
+    if index_type == "fp16":
+        return faiss.IndexScalarQuantizer(dimension, faiss.ScalarQuantizer.QT_fp16, faiss.METRIC_INNER_PRODUCT)
+    if index_type == "sq8":
+        return faiss.IndexScalarQuantizer(dimension, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_INNER_PRODUCT)
+    if index_type == "pq":
+        return faiss.IndexPQ(dimension, pq_m or dimension // 16, 8, faiss.METRIC_INNER_PRODUCT)
+    raise ValueError(f"Unknown vector index type: {index_type}")
+
+
+def _load_codebook(dimension: int):
+    """
+    Trained empty index shared by all stores, written by the compression report.
+    """
+    global _codebook
+    with _codebook_lock:
+        if _codebook is None and os.path.exists(settings.VECTOR_CODEBOOK_PATH):
+            _codebook = faiss.read_index(settings.VECTOR_CODEBOOK_PATH)
+            logger.info(f"Loaded vector codebook from {settings.VECTOR_CODEBOOK_PATH}")
+    if _codebook is not None and _codebook.d == dimension:
+        return _codebook
+    return None
+
+
+def new_store_index(dimension: int, index_type: str = settings.VECTOR_INDEX_TYPE):
+    """
+    Empty index for a new store. sq8/pq are cloned from the shared codebook;
+    without one they fall back to fp16, since a document's few chunks are
+    far too small a sample to train a quantizer on.
+    """
+    global _missing_codebook_warned
+    if index_type in ("sq8", "pq"):
+        codebook = _load_codebook(dimension)
+        if codebook is not None:
+            return faiss.clone_index(codebook)
+        if not _missing_codebook_warned:
+            _missing_codebook_warned = True
+            logger.warning(
+                f"VECTOR_INDEX_TYPE={index_type} but no {dimension}-d codebook at "
+                f"{settings.VECTOR_CODEBOOK_PATH}; using fp16. "
+                "Write one with the embedding compression report."
+            )
+        index_type = "fp16"
+    return build_index(dimension, index_type, settings.VECTOR_PQ_M)
+
+
+def write_chunks(directory: str, chunks: list):
+    """
+    Atomically write a store's chunk list.
+    """
+    os.makedirs(directory, exist_ok=True)
+    chunks_path = os.path.join(directory, CHUNKS_FILENAME)
+    with open(chunks_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(chunks, f)
+    os.replace(chunks_path + ".tmp", chunks_path)
+
+
+def read_chunks(directory: str):
+    chunks_path = os.path.join(directory, CHUNKS_FILENAME)
+    if not os.path.exists(chunks_path):
+        return None
+    with open(chunks_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _read_index(index_path: str, mmap: bool):
+    """
+    Read a FAISS index, memory-mapping it when the installed FAISS supports it.
+    """
+    if mmap:
+        flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+        # FAISS >= 1.8 can also mmap flat code arrays (IndexFlat*)
+        flags |= getattr(faiss, "IO_FLAG_MMAP_IFC", 0)
+        try:
+            return faiss.read_index(index_path, flags)
+        except RuntimeError as e:
+            logger.warning(f"mmap load failed for {index_path}, reading into memory: {e}")
+
+    return faiss.read_index(index_path)
+
 
 class VectorStoreService:
     """
-    In-memory FAISS store per prescription.
+    In-memory FAISS store per prescription, with a BM25 index over the same
+    chunks for lexical retrieval.
     """
 
-    def __init__(self, dimension: int = 3072):
-        self.dimension = dimension
-        self.index = faiss.IndexFlatIP(dimension)
-        self.chunks = []
+    def __init__(self, dimension: int = None, index=None, chunks=None):
+        self.dimension = dimension or embedding_dimension()
+        self.index = index if index is not None else new_store_index(self.dimension)
+        self.chunks = chunks if chunks is not None else []
+        self.lexical = BM25Index(self.chunks)
+
+    def memory_usage(self) -> int:
+        """
+        Approximate resident bytes: encoded vectors, chunk strings and the
+        lexical index.
+        """
+        code_size = getattr(self.index, "code_size", self.dimension * 4)
+        vector_bytes = self.index.ntotal * code_size
+        chunk_bytes = sum(len(chunk) + 49 for chunk in self.chunks)  # str object overhead
+        return vector_bytes + chunk_bytes + self.lexical.memory_usage()
+
+    def add_chunks(self, embeddings: np.ndarray, text_chunks: list):
+        """
+        Add a (n, dimension) embedding matrix and its n chunks in one call.
+        """
+        embeddings = np.ascontiguousarray(embeddings, dtype="float32")
+        if not self.index.is_trained:
+            raise ValueError("Vector index is untrained; sq8/pq stores need the shared codebook.")
+        self.index.add(embeddings)
+        self.chunks.extend(text_chunks)
+        self.lexical.add(text_chunks)
+        logger.info(f"{len(text_chunks)} chunks added to FAISS. Total chunks: {len(self.chunks)}")
 
     def add_chunk(self, embedding: np.ndarray, text_chunk: str):
-        embedding = np.expand_dims(embedding, axis=0)
-        self.index.add(embedding)
-        self.chunks.append(text_chunk)
-        logger.info(f"Chunk added to FAISS. Total chunks: {len(self.chunks)}")
+        self.add_chunks(np.expand_dims(embedding, axis=0), [text_chunk])
 
     def search(self, query_embedding: np.ndarray, top_k: int = 3):
-        query_embedding = np.expand_dims(query_embedding, axis=0)
+        query_embedding = np.ascontiguousarray(np.expand_dims(query_embedding, axis=0), dtype="float32")
         distances, indices = self.index.search(query_embedding, top_k)
         logger.info(f"FAISS search performed. Top K: {top_k}")
         results = []
         for idx in indices[0]:
-            if idx < len(self.chunks):
+            if 0 <= idx < len(self.chunks):
                 results.append(self.chunks[idx])
         logger.info(f"Retrieved {len(results)} relevant chunks")
         return results
+
+    def save(self, directory: str):
+        """
+        Persist the index and its chunk list. Files are written to temporary
+        names first so a crash never leaves a half-written store behind.
+        """
+        os.makedirs(directory, exist_ok=True)
+
+        index_path = os.path.join(directory, INDEX_FILENAME)
+        faiss.write_index(self.index, index_path + ".tmp")
+        os.replace(index_path + ".tmp", index_path)
+
+        write_chunks(directory, self.chunks)
+
+        logger.info(f"FAISS store saved to {directory} ({len(self.chunks)} chunks)")
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True):
+        """
+        Load a store written by save(). Returns None if nothing was saved.
+        """
+        index_path = os.path.join(directory, INDEX_FILENAME)
+        if not os.path.exists(index_path):
+            return None
+
+        chunks = read_chunks(directory)
+        if chunks is None:
+            return None
+
+        index = _read_index(index_path, mmap)
+
+        logger.info(f"FAISS store loaded from {directory} ({len(chunks)} chunks)")
+        return cls(dimension=index.d, index=index, chunks=chunks)
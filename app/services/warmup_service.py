@@ -0,0 +1,36 @@
+from app.core.startup_timing import startup_timings
+from app.services.gemini_client import get_client
+from app.services.embedding_backends import get_embedding_backend
+from app.services import vector_store_service, file_ingestion_service, ocr_service
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def _step(name: str, fn):
+    try:
+        with startup_timings.measure(name):
+            fn()
+    except Exception as e:
+        logger.error(f"Warmup step '{name}' failed: {e}")
+
+
+def _warm_ocr():
+    pool = ocr_service.get_ocr_pool()
+    if pool is not None:
+        pool.warmup()
+    else:
+        ocr_service._load_reader()
+
+
+def warm_up():
+    """
+    Load heavy subsystems ahead of the first request. Every step is
+    optional: anything not warmed here is still loaded on first use.
+    """
+    _step("warmup faiss", vector_store_service.faiss.load)
+    _step("warmup pymupdf", file_ingestion_service.fitz.load)
+    _step("warmup gemini client", get_client)
+    _step("warmup embedding backend", lambda: get_embedding_backend().load())
+    _step("warmup ocr", _warm_ocr)
+    logger.info(f"Warmup finished: {startup_timings.report()}")
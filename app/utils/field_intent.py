@@ -0,0 +1,89 @@
+import re
+from typing import List, Dict, Any, Optional
+
+# field -> phrasings that ask for it directly ("what is the dosage", "how
+# often do I take", "for how many days"); anything looser goes to the LLM
+FIELD_PATTERNS = {
+    "dosage": re.compile(
+        r"\b(dose|dosage|strength)\b"
+        r"|\bhow (much|many (tablets?|tabs?|capsules?|pills?|ml|drops|puffs))\b.*\b(take|give|use)\b"
+    ),
+    "frequency": re.compile(r"\b(how often|how many times|frequency|times (a|per) day|times daily)\b"),
+    "duration": re.compile(
+        r"\bhow long (do|should|must|will|to) (i |we )?(take|continue|use|keep taking|be on)\b"
+        r"|\bfor how (long|many days|many weeks)\b|\bhow many (days|weeks)\b|\bduration\b|\b(until|till) when\b"
+    ),
+    "timing": re.compile(
+        r"\b(what|which) time\b|\bwhen (do|should|to|must) i take\b|\bmorning or (night|evening)\b|\btiming\b"
+    ),
+    "food_relation": re.compile(
+        r"\b(before|after|with|without) (food|meals?|eating|breakfast|lunch|dinner)\b|\bempty stomach\b"
+    ),
+}
+
+# Questions that need explanation or judgement, even when they mention a field
+OPEN_ENDED = re.compile(
+    r"\b(why|side effects?|safe|alcohol|pregnan\w*|breastfeed\w*|miss(ed)?|skip|overdose|instead|"
+    r"stop|interact\w*|allerg\w*|explain|purpose|what is it for|together with|with other|"
+    r"increase|decrease|double|avoid|works?|working|what if|happens?|more|less|too|water|"
+    r"eat|drink|feel|effects?|help|better|worse|wrong|forg[eo]t|can i|could i|okay|ok)\b"
+)
+
+# "these", "them", "all"...: the question is about more than the medicine a name matched
+SEVERAL_MEDICINES = re.compile(r"\b(these|those|them|they|all|both|each|every|everything)\b")
+
+FIELD_LABELS = {
+    "dosage": "Dosage",
+    "frequency": "Frequency",
+    "duration": "Duration",
+    "timing": "Timing",
+    "food_relation": "Food instructions",
+}
+
+
+def detect_field_intent(question: str) -> Optional[str]:
+    """
+    The single structured field a question asks for, or None when it asks
+    for several, none, or something open-ended.
+    """
+    normalized = re.sub(r"[^a-z0-9\s]", " ", question.lower())
+    if OPEN_ENDED.search(normalized):
+        return None
+
+    fields = [field for field, pattern in FIELD_PATTERNS.items() if pattern.search(normalized)]
+    return fields[0] if len(fields) == 1 else None
+
+
+def refers_to_several(question: str) -> bool:
+    return bool(SEVERAL_MEDICINES.search(question.lower()))
+
+
+def field_value(medicine: Dict[str, Any], field: str) -> str:
+    if field in ("timing", "food_relation"):
+        instructions = medicine.get("administration_instructions") or {}
+        value = instructions.get(field, "") if isinstance(instructions, dict) else ""
+    else:
+        value = medicine.get(field, "")
+    return str(value or "").strip()
+
+
+def render_field_answer(field: str, medicines: List[Dict[str, Any]]) -> Optional[str]:
+    """
+    Template answer for a field lookup, or None when any medicine lacks the
+    field (the LLM can then still look in the raw prescription text).
+    """
+    if not medicines:
+        return None
+
+    values = [(medicine.get("medicine_name") or "This medicine", field_value(medicine, field)) for medicine in medicines]
+    if any(not value for _, value in values):
+        return None
+
+    label = FIELD_LABELS[field]
+    if len(values) == 1:
+        name, value = values[0]
+        return f"{label} for {name} as per your prescription: {value}."
+
+    lines = [f"{label} as per your prescription:"]
+    lines += [f"- {name}: {value}" for name, value in values]
+    return "\n".join(lines)
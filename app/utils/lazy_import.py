@@ -0,0 +1,26 @@
+import importlib
+import threading
+from app.core.startup_timing import startup_timings
+
+
+class LazyModule:
+    """
+    Module proxy that imports the real module on first attribute access,
+    so heavy libraries stay off the import path of app.main.
+    """
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        with self._lock:
+            if self._module is None:
+                with startup_timings.measure(f"import {self._name}"):
+                    self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr):
+        module = self._module or self.load()
+        return getattr(module, attr)
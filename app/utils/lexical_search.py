@@ -0,0 +1,96 @@
+import math
+import re
+from collections import Counter
+
+# Question filler words; they carry no signal about which chunk answers
+STOPWORDS = {
+    "a", "an", "the", "and", "or", "of", "to", "in", "on", "for", "with", "at", "by",
+    "is", "are", "was", "be", "do", "does", "did", "can", "could", "should", "would",
+    "i", "me", "my", "we", "you", "your", "it", "this", "that", "these", "those",
+    "what", "when", "how", "which", "who", "why", "where", "please", "tell", "about",
+}
+
+
+def tokenize(text: str) -> list:
+    return [t for t in re.findall(r"[a-z0-9]+", text.lower()) if t not in STOPWORDS]
+
+
+class BM25Index:
+    """
+    Small in-memory inverted index with Okapi BM25 scoring over a store's
+    chunks. Document ids are chunk positions.
+    """
+
+    def __init__(self, documents: list = None, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings = {}   # term -> {doc_id: term frequency}
+        self.doc_lengths = []
+        self.total_length = 0
+        if documents:
+            self.add(documents)
+
+    def add(self, documents: list):
+        for text in documents:
+            doc_id = len(self.doc_lengths)
+            terms = tokenize(text)
+            for term, tf in Counter(terms).items():
+                self.postings.setdefault(term, {})[doc_id] = tf
+            self.doc_lengths.append(len(terms))
+            self.total_length += len(terms)
+
+    def __len__(self) -> int:
+        return len(self.doc_lengths)
+
+    def memory_usage(self) -> int:
+        # Rough: ~100 bytes per posting entry plus per-term dict overhead
+        return sum(100 * len(docs) + 200 for docs in self.postings.values())
+
+    def idf(self, term: str) -> float:
+        df = len(self.postings.get(term, ()))
+        n = len(self.doc_lengths)
+        return math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+    def search(self, query: str, top_k: int = 5) -> list:
+        """
+        [(doc_id, score)] of the best matching documents, best first.
+        """
+        if not self.doc_lengths:
+            return []
+
+        avg_length = self.total_length / len(self.doc_lengths) or 1.0
+        scores = {}
+        for term in set(tokenize(query)):
+            docs = self.postings.get(term)
+            if not docs:
+                continue
+            idf = self.idf(term)
+            for doc_id, tf in docs.items():
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_id] / avg_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top_k]
+
+    def coverage(self, query: str, doc_id: int) -> float:
+        """
+        idf-weighted share of the query terms found in a document (0..1).
+        Terms the index has never seen weigh the most, so questions about
+        things the text does not mention score low.
+        """
+        terms = set(tokenize(query))
+        if not terms:
+            return 0.0
+        total = sum(self.idf(term) for term in terms)
+        found = sum(self.idf(term) for term in terms if doc_id in self.postings.get(term, ()))
+        return found / total if total else 0.0
+
+
+def reciprocal_rank_fusion(rankings: list, top_k: int, k: int = 60) -> list:
+    """
+    Merge ranked lists of items: each item scores sum(1 / (k + rank)).
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking):
+            scores[item] = scores.get(item, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)[:top_k]
@@ -1,5 +1,7 @@
 import re
-from rapidfuzz import fuzz
+import threading
+from collections import OrderedDict
+from rapidfuzz import fuzz, process
 from typing import List, Dict, Any
 
 
@@ -26,66 +28,212 @@ GLOBAL_MEDICINE_KEYWORDS = [
     "tell me about all"
 ]
 
+# Common prescription shorthand -> the name it stands for
+ABBREVIATIONS = {
+    "pcm": "paracetamol",
+    "apap": "acetaminophen",
+    "asa": "aspirin",
+    "amox": "amoxicillin",
+    "hcq": "hydroxychloroquine",
+    "cpm": "chlorpheniramine",
+    "mvi": "multivitamin",
+    "ors": "oral rehydration salts",
+    "inh": "isoniazid",
+    "ntg": "nitroglycerin",
+    "ppi": "pantoprazole",
+}
+
+# Leading words that do not identify a medicine on their own
+NON_DISTINCTIVE_WORDS = {"oral", "syrup", "syp", "drops", "cream", "gel", "ointment", "vitamin", "solution", "suspension"}
+
+# fuzz.ratio of an alias against question words of the same length in words
+FUZZY_THRESHOLD = 85
+# Shorter one-word aliases only match exactly: fuzzily, "zinc" is close to "since"
+MIN_FUZZY_ALIAS_LENGTH = 6
+
+_NON_ALNUM = re.compile(r"[^a-z0-9\s]")
+_DOSAGE_FORMS = re.compile(r"\b(tab|tablet|cap|capsule|inj|injection)\b")
+_GLOBAL_PATTERN = re.compile("|".join(re.escape(k) for k in GLOBAL_MEDICINE_KEYWORDS))
+_ORDINAL_PATTERN = re.compile("|".join(re.escape(w) for w in ORDINAL_MAP))
+_GENERIC_SPLIT = re.compile(r"\s*(?:\+|/|,|\band\b)\s*")
+
 
 def normalize_text(text: str) -> str:
     text = text.lower()
-    text = re.sub(r"[^a-z0-9\s]", "", text)
+    text = _NON_ALNUM.sub("", text)
     return text.strip()
 
 
 def clean_medicine_name(name: str) -> str:
     name = normalize_text(name)
-    name = re.sub(r"\b(tab|tablet|cap|capsule|inj|injection)\b", "", name)
+    name = _DOSAGE_FORMS.sub("", name)
     return name.strip()
 
 
-class MedicineMatcher:
-
-    @staticmethod
-    def detect(question: str, medicines: List[Dict[str, Any]]) -> Dict[str, Any]:
-
+def _clean_part(text: str) -> str:
+    return re.sub(r"\s+", " ", clean_medicine_name(text)).strip()
+
+
+def medicine_aliases(medicine: Dict[str, Any]):
+    """
+    Names a patient may use for a medicine. Returns (names, words): names
+    are the cleaned name (also without its strength or a leading form word
+    like "syrup"), its first word (brand) and generic components written in
+    brackets or joined with "+"; words are initialisms of multi-word names,
+    known abbreviations and short one-word names, which only match whole words.
+    """
+    raw = (medicine.get("medicine_name") or "").lower()
+    names, words = set(), set()
+
+    # "Augmentin 625 (Amoxicillin + Clavulanic acid)"
+    outside = re.sub(r"\(.*?\)", " ", raw)
+    inside = " ".join(re.findall(r"\((.*?)\)", raw))
+    for part in [outside] + _GENERIC_SPLIT.split(inside) + _GENERIC_SPLIT.split(outside):
+        cleaned = _clean_part(part)
+        if not cleaned:
+            continue
+        names.add(cleaned)
+        # Strengths ("625", "500mg") are not part of any alias
+        name_words = [w for w in cleaned.split() if not w[0].isdigit()]
+        if name_words and name_words[0] in NON_DISTINCTIVE_WORDS:
+            name_words = name_words[1:]
+        if name_words:
+            names.add(" ".join(name_words))
+            names.add(name_words[0])
+        if len(name_words) > 2:
+            words.add("".join(w[0] for w in name_words))
+
+    for abbreviation, name in ABBREVIATIONS.items():
+        if abbreviation in names or any(name in alias for alias in names):
+            words.add(abbreviation)
+
+    # Short one-word names also only match whole words
+    short = {alias for alias in names if " " not in alias and len(alias) < MIN_FUZZY_ALIAS_LENGTH}
+    return names - short, {word for word in words | short if len(word) > 1}
+
+
+class CompiledMedicineMatcher:
+    """
+    MedicineMatcher precomputed for one medicine list: aliases and a word
+    index are built once and keywords are matched with compiled patterns.
+    Aliases are scored with fuzz.ratio against question n-grams of the same
+    word count, never against the whole sentence, so ordinary words do not
+    match inside longer text.
+
+    detect() results carry exact: True for ordinal references and names
+    that matched word for word, False for fuzzy or "all" matches.
+    """
+
+    def __init__(self, medicines: List[Dict[str, Any]]):
+        self.medicines = medicines
+        self.word_index = {}      # whole-word alias -> medicine positions
+        self.fuzzy_aliases = {}   # alias word count -> ([aliases], [medicine position per alias])
+
+        for position, medicine in enumerate(medicines):
+            names, words = medicine_aliases(medicine)
+            for word in words:
+                self.word_index.setdefault(word, set()).add(position)
+            for name in names:
+                aliases, owners = self.fuzzy_aliases.setdefault(len(name.split()), ([], []))
+                aliases.append(name)
+                owners.append(position)
+
+    def detect(self, question: str) -> Dict[str, Any]:
         normalized_question = normalize_text(question)
 
         # 1️⃣ Global "all medicines" detection
-        for keyword in GLOBAL_MEDICINE_KEYWORDS:
-            if keyword in normalized_question:
-                return {
-                    "type": "all",
-                    "medicines": medicines
-                }
+        if _GLOBAL_PATTERN.search(normalized_question):
+            return {
+                "type": "all",
+                "medicines": self.medicines,
+                "exact": False
+            }
 
-        # 2️⃣ Index-based detection
-        for word, idx in ORDINAL_MAP.items():
-            if word in normalized_question and idx < len(medicines):
+        # 2️⃣ Index-based detection (first ordinal in the question wins)
+        for found in _ORDINAL_PATTERN.finditer(normalized_question):
+            idx = ORDINAL_MAP[found.group(0)]
+            if idx < len(self.medicines):
                 return {
                     "type": "index",
-                    "medicines": [medicines[idx]]
+                    "medicines": [self.medicines[idx]],
+                    "exact": True
                 }
 
-        # 3️⃣ Fuzzy name detection (multiple supported)
-        matches = []
-
-        for med in medicines:
-            med_name_clean = clean_medicine_name(med.get("medicine_name", ""))
-
-            score = fuzz.partial_ratio(
-                med_name_clean,
-                normalized_question
-            )
-
-            if score >= 75:
-                matches.append((score, med))
-
-        if matches:
-            matches.sort(key=lambda x: x[0], reverse=True)
-            detected = [m[1] for m in matches]
-
+        # 3️⃣ Name detection (multiple supported): exact short aliases, then fuzzy
+        tokens = normalized_question.split()
+        scores = {}
+        for word in set(tokens):
+            for position in self.word_index.get(word, ()):
+                scores[position] = 100.0
+
+        for size, (aliases, owners) in self.fuzzy_aliases.items():
+            ngrams = [" ".join(tokens[i:i + size]) for i in range(len(tokens) - size + 1)]
+            if not ngrams:
+                continue
+            # Best n-gram score per alias, every pair scored in one call
+            best = process.cdist(ngrams, aliases, scorer=fuzz.ratio, score_cutoff=FUZZY_THRESHOLD).max(axis=0)
+            for alias_no in best.nonzero()[0]:
+                position = owners[alias_no]
+                scores[position] = max(scores.get(position, 0.0), float(best[alias_no]))
+
+        if scores:
+            ranked = sorted(scores, key=lambda position: (-scores[position], position))
             return {
                 "type": "name",
-                "medicines": detected
+                "medicines": [self.medicines[position] for position in ranked],
+                "exact": all(scores[position] == 100.0 for position in ranked)
             }
 
         return {
             "type": None,
-            "medicines": []
+            "medicines": [],
+            "exact": False
         }
+
+
+class MedicineMatcherCache:
+    """
+    Compiled matchers per prescription (LRU). version identifies the
+    analysis a matcher was compiled from (e.g. a digest of it): a lookup
+    with a different version recompiles, so an analysis edited through
+    another worker is never matched against stale data. invalidate() just
+    frees the entry early.
+    """
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._matchers = OrderedDict()  # prescription_id -> (version, matcher)
+        self._lock = threading.Lock()
+
+    def get(self, prescription_id: int, medicines: List[Dict[str, Any]], version: str = "") -> CompiledMedicineMatcher:
+        with self._lock:
+            entry = self._matchers.get(prescription_id)
+            if entry is not None and entry[0] == version:
+                self._matchers.move_to_end(prescription_id)
+                return entry[1]
+
+        matcher = CompiledMedicineMatcher(medicines)
+        with self._lock:
+            self._matchers[prescription_id] = (version, matcher)
+            self._matchers.move_to_end(prescription_id)
+            while len(self._matchers) > self.max_entries:
+                self._matchers.popitem(last=False)
+        return matcher
+
+    def invalidate(self, prescription_id: int):
+        with self._lock:
+            self._matchers.pop(prescription_id, None)
+
+
+medicine_matchers = MedicineMatcherCache()
+
+
+class MedicineMatcher:
+
+    @staticmethod
+    def detect(question: str, medicines: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        One-off detection; per-prescription callers should use
+        medicine_matchers.get(prescription_id, medicines, version).detect(question).
+        """
+        return CompiledMedicineMatcher(medicines).detect(question)
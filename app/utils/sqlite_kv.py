@@ -0,0 +1,66 @@
+import os
+import sqlite3
+import threading
+
+
+class SQLiteKVStore:
+    """
+    Minimal thread-safe key/value table in a local SQLite file.
+    Values are stored as raw bytes; callers handle (de)serialization.
+    The file (and its directory) is only created on first use, so
+    constructing a store at import time touches nothing on disk.
+    """
+
+    def __init__(self, path: str, table: str):
+        self.path = path
+        self.table = table
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connection(self) -> sqlite3.Connection:
+        # Called with self._lock held
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.table} (key TEXT PRIMARY KEY, value BLOB NOT NULL)"
+            )
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def get_many(self, keys: list) -> dict:
+        if not keys:
+            return {}
+        found = {}
+        with self._lock:
+            # Stay well under SQLite's bound-parameter limit
+            for i in range(0, len(keys), 500):
+                batch = keys[i:i + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._connection().execute(
+                    f"SELECT key, value FROM {self.table} WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                found.update(rows)
+        return found
+
+    def get(self, key: str):
+        return self.get_many([key]).get(key)
+
+    def set_many(self, items: dict):
+        if not items:
+            return
+        with self._lock:
+            conn = self._connection()
+            conn.executemany(
+                f"INSERT OR REPLACE INTO {self.table} (key, value) VALUES (?, ?)", items.items()
+            )
+            conn.commit()
+
+    def set(self, key: str, value: bytes):
+        self.set_many({key: value})
@@ -0,0 +1,6 @@
+def estimate_tokens(text: str) -> int:
+    """
+    Cheap token estimate (~4 characters per token for English text),
+    good enough for batching and budgeting without calling the API.
+    """
+    return len(text) // 4 + 1
@@ -0,0 +1,31 @@
+import os
+import pytest
+
+# Settings are read at import: an in-memory database and the offline
+# hashing embedding backend, so no test needs a server or an API key.
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("EMBEDDING_BACKEND", "hashing")
+os.environ.setdefault("EMBEDDING_CACHE_PATH", "")
+os.environ.setdefault("EXTRACTION_CACHE_PATH", "")
+
+
+@pytest.fixture
+def db():
+    """
+    Session on a fresh in-memory SQLite database with every table created.
+    """
+    pytest.importorskip("sqlalchemy")
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from sqlalchemy.pool import StaticPool
+    from app.models import user, prescription, chat_session, chat_message, ingestion_job, uploaded_file  # noqa: F401
+    from app.models.base import Base
+
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    try:
+        yield session
+    finally:
+        session.close()
+        engine.dispose()
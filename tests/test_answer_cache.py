@@ -0,0 +1,116 @@
+import time
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("sqlalchemy")
+pytest.importorskip("jwt")
+
+from app.services.answer_cache import AnswerCache, medicines_key
+from app.services.embedding_backends import HashingBackend
+from app.services.embedding_service import truncate_and_normalize
+
+DIM = 256
+ANALYSIS = [{"medicine_name": "Amoxicillin 500", "dosage": "1 capsule"}]
+
+
+def embed(text: str):
+    return truncate_and_normalize(HashingBackend().embed([text], DIM), DIM)[0]
+
+
+@pytest.fixture
+def cache():
+    return AnswerCache(ttl=60, threshold=0.9, max_entries=10, max_bytes=0)
+
+
+def test_near_duplicate_question_hits(cache):
+    cache.put(1, "rag", "", "What is the diagnosis?", embed("What is the diagnosis?"), "Viral fever.")
+
+    assert cache.get(1, "rag", "", embed("what is the diagnosis")) == "Viral fever."
+    assert cache.get(1, "rag", "", embed("when is my next follow up visit")) is None
+
+
+def test_answers_are_scoped_by_prescription_route_and_medicines(cache):
+    vector = embed("what is the dose")
+    scope = medicines_key(ANALYSIS)
+    cache.put(1, "medicine", scope, "what is the dose", vector, "1 capsule")
+
+    assert cache.get(1, "medicine", scope, vector) == "1 capsule"
+    assert cache.get(2, "medicine", scope, vector) is None
+    assert cache.get(1, "general", scope, vector) is None
+    assert cache.get(1, "medicine", medicines_key([{"medicine_name": "Metformin"}]), vector) is None
+
+
+def test_medicines_key_ignores_dict_order_but_not_content():
+    reordered = [{"dosage": "1 capsule", "medicine_name": "Amoxicillin 500"}]
+    edited = [{"medicine_name": "Amoxicillin 500", "dosage": "2 capsules"}]
+
+    assert medicines_key(ANALYSIS) == medicines_key(reordered)
+    assert medicines_key(ANALYSIS) != medicines_key(edited)
+    assert medicines_key(None) == medicines_key([]) == ""
+
+
+def test_invalidate_drops_only_that_prescription(cache):
+    vector = embed("what is the diagnosis")
+    cache.put(1, "rag", "", "q", vector, "a1")
+    cache.put(2, "rag", "", "q", vector, "a2")
+
+    cache.invalidate(1)
+
+    assert cache.get(1, "rag", "", vector) is None
+    assert cache.get(2, "rag", "", vector) == "a2"
+
+
+def test_per_prescription_cap_drops_oldest():
+    cache = AnswerCache(ttl=60, threshold=0.99, max_entries=2, max_bytes=0)
+    questions = ["what is the diagnosis", "when is the follow up", "which tests were ordered"]
+    for question in questions:
+        cache.put(1, "rag", "", question, embed(question), question.upper())
+
+    assert cache.get(1, "rag", "", embed(questions[0])) is None
+    assert cache.get(1, "rag", "", embed(questions[2])) == questions[2].upper()
+
+
+def test_byte_budget_evicts_least_recently_used_across_prescriptions():
+    vector = embed("what is the diagnosis")
+    entry_size = vector.nbytes + len("answer") + len("q") + 200
+    cache = AnswerCache(ttl=60, threshold=0.9, max_entries=10, max_bytes=2 * entry_size)
+
+    cache.put(1, "rag", "", "q", vector, "answer")
+    cache.put(2, "rag", "", "q", vector, "answer")
+    cache.get(1, "rag", "", vector)  # 1 is now the most recently used
+    cache.put(3, "rag", "", "q", vector, "answer")
+
+    assert cache.get(2, "rag", "", vector) is None
+    assert cache.get(1, "rag", "", vector) == "answer"
+    assert cache.stats()["bytes"] <= 2 * entry_size
+
+
+def test_expired_answers_are_not_served(cache, monkeypatch):
+    vector = embed("what is the diagnosis")
+    cache.put(1, "rag", "", "q", vector, "answer")
+
+    later = time.monotonic() + 61
+    monkeypatch.setattr("app.services.answer_cache.time.monotonic", lambda: later)
+
+    assert cache.get(1, "rag", "", vector) is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_disabled_cache_stores_nothing():
+    cache = AnswerCache(ttl=0)
+    vector = embed("what is the diagnosis")
+    cache.put(1, "rag", "", "q", vector, "answer")
+
+    assert not cache.enabled
+    assert cache.get(1, "rag", "", vector) is None
+
+
+def test_same_question_hits_without_an_embedding(cache):
+    # A confident BM25 turn never computes an embedding
+    cache.put(1, "rag", "", "When is my next follow up?", None, "In two weeks.")
+
+    assert cache.get_exact(1, "rag", "", "when is my next  follow up") == "In two weeks."
+    assert cache.get_exact(1, "rag", "", "when is my next review") is None
+    assert cache.get_exact(2, "rag", "", "When is my next follow up?") is None
+    # Not reachable by similarity, but it must not break the semantic lookup either
+    assert cache.get(1, "rag", "", embed("when is my next follow up")) is None
@@ -0,0 +1,96 @@
+from datetime import datetime, timedelta
+import pytest
+
+pytest.importorskip("sqlalchemy")
+
+from app.models.user import User
+from app.models.prescription import Prescription
+from app.models.chat_session import ChatSession
+from app.models.chat_message import ChatMessage
+from app.repositories.chat_repository import ChatRepository, encode_cursor, decode_cursor
+
+START = datetime(2026, 1, 1, 9, 0, 0)
+
+
+def make_session(db, email="patient@example.com"):
+    user = User(email=email, full_name="Patient")
+    db.add(user)
+    db.flush()
+    prescription = Prescription(user_id=user.id, extracted_text="", analysis_result=[])
+    db.add(prescription)
+    db.flush()
+    session = ChatSession(prescription_id=prescription.id)
+    db.add(session)
+    db.commit()
+    return user, session
+
+
+def add_messages(db, session, timestamps):
+    messages = [
+        ChatMessage(session_id=session.id, role="user", content=f"message {i}", created_at=created_at)
+        for i, created_at in enumerate(timestamps)
+    ]
+    db.add_all(messages)
+    db.commit()
+    return messages
+
+
+def test_cursor_round_trip():
+    message = ChatMessage(id=42, created_at=START)
+    assert decode_cursor(encode_cursor(message)) == (START, 42)
+
+
+@pytest.mark.parametrize("cursor", ["", "not-a-cursor", "MjAyNi0wMS0wMQ=="])
+def test_malformed_cursor_raises_value_error(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+
+def test_pages_walk_the_whole_history_newest_first(db):
+    _, session = make_session(db)
+    # Messages 2-4 share a timestamp: the id breaks the tie
+    timestamps = [START, START + timedelta(seconds=1)] + [START + timedelta(seconds=2)] * 3 + [
+        START + timedelta(seconds=3), START + timedelta(seconds=4)
+    ]
+    messages = add_messages(db, session, timestamps)
+
+    pages, cursor = [], None
+    while True:
+        page, cursor = ChatRepository.get_messages_page(db, session.id, limit=3, cursor=cursor)
+        pages.append([m.id for m in page])
+        if cursor is None:
+            break
+
+    ids = [m.id for m in messages]
+    assert pages == [ids[4:], ids[1:4], ids[:1]]
+
+
+def test_page_size_equal_to_history_has_no_next_cursor(db):
+    _, session = make_session(db)
+    add_messages(db, session, [START + timedelta(seconds=i) for i in range(3)])
+
+    page, cursor = ChatRepository.get_messages_page(db, session.id, limit=3)
+
+    assert len(page) == 3
+    assert cursor is None
+
+
+def test_messages_between_reads_forward(db):
+    _, session = make_session(db)
+    messages = add_messages(db, session, [START + timedelta(seconds=i) for i in range(6)])
+    ids = [m.id for m in messages]
+
+    batch = ChatRepository.get_messages_between(db, session.id, after_id=ids[0], before_id=ids[5], limit=3)
+
+    assert [m.id for m in batch] == ids[1:4]
+
+
+
+
+def test_user_session_requires_ownership(db):
+    owner, session = make_session(db)
+    other, _ = make_session(db, email="someone@example.com")
+
+    assert ChatRepository.get_user_session(db, session.id, owner.id).id == session.id
+    assert ChatRepository.get_user_session(db, session.id, other.id) is None
+    assert ChatRepository.get_user_session(db, session.id + 100, owner.id) is None
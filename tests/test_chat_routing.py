@@ -0,0 +1,72 @@
+import pytest
+
+pytest.importorskip("sqlalchemy")
+pytest.importorskip("rapidfuzz")
+
+from app.models.prescription import Prescription
+from app.repositories.chat_repository import ChatTurnUnitOfWork
+from app.services.chat_service import ChatService, ROUTE_MEDICINE, ROUTE_RAG
+
+ANALYSIS = [
+    {
+        "medicine_name": "Tab Zinc 20mg",
+        "dosage": "1 tablet",
+        "administration_instructions": {"timing": "morning", "food_relation": "after food"},
+    },
+    {"medicine_name": "Tab Dolo 650", "dosage": "1 tablet"},
+    {"medicine_name": "Tab Pantoprazole 40", "dosage": "1 tablet"},
+]
+
+
+def start(question: str):
+    prescription = Prescription(id=1, extracted_text="", analysis_result=ANALYSIS)
+    return ChatService.start_turn(ChatTurnUnitOfWork(None, prescription, None, [], question))
+
+
+def test_exact_name_is_eligible_for_the_template():
+    turn = start("When should I take zinc?")
+    assert turn.route == ROUTE_MEDICINE
+    assert turn.exact_match
+
+
+def test_question_about_several_medicines_is_not_pinned_to_one():
+    # "since" must not be read as Zinc, and "these" is not one medicine
+    turn = start("Since when should I take these?")
+    assert turn.route == ROUTE_RAG
+    assert not turn.exact_match
+
+
+def test_fuzzy_name_is_not_eligible_for_the_template():
+    turn = start("when should I take pantoprazol")
+    assert turn.route == ROUTE_MEDICINE
+    assert turn.medicines == [ANALYSIS[2]]
+    assert not turn.exact_match
+
+
+def test_after_commit_issues_no_queries(db):
+    from sqlalchemy import event
+    from app.models.user import User
+    from app.models.chat_session import ChatSession
+    from app.repositories.chat_repository import ChatRepository
+
+    user = User(email="patient@example.com", full_name="Patient")
+    db.add(user)
+    db.flush()
+    prescription = Prescription(user_id=user.id, extracted_text="", analysis_result=ANALYSIS)
+    db.add(prescription)
+    db.flush()
+    session = ChatSession(prescription_id=prescription.id)
+    db.add(session)
+    db.commit()
+    for i in range(3):
+        ChatRepository.save_message(db, session.id, "user", f"question {i}")
+
+    prescription, session, history = ChatRepository.load_turn(db, prescription.id, session.id, 10)
+    turn = ChatService.start_turn(ChatTurnUnitOfWork(db, prescription, session, history, "What is it for?"))
+    turn.work.commit("An answer.", db=db)  # expires the history objects
+
+    statements = []
+    event.listen(db.get_bind(), "before_cursor_execute", lambda *args: statements.append(args[2]))
+    ChatService.after_commit(turn, "An answer.")
+
+    assert statements == []
@@ -0,0 +1,33 @@
+import numpy as np
+
+from app.services.embedding_cache import EmbeddingCache, ENTRY_OVERHEAD
+
+VECTOR = np.ones(256, dtype="float32")
+ENTRY_BYTES = VECTOR.nbytes + ENTRY_OVERHEAD
+
+
+def test_memory_is_bounded_by_bytes():
+    cache = EmbeddingCache(max_entries=100, path="", max_bytes=2 * ENTRY_BYTES)
+    cache.put_many({"a": VECTOR, "b": VECTOR})
+    cache.get_many(["a"])
+    cache.put_many({"c": VECTOR})
+
+    assert cache.get_many(["a", "b", "c"])[1] is None
+    assert cache.stats()["bytes"] == 2 * ENTRY_BYTES
+
+
+def test_memory_is_bounded_by_entries():
+    cache = EmbeddingCache(max_entries=1, path="", max_bytes=0)
+    cache.put_many({"a": VECTOR, "b": VECTOR})
+
+    assert cache.get_many(["a"]) == [None]
+    assert cache.stats()["entries"] == 1
+
+
+def test_replacing_a_vector_does_not_double_count_it():
+    cache = EmbeddingCache(max_entries=100, path="", max_bytes=0)
+    cache.put_many({"a": VECTOR})
+    cache.put_many({"a": VECTOR * 2})
+
+    assert cache.stats()["bytes"] == ENTRY_BYTES
+    assert cache.get_many(["a"])[0][0] == 2
@@ -0,0 +1,57 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from app.core.config import settings
+from app.services import embedding_service
+
+
+class FlakyBackend:
+    def __init__(self, failures):
+        self.failures = failures
+        self.calls = 0
+
+    def embed(self, texts, dimension):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise RuntimeError("unavailable")
+        return np.zeros((len(texts), dimension), dtype="float32")
+
+
+def patch(monkeypatch, failures, retries):
+    backend = FlakyBackend(failures)
+
+    async def embed_async(texts, dimension):
+        return backend.embed(texts, dimension)
+
+    monkeypatch.setattr(settings, "EMBEDDING_MAX_RETRIES", retries)
+    monkeypatch.setattr(embedding_service, "_embed_once", backend.embed)
+    monkeypatch.setattr(embedding_service, "_embed_once_async", embed_async)
+    monkeypatch.setattr(embedding_service, "_retry_delay", lambda texts, attempt, error: 0)
+    return backend
+
+
+def test_no_retries_still_makes_one_attempt(monkeypatch):
+    backend = patch(monkeypatch, failures=0, retries=0)
+
+    assert embedding_service._embed_with_retry(["a"], 4).shape == (1, 4)
+    assert asyncio.run(embedding_service._embed_with_retry_async(["a"], 4)).shape == (1, 4)
+    assert backend.calls == 2
+
+
+def test_failures_are_retried(monkeypatch):
+    backend = patch(monkeypatch, failures=2, retries=2)
+
+    assert embedding_service._embed_with_retry(["a"], 4).shape == (1, 4)
+    assert backend.calls == 3
+
+
+def test_last_failure_is_raised(monkeypatch):
+    backend = patch(monkeypatch, failures=5, retries=1)
+
+    with pytest.raises(RuntimeError):
+        embedding_service._embed_with_retry(["a"], 4)
+    with pytest.raises(RuntimeError):
+        asyncio.run(embedding_service._embed_with_retry_async(["a"], 4))
+    assert backend.calls == 4
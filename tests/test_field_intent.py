@@ -0,0 +1,64 @@
+import pytest
+from app.utils.field_intent import detect_field_intent, render_field_answer, refers_to_several
+
+MEDICINES = [
+    {
+        "medicine_name": "Amoxicillin 500",
+        "dosage": "1 capsule",
+        "frequency": "three times a day",
+        "duration": "5 days",
+        "administration_instructions": {"timing": "morning, afternoon, night", "food_relation": "after food"},
+    }
+]
+
+
+@pytest.mark.parametrize("question, field", [
+    ("What is the dosage of Amoxicillin?", "dosage"),
+    ("How many tablets should I take?", "dosage"),
+    ("How often do I take it?", "frequency"),
+    ("How long do I take Amoxicillin?", "duration"),
+    ("For how many days should I continue it?", "duration"),
+    ("When should I take it, morning or night?", "timing"),
+    ("Should I take it before food?", "food_relation"),
+])
+def test_direct_field_questions(question, field):
+    assert detect_field_intent(question) == field
+
+
+@pytest.mark.parametrize("question", [
+    "How long does Amoxicillin take to work?",
+    "What food should I avoid with these medicines?",
+    "How much water should I drink with it?",
+    "What if I take more than the dose?",
+    "Can I take it after dinner?",
+    "What happens if I miss a dose?",
+    "Why is the dosage so high?",
+    "Is it safe to take with alcohol?",
+    "What should I eat with it?",
+    "Tell me about this medicine",
+])
+def test_open_ended_questions_go_to_the_llm(question):
+    assert detect_field_intent(question) is None
+
+
+def test_several_fields_go_to_the_llm():
+    assert detect_field_intent("What is the dosage and how often do I take it?") is None
+
+
+def test_render_field_answer():
+    assert render_field_answer("duration", MEDICINES) == "Duration for Amoxicillin 500 as per your prescription: 5 days."
+    assert render_field_answer("food_relation", MEDICINES).endswith("after food.")
+
+
+def test_missing_field_is_not_templated():
+    assert render_field_answer("duration", [{"medicine_name": "Cetirizine"}]) is None
+
+
+@pytest.mark.parametrize("question, several", [
+    ("Since when should I take these?", True),
+    ("Can I take them together?", True),
+    ("What is the timing for all of my tablets?", True),
+    ("When should I take Zinc?", False),
+])
+def test_refers_to_several(question, several):
+    assert refers_to_several(question) is several
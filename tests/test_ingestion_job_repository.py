@@ -0,0 +1,78 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+pytest.importorskip("sqlalchemy")
+
+from app.models.user import User
+from app.models.ingestion_job import STATUS_QUEUED, STATUS_RUNNING, STATUS_FAILED, STATUS_COMPLETED
+from app.repositories.ingestion_job_repository import IngestionJobRepository
+
+
+def make_job(db):
+    user = db.query(User).first()
+    if user is None:
+        user = User(email="patient@example.com", full_name="Patient")
+        db.add(user)
+        db.commit()
+    return IngestionJobRepository.create_job(
+        db, user_id=user.id, file_path="uploads/ab/abc.png", content_type="image/png", content_hash="abc"
+    )
+
+
+def test_new_job_is_queued(db):
+    assert make_job(db).status == STATUS_QUEUED
+
+
+def test_job_is_claimed_only_once(db):
+    job = make_job(db)
+
+    assert IngestionJobRepository.claim_job(db, job.id, "worker-a")
+    assert not IngestionJobRepository.claim_job(db, job.id, "worker-a")
+
+    db.refresh(job)
+    assert job.status == STATUS_RUNNING
+
+
+def test_finished_jobs_cannot_be_claimed(db):
+    job = make_job(db)
+    IngestionJobRepository.update_job(db, job, status=STATUS_COMPLETED)
+
+    assert not IngestionJobRepository.claim_job(db, job.id, "worker-a")
+
+
+def test_startup_recovery_queries(db):
+    queued, running, done = make_job(db), make_job(db), make_job(db)
+    IngestionJobRepository.claim_job(db, running.id, "worker-a")
+    IngestionJobRepository.update_job(db, done, status=STATUS_COMPLETED)
+
+    stale_before = datetime.utcnow() + timedelta(seconds=1)
+    assert IngestionJobRepository.fail_stale_jobs(db, "interrupted", stale_before) == 1
+    assert IngestionJobRepository.get_queued_job_ids(db) == [queued.id]
+
+    db.refresh(running)
+    db.refresh(done)
+    assert (running.status, running.error) == (STATUS_FAILED, "interrupted")
+    assert done.status == STATUS_COMPLETED
+
+
+def test_jobs_with_a_fresh_heartbeat_are_not_failed(db):
+    job = make_job(db)
+    IngestionJobRepository.claim_job(db, job.id, "worker-a")
+
+    stale_before = datetime.utcnow() - timedelta(minutes=2)
+    assert IngestionJobRepository.fail_stale_jobs(db, "interrupted", stale_before) == 0
+
+    db.refresh(job)
+    assert (job.status, job.claimed_by) == (STATUS_RUNNING, "worker-a")
+
+
+def test_heartbeat_only_from_the_owning_worker(db):
+    job = make_job(db)
+    IngestionJobRepository.claim_job(db, job.id, "worker-a")
+
+    assert IngestionJobRepository.heartbeat(db, job.id, "worker-a")
+    assert not IngestionJobRepository.heartbeat(db, job.id, "worker-b")
+
+    IngestionJobRepository.update_job(db, job, status=STATUS_COMPLETED)
+    assert not IngestionJobRepository.heartbeat(db, job.id, "worker-a")
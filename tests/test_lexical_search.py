@@ -0,0 +1,55 @@
+import pytest
+from app.utils.lexical_search import BM25Index, reciprocal_rank_fusion, tokenize
+
+CHUNKS = [
+    "tab amoxicillin 500 mg three times a day after food for 5 days",
+    "tab pantoprazole 40 mg once daily before breakfast",
+    "review after one week with blood report",
+    "syrup cough relief 10 ml at bedtime",
+]
+
+
+def test_tokenize_drops_question_filler():
+    assert tokenize("What is the dose of Amoxicillin?") == ["dose", "amoxicillin"]
+
+
+def test_bm25_ranks_the_chunk_with_the_rare_term_first():
+    index = BM25Index(CHUNKS)
+
+    hits = index.search("when should I take pantoprazole", top_k=2)
+
+    assert hits[0][0] == 1
+    assert len(hits) == 1  # no other chunk shares a term
+
+
+def test_bm25_without_query_terms_finds_nothing():
+    assert BM25Index(CHUNKS).search("what is it", top_k=3) == []
+    assert BM25Index().search("amoxicillin") == []
+
+
+def test_add_extends_document_ids():
+    index = BM25Index(CHUNKS[:2])
+    index.add(CHUNKS[2:])
+
+    assert len(index) == len(CHUNKS)
+    assert index.search("bedtime")[0][0] == 3
+
+
+def test_coverage_is_low_for_terms_the_text_never_mentions():
+    index = BM25Index(CHUNKS)
+
+    assert index.coverage("amoxicillin after food", 0) == pytest.approx(1.0)
+    assert index.coverage("amoxicillin alcohol", 0) < 0.5
+    assert index.coverage("what is it", 0) == 0.0
+
+
+def test_rrf_prefers_items_ranked_high_in_both_lists():
+    dense = ["b", "a", "c"]
+    lexical = ["a", "d", "b"]
+
+    assert reciprocal_rank_fusion([dense, lexical], top_k=2) == ["a", "b"]
+
+
+def test_rrf_keeps_single_list_order_and_top_k():
+    assert reciprocal_rank_fusion([["x", "y", "z"]], top_k=5) == ["x", "y", "z"]
+    assert reciprocal_rank_fusion([["x", "y", "z"], []], top_k=1) == ["x"]
@@ -0,0 +1,102 @@
+import pytest
+
+pytest.importorskip("rapidfuzz")
+
+from app.utils.medicine_matcher import CompiledMedicineMatcher, MedicineMatcherCache
+
+MEDICINES = [
+    {"medicine_name": "Tab Augmentin 625 (Amoxicillin + Clavulanic acid)"},
+    {"medicine_name": "Tab Pantoprazole 40mg"},
+    {"medicine_name": "Syrup Cough Relief"},
+]
+
+
+@pytest.fixture
+def matcher():
+    return CompiledMedicineMatcher(MEDICINES)
+
+
+@pytest.mark.parametrize("question, position", [
+    ("What is Augmentin for?", 0),
+    ("Can I take amoxicillin with milk?", 0),
+    ("is pantoprazol safe", 1),        # misspelt
+    ("when do I take ppi", 1),         # abbreviation, whole word only
+    ("how much cough relief syrup", 2),
+])
+def test_name_match(matcher, question, position):
+    result = matcher.detect(question)
+    assert result["type"] == "name"
+    assert result["medicines"][0] is MEDICINES[position]
+
+
+def test_ordinal_match(matcher):
+    result = matcher.detect("what about the second medicine")
+    assert result == {"type": "index", "medicines": [MEDICINES[1]], "exact": True}
+
+
+def test_ordinal_beyond_the_list_is_ignored(matcher):
+    assert matcher.detect("and the fourth one?")["type"] is None
+
+
+def test_all_medicines(matcher):
+    assert matcher.detect("Tell me about all medicines")["type"] == "all"
+
+
+def test_unrelated_question_matches_nothing(matcher):
+    assert matcher.detect("what did the doctor diagnose") == {"type": None, "medicines": [], "exact": False}
+
+
+SHORT_NAMES = [
+    {"medicine_name": "Tab Zinc 20mg"},
+    {"medicine_name": "Tab Dolo 650"},
+    {"medicine_name": "Cap Omez 20"},
+]
+
+
+@pytest.mark.parametrize("question", [
+    "Since when should I take these?",
+    "Should I follow the same routine next month?",
+    "When should I come back for a review?",
+    "Is it fine to skip dinner?",
+])
+def test_ordinary_words_do_not_match_short_names(question):
+    assert CompiledMedicineMatcher(SHORT_NAMES).detect(question)["type"] is None
+
+
+@pytest.mark.parametrize("question, position", [
+    ("how many zinc tablets", 0),
+    ("is dolo for fever", 1),
+    ("omez before breakfast?", 2),
+])
+def test_short_names_match_as_whole_words(question, position):
+    result = CompiledMedicineMatcher(SHORT_NAMES).detect(question)
+    assert result["medicines"] == [SHORT_NAMES[position]]
+    assert result["exact"]
+
+
+def test_misspelt_name_is_not_exact(matcher):
+    assert not matcher.detect("is pantoprazol safe")["exact"]
+    assert matcher.detect("is pantoprazole safe")["exact"]
+
+
+def test_cache_recompiles_when_the_analysis_version_changes():
+    cache = MedicineMatcherCache()
+    first = cache.get(7, MEDICINES, version="v1")
+
+    assert cache.get(7, MEDICINES, version="v1") is first
+
+    edited = [{"medicine_name": "Tab Metformin 500"}]
+    matcher = cache.get(7, edited, version="v2")
+    assert matcher is not first
+    assert matcher.detect("metformin dose")["medicines"] == edited
+
+
+def test_cache_is_lru_bounded():
+    cache = MedicineMatcherCache(max_entries=2)
+    first = cache.get(1, MEDICINES)
+    cache.get(2, MEDICINES)
+    cache.get(1, MEDICINES)
+    cache.get(3, MEDICINES)  # evicts 2, the least recently used
+
+    assert cache.get(1, MEDICINES) is first
+    assert 2 not in cache._matchers
@@ -0,0 +1,55 @@
+import os
+
+import numpy as np
+import pytest
+
+pytest.importorskip("faiss")
+
+from app.services.shared_vector_index import SharedVectorIndex
+
+
+def vectors(count, dimension=8, seed=0):
+    data = np.random.default_rng(seed).standard_normal((count, dimension)).astype("float32")
+    return data / np.linalg.norm(data, axis=1, keepdims=True)
+
+
+def test_saved_shard_survives_a_reload(tmp_path):
+    index = SharedVectorIndex(str(tmp_path), dimension=8, num_shards=1, factory="HNSW32,Flat")
+    data = vectors(5)
+    index.add(7, data)
+    index.flush()
+
+    reloaded = SharedVectorIndex(str(tmp_path), dimension=8, num_shards=1, factory="HNSW32,Flat")
+
+    assert reloaded.chunk_count(7) == 5
+    assert reloaded.search(7, data[3], top_k=1)[0][0] == 3
+
+
+def test_training_buffer_is_saved_with_the_index(tmp_path):
+    index = SharedVectorIndex(str(tmp_path), dimension=8, num_shards=1, factory="IVF4,Flat", train_size=100)
+    data = vectors(5)
+    index.add(7, data)
+    index.flush()
+
+    reloaded = SharedVectorIndex(str(tmp_path), dimension=8, num_shards=1, factory="IVF4,Flat", train_size=100)
+
+    assert reloaded.search(7, data[2], top_k=1)[0][0] == 2
+
+
+def test_each_save_replaces_the_previous_version(tmp_path):
+    index = SharedVectorIndex(str(tmp_path), dimension=8, num_shards=1, factory="HNSW32,Flat")
+    index.add(7, vectors(2))
+    index.flush()
+    index.add(8, vectors(2, seed=1))
+    index.flush()
+
+    assert sorted(os.listdir(tmp_path)) == ["shard_0.current", "shard_0.v2"]
+
+
+def test_saves_wait_for_the_interval_or_enough_changes(tmp_path):
+    index = SharedVectorIndex(str(tmp_path), dimension=8, num_shards=1, factory="HNSW32,Flat")
+    shard = index.shards[0]
+    shard.add(7, vectors(10))
+
+    assert not shard.should_save(interval=300, fraction=0.1)
+    assert shard.should_save(interval=0, fraction=0.1)
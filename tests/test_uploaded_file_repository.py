@@ -0,0 +1,31 @@
+import pytest
+
+pytest.importorskip("sqlalchemy")
+
+from app.repositories.uploaded_file_repository import UploadedFileRepository
+
+
+def record(db, file_path):
+    return UploadedFileRepository.record(
+        db,
+        content_hash="ab" * 32,
+        file_path=file_path,
+        content_type="image/png",
+        extracted_text="text",
+        analysis_result=[],
+        prescription_id=None
+    )
+
+
+def test_record_then_lookup(db):
+    record(db, "uploads/ab/first.png")
+    assert UploadedFileRepository.get_by_hash(db, "ab" * 32).file_path == "uploads/ab/first.png"
+
+
+def test_second_record_of_the_same_bytes_keeps_the_first(db):
+    record(db, "uploads/ab/first.png")
+
+    # A concurrent first upload finishing second must not fail the request
+    kept = record(db, "uploads/ab/second.png")
+
+    assert kept.file_path == "uploads/ab/first.png"
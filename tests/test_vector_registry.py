@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("faiss")
+
+from app.services.embedding_backends import embedding_dimension
+from app.services.vector_registry import VectorRegistry
+
+CHUNKS = ["Paracetamol 500 mg twice daily", "Amoxicillin 250 mg for 5 days", "Omeprazole before breakfast"]
+
+
+def embeddings(count):
+    data = np.random.default_rng(0).standard_normal((count, embedding_dimension())).astype("float32")
+    return data / np.linalg.norm(data, axis=1, keepdims=True)
+
+
+def build(registry, prescription_id):
+    vectors = embeddings(len(CHUNKS))
+    store = registry.create_store(prescription_id)
+    store.add_chunks(vectors, list(CHUNKS))
+    registry.save_store(prescription_id, store)
+    return vectors
+
+
+def test_saved_store_survives_a_restart(tmp_path):
+    vectors = build(VectorRegistry(index_dir=str(tmp_path), mode="per_prescription"), 7)
+
+    # A new registry (process) starts empty and rehydrates from disk
+    restarted = VectorRegistry(index_dir=str(tmp_path), mode="per_prescription")
+    store = restarted.get_store(7)
+
+    assert store.chunks == CHUNKS
+    assert store.search(vectors[1], top_k=1) == [CHUNKS[1]]
+    assert restarted.disk_loads == 1
+
+
+def test_evicted_store_is_reloaded_from_disk(tmp_path):
+    registry = VectorRegistry(index_dir=str(tmp_path), max_entries=1, mode="per_prescription")
+    vectors = build(registry, 7)
+    build(registry, 8)
+
+    assert registry.evictions == 1
+    assert registry.get_store(7).search(vectors[2], top_k=1) == [CHUNKS[2]]
+
+
+def test_unknown_prescription_has_no_store(tmp_path):
+    assert VectorRegistry(index_dir=str(tmp_path), mode="per_prescription").get_store(7) is None